@@ -8,7 +8,7 @@ from dfsmc.lineup import Lineup
 # from dfsmc.projection import usage
 
 
-def build_field(contest_in: Contest, exclude_players: List[int] = None, projection_threshold: float = 1.0):
+def build_field(contest_in: Contest, exclude_players: List[int] = None, projection_threshold: float = 1.0, n_jobs: int = 1):
     # Get lineup parameters for contest
     constraint = Lineup.LineupConstraint(contest_type='Showdown')
     draft_group = Lineup.DraftGroup(draft_group_id=contest_in.draft_group_id, db_interface=db.DFSDBInterface())
@@ -25,7 +25,7 @@ def build_field(contest_in: Contest, exclude_players: List[int] = None, projecti
 
     # Generate all possible lineups
     generator = Lineup.greedyGenerator(constraint, draft_group.data, projections_only=True)
-    lineups = generator.generate(verbose=True, limit=None, random=False)
+    lineups = generator.generate(verbose=True, limit=None, random=False, n_jobs=n_jobs)
 
     # # Get the covariance matrix
     # cov_group = covariance.DraftGroupCovariance(players)
@@ -48,6 +48,7 @@ if __name__ == "__main__":
 
     exclude_players = None
     filename_suffix = None
+    n_jobs = 1  # lineup generation processes; None uses one per core
 
     print("Welcome to the Lineup Builder")
     GEN_FIELD = False
@@ -72,7 +73,7 @@ if __name__ == "__main__":
             contest = Contest.Contest(contest_id=key, db_interface=db.DFSDBInterface())
 
             # generate a field
-            field = build_field(contest, exclude_players=exclude_players)
+            field = build_field(contest, exclude_players=exclude_players, n_jobs=n_jobs)
             filepath = Contest.field_filename(contest.week, key)
             if filename_suffix is not None:
                 filepath = pathlib.Path((filename_suffix + '.').join(str(filepath).split('.')))
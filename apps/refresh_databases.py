@@ -1,4 +1,6 @@
-from dfsdata.create_db import clean_dfs_tables
+from argparse import ArgumentParser
+
+from dfsdata.create_db import clean_dfs_tables, create_dfs_tables
 from dfsdata.update_tables.update_dfs_tables import DataWrangler
 from dfsdata.interface import DFSDBInterface
 from dfsdata.configure_db import DFS2024Config
@@ -6,9 +8,16 @@ from dfsdata.configure_db import DFS2024Config
 MATCH_PLAYER_NAMES = True
 
 if __name__ == "__main__":
-    # Configure and Clean DFS Tables
+    parser = ArgumentParser()
+    parser.add_argument('-c', '--clean', help='Drop and rebuild the DFS tables, reloading every file', action='store_true', dest='clean', default=False)
+    args = parser.parse_args()
+
+    # Configure DFS Tables.  By default only files that are new or changed since the last refresh are loaded
     dfs_config = DFS2024Config()
-    clean_dfs_tables(dfs_config)
+    if args.clean:
+        clean_dfs_tables(dfs_config)
+    else:
+        create_dfs_tables(dfs_config)
     
     # Update Drafkings data
     wrangler = DataWrangler(DFSDBInterface(dfs_config))
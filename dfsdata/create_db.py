@@ -43,7 +43,8 @@ def drop_dfs_tables(config_in: configure_db.DFSdbConfig = configure_db.defaultDF
             "DROP TABLE IF EXISTS vegas_odds",
             "DROP TABLE IF EXISTS payouts",
             "DROP TABLE IF EXISTS player_game_stats",
-            "DROP TABLE IF EXISTS projections"
+            "DROP TABLE IF EXISTS projections",
+            "DROP TABLE IF EXISTS ingest_manifest"
         ]
 
         db_interface.run_commands(commands)
@@ -239,6 +240,19 @@ def create_dfs_tables(config_in: configure_db.DFSdbConfig = configure_db.default
              uncertainty    decimal NULL,
              PRIMARY KEY (week, player_id)
         );
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS ingest_manifest
+        (
+             path           varchar(1024) PRIMARY KEY,
+             kind           varchar(255) NOT NULL,
+             size           bigint NOT NULL,
+             mtime          double precision NOT NULL,
+             hash           char(64) NOT NULL,
+             status         varchar(32) NOT NULL,
+             loaded_at      timestamp NOT NULL DEFAULT now()
+        );
+        CREATE INDEX IF NOT EXISTS ingest_manifest_kind_idx ON ingest_manifest(kind);
         """
     ]
     try:
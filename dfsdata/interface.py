@@ -1,29 +1,137 @@
 from configparser import ConfigParser
+import atexit
+import contextlib
+import io
+import threading
+import uuid
+import numpy as np
 import psycopg2
-from psycopg2 import extras
+from psycopg2 import extras, pool
 import pandas as pd
 import pathlib
 from typing import List, Dict
 
 from dfsdata import configure_db as db_config_module
+from dfsdata import query_cache
+
+MAX_POOL_CONNECTIONS = 8
+
+# typed fetches parse numeric columns straight to float instead of Decimal
+NUMERIC_AS_FLOAT = psycopg2.extensions.new_type(
+    psycopg2.extensions.DECIMAL.values, 'NUMERIC_AS_FLOAT', lambda value, cur: None if value is None else float(value))
+FLOAT_OIDS = {700, 701, 1700}  # float4, float8, numeric
+INT_OIDS = {20, 21, 23}  # int8, int2, int4
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of connections to one database.  Checkout blocks while all max_connections are in use,
+    instead of raising like psycopg2's ThreadedConnectionPool
+    """
+
+    def __init__(self, db_args: Dict, max_connections: int = MAX_POOL_CONNECTIONS):
+        self._pool = pool.ThreadedConnectionPool(1, max_connections, **db_args)
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def getconn(self):
+        self._slots.acquire()
+        try:
+            return self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def putconn(self, conn):
+        try:
+            self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            self._slots.release()
+
+    def closeall(self):
+        self._pool.closeall()
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def get_connection_pool(db_args: Dict) -> ConnectionPool:
+    """
+    Process-wide connection pool for the database described by db_args, created on first use
+    """
+    key = tuple(sorted(db_args.items()))
+    with _POOLS_LOCK:
+        if key not in _POOLS:
+            _POOLS[key] = ConnectionPool(db_args)
+        return _POOLS[key]
+
+
+@atexit.register
+def close_connection_pools():
+    with _POOLS_LOCK:
+        for connection_pool in _POOLS.values():
+            connection_pool.closeall()
+        _POOLS.clear()
+
+
+def upsert_clause(key: List[str], columns: List[str]) -> str:
+    """
+    ON CONFLICT clause that overwrites every non-key column with the incoming row
+    """
+    updates = ',\n    '.join(f'{col} = EXCLUDED.{col}' for col in columns if col not in key)
+    if not updates:
+        return f'ON CONFLICT ({", ".join(key)}) DO NOTHING'
+    return f'ON CONFLICT ({", ".join(key)}) DO UPDATE SET\n    {updates}'
 
 
 class DFSDBInterface:
+    """
+    Database access through the process-wide connection pool.  Instances are cheap to create and safe to share
+    between threads: each command checks out a pooled connection only while it runs
+    """
 
     db_args: Dict
     db_config: db_config_module.DBConfig
 
-    def __init__(self, ini: db_config_module.DBConfig = db_config_module.defaultDFSConfig):
+    def __init__(self, ini: db_config_module.DBConfig = db_config_module.defaultDFSConfig,
+                 cache: query_cache.QueryCache = None):
+        """
+        :param cache: cache for run_format_command results.  Defaults to the process-wide cache from
+            query_cache.enable_query_cache, if any
+        """
         self.db_args = self.config(ini.INI)
         self.db_config = ini
-        self.conn = psycopg2.connect(**self.db_args)
-        self.cur = self.conn.cursor()
+        self.cache = cache
+        self.pool = get_connection_pool(self.db_args)
 
-    def __del__(self):
-        if self.cur is not None:
-            self.cur.close()
-        if self.conn is not None:
-            self.conn.close()
+    @contextlib.contextmanager
+    def connection(self):
+        """
+        Check out a pooled connection for the duration of the with block
+        """
+        conn = self.pool.getconn()
+        try:
+            yield conn
+        finally:
+            self.pool.putconn(conn)
+
+    @contextlib.contextmanager
+    def cursor(self):
+        """
+        Cursor on a pooled connection.  The transaction is committed when the with block exits normally and rolled
+        back if it raises
+        """
+        with self.connection() as conn:
+            cur = conn.cursor()
+            try:
+                yield cur
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                cur.close()
 
     def config(self, filename, section='postgresql'):
         # create a parser
@@ -42,17 +150,31 @@ class DFSDBInterface:
 
         return db
 
+    def query_cache(self):
+        return self.cache if self.cache is not None else query_cache.get_default_cache()
+
+    def _database_key(self):
+        return tuple(self.db_args.get(arg) for arg in ['host', 'port', 'database', 'dbname', 'user'])
+
+    def _invalidate(self, command):
+        cache = self.query_cache()
+        if cache is not None:
+            tables = query_cache.written_tables(command)
+            if tables:
+                cache.invalidate(tables)
+
     def run_command(self, command, fetch=True):
         result = None
         try:
-            self.cur.execute(command)
-            if fetch:
-                result = self.cur.fetchall()
-                columns = [elt[0] for elt in self.cur.description]
-                result = pd.DataFrame(result, columns=columns)
-            self.conn.commit()
+            with self.cursor() as cur:
+                cur.execute(command)
+                if fetch:
+                    result = cur.fetchall()
+                    columns = [elt[0] for elt in cur.description]
+                    result = pd.DataFrame(result, columns=columns)
         except (Exception, psycopg2.DatabaseError) as error:
             print(error)
+        self._invalidate(command)
         return result
 
     def run_commands(self, commands: List[str]):
@@ -62,39 +184,175 @@ class DFSDBInterface:
         :param commands: list of str commands
         """
         try:
-            for command in commands:
-                self.cur.execute(command)
-                self.conn.commit()
+            with self.cursor() as cur:
+                for command in commands:
+                    cur.execute(command)
+                    cur.connection.commit()
+                    self._invalidate(command)
         except (Exception, psycopg2.DatabaseError) as error:
             print(error)
 
-    def run_format_command(self, command, variable, fetch=True):
+    def run_format_command(self, command, variable, fetch=True, use_cache=True):
+        """
+        Run a parameterized command.  If a query cache is enabled, fetched results are served from and stored in
+        the cache (use_cache=False forces a database round trip); writes invalidate the tables they touch
+        """
+        cache = self.query_cache() if fetch and use_cache else None
+        if cache is not None:
+            key = cache.key(self._database_key(), command, variable)
+            result = cache.get(key)
+            if result is not None:
+                return result
+            versions = cache.table_versions(command)
+        result = None
+        try:
+            with self.cursor() as cur:
+                cur.execute(command, variable)
+                if fetch:
+                    result = cur.fetchall()
+                    columns = [elt[0] for elt in cur.description]
+                    result = pd.DataFrame(result, columns=columns)
+        except (Exception, psycopg2.DatabaseError) as error:
+            print(error)
+        if cache is not None and result is not None:
+            cache.put(key, command, result, versions)
+        self._invalidate(command)
+        return result
+
+    @staticmethod
+    def _typed_column(values: List[tuple], type_code: int) -> np.ndarray:
+        """
+        One result column as an array: float64 for float and numeric columns (NULL as NaN), int64 for integer
+        columns without NULLs, object otherwise
+        """
+        if type_code in FLOAT_OIDS:
+            return np.array(values, dtype=np.float64)
+        if type_code in INT_OIDS and None not in values:
+            return np.array(values, dtype=np.int64)
+        if type_code in INT_OIDS:
+            return np.array(values, dtype=np.float64)
+        return np.fromiter(values, dtype=object, count=len(values))
+
+    def run_typed_query(self, command, variable=None, chunk_size: int = 2 ** 16, use_cache=True) -> pd.DataFrame:
+        """
+        Fetch a query through a server-side cursor, chunk_size rows at a time, into typed columns: numerics come back
+        as float64 (never Decimal) and each chunk is converted to column arrays as it arrives, so large tables
+        (player_games, contest_rosters) load without holding every row as a Python tuple.  Results go through the
+        query cache like run_format_command
+        """
+        cache = self.query_cache() if use_cache else None
+        if cache is not None:
+            key = cache.key(self._database_key() + ('typed',), command, variable)
+            result = cache.get(key)
+            if result is not None:
+                return result
+            versions = cache.table_versions(command)
         result = None
         try:
-            self.cur.execute(command, variable)
-            if fetch:
-                result = self.cur.fetchall()
-                columns = [elt[0] for elt in self.cur.description]
-                result = pd.DataFrame(result, columns=columns)
-            self.conn.commit()
+            with self.connection() as conn:
+                try:
+                    with conn.cursor(name=f'typed_{uuid.uuid4().hex}') as cur:
+                        psycopg2.extensions.register_type(NUMERIC_AS_FLOAT, cur)
+                        cur.itersize = chunk_size
+                        cur.execute(command, variable)
+                        chunks = []
+                        rows = cur.fetchmany(chunk_size)
+                        type_codes = [elt[1] for elt in cur.description]
+                        columns = [elt[0] for elt in cur.description]
+                        while rows:
+                            chunks.append([self._typed_column(list(values), type_code)
+                                           for values, type_code in zip(zip(*rows), type_codes)])
+                            rows = cur.fetchmany(chunk_size)
+                    conn.commit()
+                except Exception:
+                    if not conn.closed:
+                        conn.rollback()
+                    raise
+            if chunks:
+                data = {name: np.concatenate([chunk[i] for chunk in chunks]) for i, name in enumerate(columns)}
+            else:
+                data = {name: [] for name in columns}
+            result = pd.DataFrame(data, columns=columns)
         except (Exception, psycopg2.DatabaseError) as error:
             print(error)
+        if cache is not None and result is not None:
+            cache.put(key, command, result, versions)
         return result
 
     def run_format_insert(self, command: str, data: List[tuple]) -> None:
         try:
-            extras.execute_values(self.cur, command, data, template=None, page_size=100)
-            self.conn.commit()
+            with self.cursor() as cur:
+                extras.execute_values(cur, command, data, template=None, page_size=100)
         except (Exception, psycopg2.DatabaseError) as error:
             print(error)
-            
+        self._invalidate(command)
+
+    @staticmethod
+    def _integral_floats_to_int(data: pd.DataFrame) -> pd.DataFrame:
+        """
+        data with float columns whose values are all whole numbers (or NaN) cast to nullable Int64, so they are
+        written as "1" rather than "1.0"
+        """
+        integral = {}
+        for col in data.columns:
+            if not pd.api.types.is_float_dtype(data[col].dtype):
+                continue
+            values = data[col].dropna().to_numpy()
+            if len(values) > 0 and (np.abs(values) < 2 ** 53).all() and (values == np.round(values)).all():
+                integral[col] = 'Int64'
+        return data.astype(integral) if integral else data
+
+    def copy_upsert(self, data: pd.DataFrame, table: str, conflict: str = 'ON CONFLICT DO NOTHING',
+                    key: List[str] = None, replace_on: List[str] = None) -> bool:
+        """
+        Bulk insert a DataFrame whose columns are named after columns of table.  The rows are streamed with
+        COPY FROM STDIN into a temporary staging table and then moved into table with a single
+        INSERT ... SELECT, so the conflict clause has the same meaning as in a run_format_insert command
+
+        :param data: rows to insert.  Float columns holding only whole numbers and NaN (integer columns that
+            picked up a NaN) are written without a decimal point, which COPY into an integer column requires
+        :param table: target table
+        :param conflict: ON CONFLICT clause of the final insert
+        :param key: conflict key columns.  Rows repeating a key are dropped (keeping the last one) before the
+            upload, since ON CONFLICT DO UPDATE cannot update the same row twice in one statement
+        :param replace_on: if given, rows of table matching any uploaded row on these columns are deleted first (in
+            the same transaction), e.g. replace_on=['contest_id'] swaps in a contest's new payout tiers
+        :return: True if the rows were committed
+        """
+        if len(data) == 0:
+            return True
+        if key is not None:
+            data = data.drop_duplicates(subset=key, keep='last')
+        columns = ', '.join(data.columns)
+        stage = f'stage_{uuid.uuid4().hex}'
+        buffer = io.StringIO()
+        self._integral_floats_to_int(data).to_csv(buffer, index=False, header=False, na_rep='\\N')
+        buffer.seek(0)
+        command = f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {stage} {conflict}'
+        try:
+            with self.cursor() as cur:
+                cur.execute(f'CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {columns} FROM {table} WITH NO DATA')
+                cur.copy_expert(f"COPY {stage} ({columns}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+                if replace_on:
+                    match = ' AND '.join(f'{table}.{col} = {stage}.{col}' for col in replace_on)
+                    cur.execute(f'DELETE FROM {table} USING {stage} WHERE {match}')
+                cur.execute(command)
+        except (Exception, psycopg2.DatabaseError) as error:
+            print(error)
+            return False
+        finally:
+            self._invalidate(command)
+        return True
+
     def run_sql_file(self, filepath: pathlib.Path) -> None:
         try:
-            with self.cur as cursor:
-                cursor.execute(open(filepath, 'r').read())
-            self.conn.commit()
+            with self.cursor() as cur, open(filepath, 'r') as sql_file:
+                cur.execute(sql_file.read())
         except Exception as error:
             print(error)
+        cache = self.query_cache()
+        if cache is not None:
+            cache.invalidate()
     
 if __name__ == "__main__":
     games_db = DFSDBInterface()
\ No newline at end of file
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import pathlib
+from typing import Iterable
+
+import pandas as pd
+
+from dfsdata.interface import DFSDBInterface
+
+MANIFEST_COLUMNS = ['path', 'size', 'mtime', 'hash']
+
+LOADED = 'loaded'
+PARTIAL = 'partial'
+FAILED = 'failed'
+
+
+def file_hash(path, chunk_size: int = 2 ** 20) -> str:
+    """
+    sha256 hex digest of a file, read in chunks
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """
+    Record of the source files loaded into the database (ingest_manifest table): path, size, mtime, sha256 and
+    load status, per kind of file.  A loader asks scan for the files it still has to read and marks them once their
+    rows are committed, so a refresh only parses new or changed files.
+
+    Files whose size and mtime match a loaded record are skipped without being read.  A file with a new mtime
+    is hashed, and only reloaded if its contents changed.  Files marked partial or failed are read again by the
+    next refresh
+    """
+
+    def __init__(self, db: DFSDBInterface):
+        self.db = db
+
+    def records(self, kind: str) -> pd.DataFrame:
+        """
+        Recorded files of a kind, indexed by path
+        """
+        result = self.db.run_format_command(
+            'SELECT path, size, mtime, hash, status FROM ingest_manifest WHERE kind = %s', (kind,), use_cache=False)
+        if result is None or len(result) == 0:
+            return pd.DataFrame(columns=MANIFEST_COLUMNS + ['status']).set_index('path')
+        return result.set_index('path')
+
+    def scan(self, kind: str, files: Iterable[pathlib.Path]) -> pd.DataFrame:
+        """
+        :return: path, size, mtime and hash of the files that are new, changed or not fully loaded, in the order given
+        """
+        recorded = self.records(kind)
+        pending, unchanged = [], []
+        for file in files:
+            path = str(file)
+            stat = os.stat(path)
+            if path in recorded.index:
+                record = recorded.loc[path]
+                loaded = record['status'] == LOADED
+                if loaded and record['size'] == stat.st_size and record['mtime'] == stat.st_mtime:
+                    continue
+                digest = file_hash(path)
+                if loaded and record['hash'] == digest:
+                    unchanged.append((path, stat.st_size, stat.st_mtime, digest))
+                    continue
+            else:
+                digest = file_hash(path)
+            pending.append((path, stat.st_size, stat.st_mtime, digest))
+        if unchanged:
+            # touched but identical: remember the new mtime so the file is not hashed again
+            self.mark(kind, pd.DataFrame(unchanged, columns=MANIFEST_COLUMNS))
+        return pd.DataFrame(pending, columns=MANIFEST_COLUMNS)
+
+    def mark(self, kind: str, files: pd.DataFrame, status: str = LOADED) -> bool:
+        """
+        Record the load status of files returned by scan
+        """
+        files = files[MANIFEST_COLUMNS].assign(kind=kind, status=status)
+        return self.db.copy_upsert(files, 'ingest_manifest',
+                                   """ON CONFLICT (path) DO UPDATE SET
+                                   kind = EXCLUDED.kind,
+                                   size = EXCLUDED.size,
+                                   mtime = EXCLUDED.mtime,
+                                   hash = EXCLUDED.hash,
+                                   status = EXCLUDED.status,
+                                   loaded_at = now()""",
+                                   key=['path'])
@@ -0,0 +1,292 @@
+"""
+Opt-in cache of query results for DFSDBInterface.
+
+Results are keyed on the database, the whitespace-normalized SQL and its parameters.  They are kept in an
+in-memory LRU tier and, if a directory is given, a disk tier (Parquet when pyarrow is installed, pickle otherwise)
+that can be shared between processes.
+
+Each entry records a version of every table its query reads.  Writing to a table through DFSDBInterface bumps the
+table's version, and an entry whose versions are no longer current is a miss.  With a directory the versions are
+files in it, so a write made by one process invalidates the results cached by every process using that directory.
+Every file in the directory is written to a temporary file and moved into place, so readers never see a partial
+write.
+
+Enable it for every DFSDBInterface in the process with enable_query_cache, or pass a QueryCache to one interface.
+"""
+import hashlib
+import json
+import os
+import pathlib
+import re
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+
+import pandas as pd
+
+# stands for "any table" when the tables a query reads cannot be parsed, so that every write invalidates it
+ANY_TABLE = '*'
+# version bumped by a full invalidate, recorded by every entry
+_ALL_TABLES = '_all'
+
+_IDENTIFIER = r'[a-z_][\w$]*(?:\.[a-z_][\w$]*)*'
+_READ_CLAUSE_PATTERN = re.compile(r'\b(from|join)\s+', re.IGNORECASE)
+_FROM_ITEM_PATTERN = re.compile(
+    rf'\s*(?:(?:lateral|only)\s+)?(?:(\()|({_IDENTIFIER})\s*(\()?)', re.IGNORECASE)
+_ALIAS_PATTERN = re.compile(rf'\s*(?:as\s+)?({_IDENTIFIER})', re.IGNORECASE)
+_CLAUSE_KEYWORDS = {
+    'where', 'group', 'order', 'limit', 'offset', 'having', 'window', 'union', 'intersect', 'except', 'for', 'fetch',
+    'returning', 'on', 'using', 'join', 'inner', 'left', 'right', 'full', 'outer', 'cross', 'natural', 'set', 'do'}
+_WRITE_TABLE_PATTERN = re.compile(
+    r'\b(?:insert\s+into|(?<!do )update|delete\s+from|truncate(?:\s+table)?|drop\s+table(?:\s+if\s+exists)?|'
+    r'alter\s+table|copy)\s+([a-z_][\w.]*)', re.IGNORECASE)
+
+
+def normalize_sql(command: str) -> str:
+    return ' '.join(str(command).split()).rstrip(';')
+
+
+def _table_name(name: str) -> str:
+    return name.lower().split('.')[-1]
+
+
+def _skip_parentheses(sql: str, start: int) -> int:
+    """
+    Position just after the parenthesis that closes the one at sql[start]
+    """
+    depth = 0
+    for position in range(start, len(sql)):
+        if sql[position] == '(':
+            depth += 1
+        elif sql[position] == ')':
+            depth -= 1
+            if depth == 0:
+                return position + 1
+    return len(sql)
+
+
+def _from_list_tables(sql: str, position: int, allow_list: bool) -> set:
+    """
+    Tables of the FROM list (or the single JOIN item) starting at position.  Subqueries are skipped, since their
+    own FROM clauses are read separately, and so are function calls such as unnest(...).  An item that cannot be
+    parsed gives ANY_TABLE
+    """
+    tables = set()
+    while True:
+        item = _FROM_ITEM_PATTERN.match(sql, position)
+        if item is None:
+            return tables | {ANY_TABLE}
+        if item.group(1) is not None:
+            position = _skip_parentheses(sql, item.start(1))
+        elif item.group(3) is not None:
+            position = _skip_parentheses(sql, item.start(3))
+        else:
+            if item.group(2).lower() in _CLAUSE_KEYWORDS:
+                return tables | {ANY_TABLE}
+            tables.add(_table_name(item.group(2)))
+            position = item.end()
+        alias = _ALIAS_PATTERN.match(sql, position)
+        if alias is not None and alias.group(1).lower() not in _CLAUSE_KEYWORDS:
+            position = alias.end()
+            if sql[position:position + 2].strip().startswith('('):  # column aliases
+                position = _skip_parentheses(sql, sql.index('(', position))
+        rest = sql[position:].lstrip()
+        if not (allow_list and rest.startswith(',')):
+            return tables
+        position = len(sql) - len(rest) + 1
+
+
+def read_tables(command: str) -> set:
+    """
+    Tables a query reads from (FROM lists and JOIN clauses).  Contains ANY_TABLE if part of a FROM list could not
+    be parsed (e.g. quoted names), in which case a write to any table invalidates the query
+    """
+    sql = normalize_sql(command)
+    tables = set()
+    for clause in _READ_CLAUSE_PATTERN.finditer(sql):
+        tables |= _from_list_tables(sql, clause.end(), allow_list=clause.group(1).lower() == 'from')
+    return tables
+
+
+def written_tables(command: str) -> set:
+    """
+    Tables a command writes to (INSERT, UPDATE, DELETE, TRUNCATE, DROP, ALTER, COPY)
+    """
+    return {_table_name(name) for name in _WRITE_TABLE_PATTERN.findall(normalize_sql(command))}
+
+
+def _atomic_write(path: pathlib.Path, write):
+    """
+    Call write(temporary path) and move the file into place at path
+    """
+    fd, temp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    os.close(fd)
+    try:
+        write(temp)
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+class QueryCache:
+
+    def __init__(self, max_entries: int = 256, directory: pathlib.Path = None):
+        """
+        :param max_entries: number of results kept in memory
+        :param directory: directory for the disk tier and the table versions.  None keeps both in memory only
+        """
+        self.max_entries = max_entries
+        self.directory = None if directory is None else pathlib.Path(directory)
+        self._memory = OrderedDict()  # key -> (DataFrame, {table: version})
+        self._versions = {}  # table -> version, when there is no directory
+        self._lock = threading.RLock()
+        if self.directory is not None:
+            os.makedirs(self._versions_directory, exist_ok=True)
+
+    @property
+    def _versions_directory(self) -> pathlib.Path:
+        return self.directory / 'versions'
+
+    def _version_file(self, table: str) -> pathlib.Path:
+        return self._versions_directory / ('_any' if table == ANY_TABLE else f'{table}.version')
+
+    def _read_version(self, table: str) -> str:
+        if self.directory is None:
+            return self._versions.get(table, '')
+        try:
+            return self._version_file(table).read_text()
+        except FileNotFoundError:
+            return ''
+
+    def _bump_version(self, table: str):
+        version = uuid.uuid4().hex
+        if self.directory is None:
+            self._versions[table] = version
+        else:
+            _atomic_write(self._version_file(table), lambda path: pathlib.Path(path).write_text(version))
+
+    def table_versions(self, command: str) -> dict:
+        """
+        Current versions of the tables command reads.  Take them before running the query and pass them to put, so
+        a write that lands while the query runs still invalidates its result
+        """
+        return {table: self._read_version(table) for table in read_tables(command) | {_ALL_TABLES}}
+
+    def _is_current(self, versions: dict) -> bool:
+        return all(self._read_version(table) == version for table, version in versions.items())
+
+    @staticmethod
+    def key(database, command: str, variable=None) -> str:
+        text = repr((database, normalize_sql(command), variable))
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _disk_file(self, key: str, suffix: str) -> pathlib.Path:
+        return self.directory / f'{key}{suffix}'
+
+    def _remove_disk_entry(self, key: str):
+        for suffix in ['.json', '.parquet', '.pkl']:
+            self._disk_file(key, suffix).unlink(missing_ok=True)
+
+    def get(self, key: str):
+        """
+        Cached result for key (a copy, so callers may modify it), or None if there is none or the tables it read
+        have been written since
+        """
+        with self._lock:
+            if key in self._memory:
+                result, versions = self._memory[key]
+                if self._is_current(versions):
+                    self._memory.move_to_end(key)
+                    return result.copy()
+                del self._memory[key]
+            if self.directory is None:
+                return None
+            try:
+                with open(self._disk_file(key, '.json'), 'r') as file:
+                    entry = json.load(file)
+                if not self._is_current(entry['versions']):
+                    self._remove_disk_entry(key)
+                    return None
+                data_file = self._disk_file(key, entry['suffix'])
+                result = pd.read_parquet(data_file) if entry['suffix'] == '.parquet' else pd.read_pickle(data_file)
+            except (FileNotFoundError, ValueError, KeyError):
+                return None
+            self._remember(key, result, entry['versions'])
+            return result.copy()
+
+    def put(self, key: str, command: str, result: pd.DataFrame, versions: dict = None):
+        """
+        :param versions: table_versions(command) from before the query ran.  Defaults to the current versions
+        """
+        versions = self.table_versions(command) if versions is None else versions
+        with self._lock:
+            self._remember(key, result.copy(), versions)
+            if self.directory is None:
+                return
+            try:
+                _atomic_write(self._disk_file(key, '.parquet'), result.to_parquet)
+                suffix = '.parquet'
+            except (ImportError, ValueError, TypeError):
+                # no parquet engine installed, or column types parquet cannot hold
+                _atomic_write(self._disk_file(key, '.pkl'), result.to_pickle)
+                suffix = '.pkl'
+            entry = json.dumps({'versions': versions, 'suffix': suffix})
+            _atomic_write(self._disk_file(key, '.json'), lambda path: pathlib.Path(path).write_text(entry))
+
+    def _remember(self, key: str, result: pd.DataFrame, versions: dict):
+        self._memory[key] = (result, versions)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def invalidate(self, tables=None):
+        """
+        Drop cached results that read from any of tables (all results if tables is None), in this process and in
+        every process sharing the cache directory
+        """
+        with self._lock:
+            if tables is None:
+                self._bump_version(_ALL_TABLES)
+                self._memory.clear()
+                if self.directory is not None:
+                    for entry in self.directory.glob('*.json'):
+                        self._remove_disk_entry(entry.stem)
+                return
+            tables = {_table_name(table) for table in tables}
+            for table in tables | {ANY_TABLE}:
+                self._bump_version(table)
+            stale = [key for key, (_, versions) in self._memory.items() if set(versions) & (tables | {ANY_TABLE})]
+            for key in stale:
+                del self._memory[key]
+                if self.directory is not None:
+                    self._remove_disk_entry(key)
+
+    def __len__(self):
+        with self._lock:
+            if self.directory is None:
+                return len(self._memory)
+            return len(list(self.directory.glob('*.json')))
+
+
+_DEFAULT_CACHE = None
+
+
+def enable_query_cache(max_entries: int = 256, directory: pathlib.Path = None) -> QueryCache:
+    """
+    Use one QueryCache for every DFSDBInterface in this process that is not given its own
+    """
+    global _DEFAULT_CACHE
+    _DEFAULT_CACHE = QueryCache(max_entries, directory)
+    return _DEFAULT_CACHE
+
+
+def disable_query_cache():
+    global _DEFAULT_CACHE
+    _DEFAULT_CACHE = None
+
+
+def get_default_cache():
+    return _DEFAULT_CACHE
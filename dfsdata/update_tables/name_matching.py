@@ -0,0 +1,78 @@
+import re
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+NAME_SUFFIXES = {'jr', 'sr', 'ii', 'iii', 'iv', 'v'}
+
+
+def normalize_name(name: str) -> str:
+    """
+    Lower case, no punctuation and no generational suffix, e.g. "D.J. Moore Jr." -> "dj moore"
+    """
+    words = re.sub(r'[^a-z0-9 ]', '', str(name).lower().replace('-', ' ')).split()
+    return ' '.join(word for word in words if word not in NAME_SUFFIXES)
+
+
+def trigram_matrices(*name_lists: List[str]) -> list:
+    """
+    Sparse (name x trigram) count matrices over a shared trigram vocabulary, one per list of names, with each row
+    scaled to unit length so that a matrix product gives cosine similarities
+    """
+    from scipy import sparse
+
+    vocabulary: Dict[str, int] = {}
+    coordinates = []
+    for names in name_lists:
+        rows, columns = [], []
+        for i, name in enumerate(names):
+            padded = f'  {normalize_name(name)} '
+            for j in range(len(padded) - 2):
+                rows.append(i)
+                columns.append(vocabulary.setdefault(padded[j:j + 3], len(vocabulary)))
+        coordinates.append((len(names), rows, columns))
+
+    matrices = []
+    for n, rows, columns in coordinates:
+        counts = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(n, max(len(vocabulary), 1)))
+        norms = np.sqrt(np.asarray(counts.multiply(counts).sum(axis=1)).ravel())
+        matrices.append(sparse.diags(1. / np.where(norms > 0, norms, 1.)) @ counts)
+    return matrices
+
+
+def fuzzy_candidates(queries: pd.DataFrame, choices: pd.DataFrame, limit: int = 5,
+                     team_bonus: float = 10.) -> pd.DataFrame:
+    """
+    Best fuzzy matches of each query player among the choices, scored in one batch.
+
+    Both tables have Player, Pos and Team columns.  Players are compared within the same position, by the
+    cosine similarity of their name trigrams (0-100); a choice on the same team as the query ranks team_bonus
+    points higher, which settles common names without hiding a traded player.  A position with no choices (e.g.
+    'D/ST' against DraftKings' 'DST') is compared against every choice instead.
+
+    :return: one row per candidate with query (index label in queries), choice (index label in choices), score and
+        same_team, ordered by query and then best candidate first
+    """
+    results = []
+    for position, query_block in queries.groupby('Pos', sort=False):
+        choice_block = choices[choices['Pos'] == position]
+        if len(choice_block) == 0:
+            choice_block = choices
+        if len(choice_block) == 0:
+            continue
+        query_matrix, choice_matrix = trigram_matrices(list(query_block['Player']), list(choice_block['Player']))
+        scores = 100. * (query_matrix @ choice_matrix.T).toarray()
+        same_team = (query_block['Team'].to_numpy(dtype=object)[:, None]
+                     == choice_block['Team'].to_numpy(dtype=object)[None, :])
+        order = np.argsort(-(scores + team_bonus * same_team), axis=1, kind='stable')[:, :limit]
+        rows = np.arange(len(query_block))[:, None]
+        results.append(pd.DataFrame({
+            'query': np.repeat(query_block.index.values, order.shape[1]),
+            'choice': choice_block.index.values[order].ravel(),
+            'score': scores[rows, order].ravel(),
+            'same_team': same_team[rows, order].ravel(),
+        }))
+    if not results:
+        return pd.DataFrame({'query': [], 'choice': [], 'score': [], 'same_team': []})
+    return pd.concat(results, ignore_index=True)
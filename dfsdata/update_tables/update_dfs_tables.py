@@ -4,11 +4,12 @@ import datetime
 
 import pandas as pd
 import numpy as np
-from fuzzywuzzy import process
 
-from dfsdata.interface import DFSDBInterface
+from dfsdata.interface import DFSDBInterface, upsert_clause
 from dfsdata.path_name import ContestDataNames
-from dfsdata import configure_db, path_name
+from dfsdata import configure_db, manifest, path_name
+from dfsdata.manifest import IngestManifest
+from dfsdata.update_tables import name_matching
 from dfsutil import dk_utils as dk
 
 
@@ -16,10 +17,12 @@ class DataWrangler:
 
     _db: DFSDBInterface
     _dk_names: ContestDataNames
+    _manifest: IngestManifest
 
     def __init__(self, db: DFSDBInterface):
         self._db = db
         self._dk_names = ContestDataNames(db.db_config)
+        self._manifest = IngestManifest(db)
 
     @property
     def db(self):
@@ -29,39 +32,32 @@ class DataWrangler:
     def dk_names(self):
         return self._dk_names
 
-    def read_contest_data(self):
+    @property
+    def manifest(self):
+        return self._manifest
+
+    def read_contest_data(self, contest_table_files=None):
+        """
+        Guaranteed, non-Madden contests of the given contest table files (default: all of them), with the
+        detail_file of each contest (NaN if it was not downloaded yet) and the source_file it was read from
+        """
         # read tables to get list of contest ids
-        # filter out Madden streams, duplicates, and contests that don't have a details file
-        contest_table_files = self.dk_names.contest_table_files()
-        contest_table = pd.concat([pd.read_csv(f) for f in contest_table_files]).drop_duplicates(
-            subset='contest_id')
+        # filter out Madden streams and duplicates
+        if contest_table_files is None:
+            contest_table_files = self.dk_names.contest_table_files()
+        contest_table = pd.concat([pd.read_csv(f).assign(source_file=str(f)) for f in contest_table_files])
+        contest_table = contest_table.drop_duplicates(subset='contest_id')
         contest_table = contest_table.loc[
             (contest_table['contest_type'] != 'Madden Stream') & contest_table['guaranteed']]
 
-        # get list of details files and drop extras from contest table
+        # get list of details files
         detail_files = self.dk_names.contest_details_files()
         detail_file_dict = {self.dk_names.filename_to_id(filename): str(filename) for filename in detail_files}
         contest_table['detail_file'] = contest_table['contest_id'].map(detail_file_dict)
-        contest_table = contest_table.dropna()
-
-        # get list of already-indexed contests
-        contests_indexed = self.db.run_command('SELECT contest_id FROM contests')
-        try:
-            contests_indexed_list = [int(c[0]) for c in contests_indexed]
-        except ValueError: # no contests in database
-            contests_indexed_list = []
-        return contest_table[~contest_table['contest_id'].isin(contests_indexed_list)]
+        return contest_table
 
-    def insert_contest_data(self, contest_table: pd.DataFrame):
+    def insert_contest_data(self, contest_table: pd.DataFrame) -> bool:
         if len(contest_table) > 0:
-            contest_command = """INSERT into contests (
-                contest_id, double_up, draft_group_id, fifty_fifty, guaranteed, head_to_head, name,
-                payout, starred, starts_at, week, entries_max, entries_fee, contest_type, games_count,
-                multientry, max_entry_fee, rake )
-                values %s
-                ON CONFLICT DO NOTHING
-                """
-
             # add week column
             contest_table['week'] = [dk.get_nfl_week(self.db.db_config.YEAR, int(dateutil.parser.isoparse(cstart).timestamp()))
                                      for cstart in contest_table['starts_at']]
@@ -69,64 +65,71 @@ class DataWrangler:
             # read detail files and get multientry and max_entry_fee
             multientry_dict = {}
             for cid, filename in zip(contest_table['contest_id'], contest_table['detail_file']):
-                f = open(filename)
-                file_data = json.load(f)
+                with open(filename) as f:
+                    file_data = json.load(f)
                 multientry_dict[cid] = file_data['contestDetail']['maximumEntriesPerUser']
 
             contest_table['multientry'] = contest_table['contest_id'].map(multientry_dict)
             contest_table['max_entry_fee'] = contest_table['multientry'] * contest_table['entries_fee']
 
-            def rake(efee, emax, payout):
-                if efee == 0 or emax == 999999999:
-                    return 100
-                decimal = 100. * (1.0 - payout / emax / efee)
-                return decimal
-            contest_table['rake'] = contest_table.apply(lambda x: rake(x['entries_fee'], x['entries_maximum'], x['payout']), axis=1)
+            efee = contest_table['entries_fee'].astype(float)
+            emax = contest_table['entries_maximum'].astype(float)
+            no_rake = (efee == 0) | (emax == 999999999)
+            contest_table['rake'] = np.where(
+                no_rake, 100., 100. * (1.0 - contest_table['payout'] / emax.where(~no_rake, 1.) / efee.where(~no_rake, 1.)))
 
             # Prepare and insert contest data
             contest_table = contest_table[['contest_id', 'double_up', 'draft_group_id', 'fifty_fifty',
                                            'guaranteed', 'head_to_head', 'name', 'payout', 'starred',
                                            'starts_at', 'week', 'entries_maximum', 'entries_fee', 'contest_type_id',
                                            'games_count', 'multientry', 'max_entry_fee', 'rake']]
-            data_to_insert = [tuple(row.values.tolist()) for idx, row in contest_table.iterrows()]
-            self.db.run_format_insert(contest_command, data_to_insert)
+            contest_table.columns = [
+                'contest_id', 'double_up', 'draft_group_id', 'fifty_fifty', 'guaranteed', 'head_to_head', 'name',
+                'payout', 'starred', 'starts_at', 'week', 'entries_max', 'entries_fee', 'contest_type', 'games_count',
+                'multientry', 'max_entry_fee', 'rake']
+            return self.db.copy_upsert(contest_table, 'contests',
+                                       upsert_clause(['contest_id'], contest_table.columns), key=['contest_id'])
+        return True
+
+    def insert_contests(self):
+        """
+        Load the contest table files that are new or changed since the last refresh.  A file with contests whose
+        details were not downloaded yet is marked partial, so it is read again once the details arrive
+        """
+        print('Inserting contests...')
+        files = self.manifest.scan('contest_table', self.dk_names.contest_table_files())
+        if len(files) == 0:
+            return
+        contest_data = self.read_contest_data(files['path'])
+        waiting = set(contest_data.loc[contest_data['detail_file'].isna(), 'source_file'])
+        if not self.insert_contest_data(contest_data.drop(columns='source_file').dropna()):
+            self.manifest.mark('contest_table', files, manifest.FAILED)
+            return
+        partial = files['path'].isin(waiting)
+        self.manifest.mark('contest_table', files[~partial], manifest.LOADED)
+        self.manifest.mark('contest_table', files[partial], manifest.PARTIAL)
 
     def insert_contests_2023(self):
-        print('Inserting contests...')
-        contest_data = self.read_contest_data()
-        self.insert_contest_data(contest_data)
+        self.insert_contests()
     
     def insert_contests_2024(self):
-        print('Inserting contests...')
-        contest_data = self.read_contest_data()
-        self.insert_contest_data(contest_data)
+        self.insert_contests()
 
     def insert_draftables(self):
         # list files to be added
-        files_existing = self.dk_names.draft_group_files()
-        draft_groups_indexed = self.db.run_command('SELECT DISTINCT draft_group_id FROM draftables')
-        if draft_groups_indexed is None:
-            draft_groups_indexed_list = []
-        else:
-            draft_groups_indexed_list = [c[0] for c in draft_groups_indexed]
-        files_to_add = [file for file in files_existing if self.dk_names.filename_to_id(file) not in draft_groups_indexed_list]
+        files = self.manifest.scan('draft_group', self.dk_names.draft_group_files())
+        files_to_add = list(files['path'])
 
         if len(files_to_add) > 0:
             print('Inserting draftables...')
-            # loop data files and accumulate in a list of tuples
-            # insert draft group data one file at a time
-            command = """INSERT into draftables (
-                id, team_id, team_abbreviation, player_id, draft_group_id, competition_id, name, position,
-                roster_slot_id, salary, swappable, disabled )
-                values %s
-                ON CONFLICT DO NOTHING
-            """
-            comp_command = """INSERT INTO competitions (
-                id, name, starts_at, week, home_team_id, home_team_name, home_team_abbreviation, home_team_city,
-                away_team_id, away_team_name, away_team_abbreviation, away_team_city )
-                VALUES %s
-                ON CONFLICT DO NOTHING
-            """
+            # loop data files and accumulate in a list of tuples, then insert all draft groups at once
+            draftable_columns = [
+                'id', 'team_id', 'team_abbreviation', 'player_id', 'draft_group_id', 'competition_id', 'name',
+                'position', 'roster_slot_id', 'salary', 'swappable', 'disabled']
+            competition_columns = [
+                'id', 'name', 'starts_at', 'week', 'home_team_id', 'home_team_name', 'home_team_abbreviation',
+                'home_team_city', 'away_team_id', 'away_team_name', 'away_team_abbreviation', 'away_team_city']
+            data = []
             competitions_dict = {}
 
             for file in files_to_add:
@@ -135,12 +138,11 @@ class DataWrangler:
                     file_data = json.load(f)
                 players = file_data['draftables']
                 competitions = file_data['competitions']
-                data = [(
+                data.extend((
                     player['id'], player['team_id'], player['team_abbreviation'], player['player_id'], dgid,
                     player['competition']['id'], player['names']['display'].strip(), player['position'],
                     player['roster_slot_id'], player['salary'], player['swappable'], player['disabled']
-                ) for player in players if player['competition'] is not None]
-                self.db.run_format_insert(command, data)
+                ) for player in players if player['competition'] is not None)
 
                 for c in competitions:
                     if c['id'] not in competitions_dict.keys():
@@ -152,17 +154,21 @@ class DataWrangler:
                                                       home['id'], home['name'], home['abbreviation'], home['city'],
                                                       away['id'], away['name'], away['abbreviation'], away['city'])
 
+            # re-downloaded draft groups carry new salaries and disabled flags, so changed files overwrite rows
+            loaded = self.db.copy_upsert(pd.DataFrame(data, columns=draftable_columns), 'draftables',
+                                         upsert_clause(['id'], draftable_columns), key=['id'])
+
             # update competitions list
             comp_data = [(ckey,) + competitions_dict[ckey] for ckey in competitions_dict.keys()]
-            self.db.run_format_insert(comp_command, comp_data)
+            loaded &= self.db.copy_upsert(pd.DataFrame(comp_data, columns=competition_columns), 'competitions',
+                                          upsert_clause(['id'], competition_columns), key=['id'])
+            self.manifest.mark('draft_group', files, manifest.LOADED if loaded else manifest.FAILED)
 
     def insert_payouts(self):
         print("Inserting payout stats...")
         # get files to add
-        files_existing = self.dk_names.contest_details_files()
-        contests_indexed = self.db.run_command('SELECT DISTINCT contest_id FROM payouts')
-        contests_indexed_list = [c[0] for c in contests_indexed]
-        files_to_add = [file for file in files_existing if self.dk_names.filename_to_id(file) not in contests_indexed_list]
+        files = self.manifest.scan('contest_details', self.dk_names.contest_details_files())
+        files_to_add = list(files['path'])
         cid_to_add = [self.dk_names.filename_to_id(file) for file in files_to_add]
 
         # load files into a list
@@ -190,18 +196,23 @@ class DataWrangler:
                 temp_payout = (p['minPosition'], p['maxPosition'], cash, ticket)
                 payout_flat.append(temp_payout)
 
-            ins_data = ins_data + [(payout[0],) + places for places in payout_flat]
+            ins_data.extend((payout[0],) + places for places in payout_flat)
 
-        ins_command = '''INSERT INTO payouts(
-                        contest_id, min_position, max_position, payout_cash, payout_tickets
-                        ) VALUES %s ON CONFLICT DO NOTHING'''
-        self.db.run_format_insert(ins_command, ins_data)
+        ins_data = pd.DataFrame(ins_data, columns=['contest_id', 'min_position', 'max_position', 'payout_cash',
+                                                   'payout_tickets'])
+        # a changed details file replaces all of the contest's payout tiers
+        loaded = self.db.copy_upsert(ins_data, 'payouts',
+                                     upsert_clause(['contest_id', 'min_position'], ins_data.columns),
+                                     key=['contest_id', 'min_position'], replace_on=['contest_id'])
+        self.manifest.mark('contest_details', files, manifest.LOADED if loaded else manifest.FAILED)
 
     def match_player_names(self, player_pos_team: pd.DataFrame = None):
         """Check players_dict for matches to dk player_id
 
         for players in player_pos_team but not in players_dict, we want to
-        find the matching draftkings name and player_id
+        find the matching draftkings name and player_id.  Exact (name, position) matches and defenses are
+        resolved with merges; every other player is scored against the draftkings names at the same position
+        (see name_matching.fuzzy_candidates) before the user is asked to pick the matches.
 
         :param player_pos_team (pd.DataFrame): columns: ['Player', 'Pos', 'Team'].  List of players to match
         :return: None
@@ -213,50 +224,70 @@ class DataWrangler:
         # get dk players
         players_dk = self.db.run_command('SELECT DISTINCT player_id, name, position, team_abbreviation FROM draftables')
         players_dk = players_dk.rename(columns={'name': 'Player', 'position': 'Pos', 'team_abbreviation': 'Team'})
+        players_dk['player_id'] = players_dk['player_id'].astype(int)
 
-        insert_command = """INSERT INTO players_dict (
-                    player_name, position, team, draftkings_name, player_id)
-                    VALUES %s
-                    ON CONFLICT DO NOTHING
-                    """
-        for idx, player_row in player_pos_team.iterrows():
-            # get matches from players_dict.  If players_dict does not already have an entry, continue
-            player_table = self.db.run_format_command('SELECT * FROM players_dict WHERE player_name = %s AND position = %s AND team = %s', (player_row['Player'], player_row['Pos'], player_row['Team']))
-            if len(player_table) == 0:
-                # if player already matches a DK player, add the player_id to players_dict
-                match_rows = players_dk.loc[(players_dk['Player'] == player_row['Player'])
-                                            & (players_dk['Pos'] == player_row['Pos'])].reset_index()
-                if len(match_rows) >= 1:
-                    ins_data = [tuple(player_row.values.tolist()) + (match_rows.at[0, 'Player'], str(match_rows.at[0, 'player_id']))]
-                    self.db.run_format_insert(insert_command, ins_data)
-                else:
-                    # if player does not match a DK player, display nearest matches and allow user to enter a player_id
-                    # if player is a defense, match the last word in their name
-                    if player_row['Pos'] == 'DST':
-                        dk_name = player_row['Player'].split()[-1]
-                        dk_id = players_dk.loc[players_dk['Player'] == dk_name, 'player_id']
-                        if len(dk_id) > 0:
-                            match_id = str(dk_id.iloc[0])
-                        else:
-                            match_id = '0'
-                    else:
-                        print('Matching for player:')
-                        print(player_row.values)
-                        matches = process.extract(player_row['Player'], players_dk['Player'].values, limit=5)
-                        match_display = players_dk[players_dk['Player'].isin([player[0] for player in matches])]
-                        print('Potential matches:')
-                        print(match_display[:])
-                        match_id = input('Enter the matching player id (Enter 0 if no match):')
-
-                    if not(match_id == '0'):
-                        dk_player = self.db.run_format_command('SELECT player_id, name FROM draftables WHERE player_id = %s LIMIT 1', (match_id, ))
-                        ins_data = [tuple(player_row.values.tolist()) + (dk_player.loc[0, 'name'], int(dk_player.loc[0, 'player_id']))]
-                        self.db.run_format_insert(insert_command, ins_data)
-                        print('Match successful!')
-                    else:
-                        ins_data = [tuple(player_row.values.tolist()) + ('', 0)]
-                        self.db.run_format_insert(insert_command, ins_data)
-                        print('No match found!')
+        # players that do not have a players_dict entry yet
+        players_dict = self.db.run_command('SELECT player_name, position, team FROM players_dict').rename(
+            columns={'player_name': 'Player', 'position': 'Pos', 'team': 'Team'})
+        players = player_pos_team[['Player', 'Pos', 'Team']].drop_duplicates()
+        players = players.merge(players_dict, how='left', on=['Player', 'Pos', 'Team'], indicator=True)
+        players = players[players['_merge'] == 'left_only'].drop(columns='_merge').reset_index(drop=True)
+        if len(players) == 0:
+            return
+
+        # if player already matches a DK player, add the player_id to players_dict (same team first)
+        exact = players.reset_index().merge(players_dk, how='inner', on=['Player', 'Pos'], suffixes=('', '_dk'))
+        exact['same_team'] = exact['Team'] == exact['Team_dk']
+        exact = exact.sort_values(by=['index', 'same_team'], ascending=[True, False], kind='stable')
+        exact = exact.drop_duplicates(subset='index').set_index('index')
+        players['draftkings_name'] = exact['Player']
+        players['player_id'] = exact['player_id']
+
+        # if player is a defense, match the last word in their name
+        dst = players['player_id'].isna() & (players['Pos'] == 'DST')
+        dk_ids = players_dk.drop_duplicates(subset='Player').set_index('Player')['player_id']
+        dst_names = players.loc[dst, 'Player'].str.split().str[-1]
+        players.loc[dst, 'draftkings_name'] = dst_names.where(dst_names.isin(dk_ids.index), '')
+        players.loc[dst, 'player_id'] = dst_names.map(dk_ids).fillna(0)
+
+        resolved = players['player_id'].notna()
+        self.insert_player_matches(players[resolved])
+
+        # if player does not match a DK player, display nearest matches and allow user to enter a player_id
+        unmatched = players[~resolved]
+        if len(unmatched) == 0:
+            return
+        candidates = name_matching.fuzzy_candidates(unmatched, players_dk)
+        dk_names = players_dk.drop_duplicates(subset='player_id').set_index('player_id')['Player']
+        matches = []
+        for idx, player_row in unmatched[['Player', 'Pos', 'Team']].iterrows():
+            print('Matching for player:')
+            print(player_row.to_numpy(dtype=object))
+            player_candidates = candidates[candidates['query'] == idx]
+            match_display = players_dk.loc[player_candidates['choice']].assign(
+                score=player_candidates['score'].round(1).values)
+            print('Potential matches:')
+            print(match_display[:])
+            match_id = input('Enter the matching player id (Enter 0 if no match):').strip()
+
+            if match_id.isdigit() and int(match_id) in dk_names.index:
+                matches.append((dk_names[int(match_id)], int(match_id)))
+                print('Match successful!')
+            else:
+                matches.append(('', 0))
+                print('No match found!')
+        unmatched = unmatched.assign(draftkings_name=[m[0] for m in matches], player_id=[m[1] for m in matches])
+        self.insert_player_matches(unmatched)
+
+    def insert_player_matches(self, matches: pd.DataFrame):
+        """
+        :param matches: columns: ['Player', 'Pos', 'Team', 'draftkings_name', 'player_id'].  player_id 0 records a
+            player without a draftkings match
+        """
+        matches = matches.rename(columns={'Player': 'player_name', 'Pos': 'position', 'Team': 'team'})
+        matches = matches[['player_name', 'position', 'team', 'draftkings_name', 'player_id']].astype(
+            {'player_id': int})
+        self.db.copy_upsert(matches, 'players_dict')
 
     def match_player_names_2023(self):
         print('Matching player names...')
@@ -310,13 +341,10 @@ class DataWrangler:
         points_fp = points_fp[points_fp['player_id'] != 0]
         points_fp = points_fp.drop(columns=['Player', 'Pos', 'Team'])
 
-        data_to_insert = [tuple(row.values.tolist()) for idx, row in points_fp.iterrows()]
-        ins_command = '''INSERT INTO projections(
-                        player_id, week, fpros_projection
-                        ) VALUES %s
-                        ON CONFLICT ON CONSTRAINT projections_pkey
-                        DO UPDATE SET fpros_projection = EXCLUDED.fpros_projection'''
-        self.db.run_format_insert(ins_command, data_to_insert)
+        self.db.copy_upsert(points_fp, 'projections',
+                            '''ON CONFLICT ON CONSTRAINT projections_pkey
+                            DO UPDATE SET fpros_projection = EXCLUDED.fpros_projection''',
+                            key=['player_id', 'week'])
 
     def insert_ffanalytics_projections(self):
         ff_files = self.dk_names.ffanalytics_files()
@@ -327,11 +355,7 @@ class DataWrangler:
         points_ffa = points_ffa[points_ffa['player_id'] != 0]
         points_ffa = points_ffa.drop(columns=['Player', 'Pos', 'Team'])[['week', 'player_id', 'projection_ppr', 'sd_pts', 'dropoff', 'floor', 'ceiling', 'points_vor', 'floor_vor', 'ceiling_vor', 'uncertainty']].drop_duplicates(subset=['week', 'player_id'])
 
-        data_to_insert = [tuple(row.values.tolist()) for idx, row in points_ffa.iterrows()]
-        ins_command = '''INSERT INTO projections(
-                        week, player_id, projection_ppr, sd_pts, dropoff, floor, ceiling, points_vor, floor_vor, ceiling_vor, uncertainty
-                        ) VALUES %s
-                        ON CONFLICT ON CONSTRAINT projections_pkey
+        conflict = '''ON CONFLICT ON CONSTRAINT projections_pkey
                         DO UPDATE SET projection_ppr = EXCLUDED.projection_ppr
                         '''
         '''
@@ -344,7 +368,7 @@ class DataWrangler:
         DO UPDATE SET ceiling_vor = EXCLUDED.ceiling_vor
         DO UPDATE SET uncertainty = EXCLUDED.uncertainty
         '''
-        self.db.run_format_insert(ins_command, data_to_insert)
+        self.db.copy_upsert(points_ffa, 'projections', conflict, key=['week', 'player_id'])
 
     def insert_player_results_2023(self):
         file = self.dk_names.player_game_file(2023)
@@ -356,14 +380,10 @@ class DataWrangler:
         player_games = player_games[player_games['player_id'] != 0]
         player_games = player_games[['Week', 'player_id', 'fpts_ppr']].rename(columns={'Week': 'week'})
 
-        data_to_insert = [tuple(row.values.tolist()) for idx, row in player_games.iterrows()]
-        ins_command = '''INSERT INTO player_game_stats(
-                                week, player_id, fpts_ppr
-                                ) VALUES %s
-                                ON CONFLICT ON CONSTRAINT player_game_stats_pkey
-                                DO UPDATE SET fpts_ppr = EXCLUDED.fpts_ppr
-                                '''
-        self.db.run_format_insert(ins_command, data_to_insert)
+        self.db.copy_upsert(player_games, 'player_game_stats',
+                            '''ON CONFLICT ON CONSTRAINT player_game_stats_pkey
+                            DO UPDATE SET fpts_ppr = EXCLUDED.fpts_ppr''',
+                            key=['week', 'player_id'])
         
     def insert_vegas_data(self):
         competitions = self.db.run_command('SELECT * from competitions')
@@ -418,14 +438,11 @@ class DataWrangler:
         vegas_columns = [
             'week', 'home_team_abbreviation', 'away_team_abbreviation', 'spread', 'over_under', 'last_updated'
         ]
-        data_to_insert = [tuple(row.values.tolist()) for _, row in merged[vegas_columns].iterrows()]
-        ins_command = '''INSERT INTO vegas_odds(
-                        week, home_team_abbreviation, away_team_abbreviation, spread, over_under, last_updated
-                        ) VALUES %s
-                        ON CONFLICT ON CONSTRAINT vegas_odds_pkey
-                        DO UPDATE 
-                        SET 
+        conflict = '''ON CONFLICT ON CONSTRAINT vegas_odds_pkey
+                        DO UPDATE
+                        SET
                         spread = EXCLUDED.spread,
                         over_under = EXCLUDED.over_under,
                         last_updated = EXCLUDED.last_updated'''
-        self.db.run_format_insert(ins_command, data_to_insert)
\ No newline at end of file
+        self.db.copy_upsert(merged[vegas_columns], 'vegas_odds', conflict,
+                            key=['week', 'home_team_abbreviation', 'away_team_abbreviation'])
\ No newline at end of file
@@ -32,20 +32,14 @@ class SeasonData:
         
         # For now let's just insert all every time
         if len(players_table) > 0:
-            player_game_command = """INSERT into player_games (
-                player_name, pos, fpts_dk, season, game_num, week_num, date, team, opp_team, home_team
-                )
-                values %s
-                ON CONFLICT DO NOTHING
-                """
-            
             # Prepare and insert player-game data
-            columns = [
-                'Player', 'Pos.', 'FantasyDKPt', 'season', 'Game_num', 'Week_num', 'Date', 'Team', 'Opp', 'home_team'
-            ]
-            players_table = players_table[columns]
-            data_to_insert = [tuple(row.values.tolist()) for idx, row in players_table.iterrows()]
-            self.db.run_format_insert(player_game_command, data_to_insert)
+            columns = {
+                'Player': 'player_name', 'Pos.': 'pos', 'FantasyDKPt': 'fpts_dk', 'season': 'season',
+                'Game_num': 'game_num', 'Week_num': 'week_num', 'Date': 'date', 'Team': 'team', 'Opp': 'opp_team',
+                'home_team': 'home_team'
+            }
+            players_table = players_table[list(columns)].rename(columns=columns)
+            self.db.copy_upsert(players_table, 'player_games')
         else:
             print('Error: No player-game data read')
             exit(1)
@@ -62,20 +56,14 @@ class SeasonData:
         
         # For now let's just insert all every time
         if len(teams_table) > 0:
-            player_game_command = """INSERT into team_games (
-                team, date, pts, td, over_under, day, game_num, week_num, season, opp_team, home_team, result
-                )
-                values %s
-                ON CONFLICT DO NOTHING
-                """
-            
-            # Prepare and insert player-game data
-            columns = [
-                'Team', 'Date', 'Pts', 'TD', 'Over/Under', 'Day', 'G#', 'Week', 'season', 'Opp', 'home_team', 'Result'
-            ]
-            teams_table = teams_table[columns]
-            data_to_insert = [tuple(row.values.tolist()) for idx, row in teams_table.iterrows()]
-            self.db.run_format_insert(player_game_command, data_to_insert)
+            # Prepare and insert team-game data
+            columns = {
+                'Team': 'team', 'Date': 'date', 'Pts': 'pts', 'TD': 'td', 'Over/Under': 'over_under', 'Day': 'day',
+                'G#': 'game_num', 'Week': 'week_num', 'season': 'season', 'Opp': 'opp_team', 'home_team': 'home_team',
+                'Result': 'result'
+            }
+            teams_table = teams_table[list(columns)].rename(columns=columns)
+            self.db.copy_upsert(teams_table, 'team_games')
         else:
             print('Error: No player-game data read')
             exit(1)
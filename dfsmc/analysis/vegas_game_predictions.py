@@ -127,6 +127,20 @@ def set_cumulative_averages(df: pd.DataFrame):
     df = df[non_cum_columns].merge(df_cum[list(set(['team_name_abbr', 'game_num'] + all_cum_columns(df_cum.columns)))], on=['team_name_abbr', 'game_num'])
     return df
 
+def clock_minutes(column: pd.Series, leading_minutes: float) -> pd.Series:
+    """
+    Minutes from a stathead clock column.  Newer scrapes hold floats in units of the leading field, older season
+    CSVs still hold the clock text ('3:05', '31:14'); either may appear, even in the same column
+
+    :param leading_minutes: minutes per unit of the leading field: 60 for H:MM, 1 for MM:SS
+    """
+    is_clock = column.map(lambda val: isinstance(val, str) and ':' in val).astype(bool)
+    minutes = pd.to_numeric(column.where(~is_clock), errors='coerce') * leading_minutes
+    if is_clock.any():
+        parts = column[is_clock].str.split(':', expand=True).astype(float)
+        minutes[is_clock] = leading_minutes * (parts[0] + parts[1] / 60.)
+    return minutes
+
 def get_data(year):
     projector = projection_data.PlayerProjectionData(year, None, output_data=True)
     
@@ -144,8 +158,8 @@ def get_data(year):
     df = df.T.drop_duplicates().T.sort_values(by='week_num', ascending=True).reset_index().drop(columns=['index']) # drop duplicate columns and sort
     
     # clean some data types
-    df['duration'] = [60*float(val.split(':')[0]) + float(val.split(':')[1]) for val in df['duration'].values] # float minutes
-    df['time_of_poss'] = [float(val.split(':')[0]) + float(val.split(':')[1])/60. for val in df['time_of_poss'].values] # float minutes
+    df['duration'] = clock_minutes(df['duration'], 60.) # H:MM, float minutes
+    df['time_of_poss'] = clock_minutes(df['time_of_poss'], 1.) # MM:SS, float minutes
     df[NUMERICAL_INPUTS + NUMERICAL_RESULTS] = df[NUMERICAL_INPUTS + NUMERICAL_RESULTS].astype(float).fillna(0.0)
     
     # Add computed columns
@@ -1,13 +1,14 @@
 import pandas as pd
 import numpy as np
 import pathlib
-from typing import List
+from typing import Iterator, List, Tuple
 import os
 
 from dfsdata.interface import DFSDBInterface
 from dfsmc.projection import covariance
 
 from dfsscrape.config import DATA_DUMP_2024
+from dfsutil import rng
 
 class Contest:
 
@@ -51,35 +52,58 @@ class Contest:
 
 class Payout:
 
+    """
+    Contest payouts.  data is the payouts table, one (min_position, max_position, payout_cash) row per tier.
+    cash_by_rank[r] is the cash for finishing position r (index 0 is unused and positions past the last tier win 0),
+    and cumulative_cash[r] is the total cash for positions 1 through r, used to split tied positions
+    """
+
     def __init__(self, payouts: pd.DataFrame):
         self.data = payouts
+        payout_cash = pd.to_numeric(payouts['payout_cash']).fillna(0.).astype(float).values
+        min_position = payouts['min_position'].values.astype(np.int64)
+        max_position = payouts['max_position'].values.astype(np.int64)
+        self.max_paid = int(max_position.max()) if len(payouts) else 0
+        # difference array over the tiers, so the dense array is built without a loop over positions
+        delta = np.zeros(self.max_paid + 2)
+        np.add.at(delta, min_position, payout_cash)
+        np.add.at(delta, max_position + 1, -payout_cash)
+        self.cash_by_rank = np.cumsum(delta)
+        self.cash_by_rank[0] = 0.
+        self.cumulative_cash = np.cumsum(self.cash_by_rank[:-1])
+
+    def get_cash(self, ranks: np.ndarray, ties: np.ndarray = None) -> np.ndarray:
+        """
+        Cash won at each (1-based) finishing position.  Positions outside every payout tier win 0
+
+        :param ranks: array of finishing positions, any shape
+        :param ties: number of entries tied at each position (including the entry itself).  Tied entries split the
+            cash for positions rank through rank + ties - 1 equally
+        """
+        ranks = np.clip(np.floor(np.asarray(ranks)).astype(np.int64), 1, self.max_paid + 1)
+        if ties is None:
+            return self.cash_by_rank[ranks]
+        ties = np.maximum(np.floor(np.asarray(ties)).astype(np.int64), 1)
+        last = np.minimum(ranks + ties - 1, self.max_paid)
+        first = np.minimum(ranks - 1, self.max_paid)
+        return (self.cumulative_cash[last] - self.cumulative_cash[first]) / ties
 
 
 def field_filename(week: int, contest_id: int):
     parent = DATA_DUMP_2024.parent / 'contest_entries' / f'Week{week}'
     os.makedirs(parent, exist_ok=True)
-    return parent / f'lineups_{contest_id}.csv'
+    return parent / f'lineups_{contest_id}.field'
 
 
-class MyString:
-
+def index_dtype(num_players: int) -> np.dtype:
     """
-    Helper class to allow matrix multiplication on vectors of strings, by concatenation
+    Smallest unsigned integer type that can index num_players players
     """
-
-    _value: str
-
-    def __init__(self, string: str):
-        self._value = string
-
-    def __rmul__(self, other: float):
-        if other > 0.:
-            return self._value
-        else:
-            return ''
-
-    def __str__(self):
-        return self._value
+    if num_players <= np.iinfo(np.uint8).max + 1:
+        return np.dtype(np.uint8)
+    if num_players <= np.iinfo(np.uint16).max + 1:
+        return np.dtype(np.uint16)
+    return np.dtype(np.uint32)
 
 
 class LineupSet:
@@ -89,24 +113,33 @@ class LineupSet:
     player_data: dataframe of draftables from Lineup.DraftGroup.  Must have a numerical index by which to filter lineups
     The standard lexicographic order is to sort the DraftGroup by player_id and roster_slot_id - this can be used to
     reset the index if necessary
-    lineups: numpy 2d array where a row gives the indices of players in a given lineup and each row corresponds to one
-    lineup.  If this is used to generate a sparse matrix, matrix multiplication can be used on the underlying array
-    making up the player_data frame to sum attributes such as salary, projection, usage and score.
+    lineups: numpy 2d array where a row gives the (positional) indices of players in player_data for one lineup, with
+    one row per lineup, stored as a small unsigned integer type (see index_dtype).  Lineup totals of player attributes
+    such as salary, projection, usage and score are gathered from the player arrays and summed along each row.
+    A scipy sparse 0/1 (lineup x player) view is available from to_csr, and the dense 0/1 matrix is never built.
     """
 
+    block_size = 2 ** 20  # rows of lineup indices processed at a time
+
     def __init__(self, player_data: pd.DataFrame, lineups: np.array, covariance_matrix=None):
         if lineups.shape[1] == len(player_data):
             # this means lineups is giving 1's and 0's, and was generated from another LineupSet
-            self.lineups = lineups
+            rows, cols = np.nonzero(np.asarray(lineups))
+            lineups = cols.reshape(len(lineups), -1)
+
+        # remove unused players and renumber the remaining ones
+        players_used = np.zeros(len(player_data), dtype=bool)
+        for start in range(0, len(lineups), self.block_size):
+            players_used[np.unique(lineups[start:start + self.block_size])] = True
+        dtype = index_dtype(int(players_used.sum()))
+        if players_used.all():
+            # keep memory-mapped lineups (see from_file) on disk
+            self.lineups = lineups if isinstance(lineups, np.memmap) else np.asarray(lineups, dtype=dtype)
         else:
-            # this means lineups is giving a list of player indices, which must be converted to a sparse matrix
-            self.lineups = np.zeros((len(lineups), len(player_data)))
-            rows = np.indices((lineups.shape[0], )).reshape(-1, 1)
-            self.lineups[rows, lineups] = 1
-
-        # remove unused players (zero columns)
-        players_used = np.any(self.lineups, axis=0)
-        self.lineups = self.lineups[:, players_used]
+            new_index = (np.cumsum(players_used) - 1).astype(dtype)
+            self.lineups = np.empty(lineups.shape, dtype=dtype)
+            for start in range(0, len(lineups), self.block_size):
+                self.lineups[start:start + self.block_size] = new_index[lineups[start:start + self.block_size]]
         self.player_data = player_data.loc[players_used].copy()
         self.player_data['projection'] = self.player_data['projection'].astype(float)
         # self.player_data['covariance'] = self.player_data['covariance'].astype(float)
@@ -115,97 +148,363 @@ class LineupSet:
         else:
             self.cov = None
 
+    @classmethod
+    def from_file(cls, player_data: pd.DataFrame, infile: pathlib.Path, covariance_matrix=None):
+        """
+        Build a LineupSet from a .npy file of lineup index rows, such as the output of
+        Lineup.greedyGenerator.generate_to_file.  The file is memory-mapped and read one block at a time;
+        if every player in player_data is used, the LineupSet keeps the memory map instead of a copy.
+        """
+        lineups = np.load(infile, mmap_mode='r')
+        return cls(player_data, lineups, covariance_matrix)
+
+    @staticmethod
+    def _to_records(df: pd.DataFrame) -> np.ndarray:
+        """
+        Structured array of a DataFrame, with text columns as fixed-width unicode so it can be saved without pickle
+        """
+        columns = {}
+        for col in df.columns:
+            values = df[col].to_numpy()
+            columns[col] = values if values.dtype.kind in 'biufcmM' else values.astype(str)
+        return np.rec.fromarrays(list(columns.values()), names=list(columns.keys())).view(np.ndarray)
+
+    def save(self, path: pathlib.Path):
+        """
+        Write the LineupSet in the binary field format: a directory of .npy files holding the player table
+        (players.npy), the lineup index rows (lineups.npy), the per-lineup stats as float32 (stats.npy) and the
+        covariance matrix (cov.npy) if there is one.  Lineups and stats are in row order, so a row index selects
+        the same lineup in both.  Read back with LineupSet.load, or LineupSet.load_stats for the stats only
+        """
+        path = pathlib.Path(path)
+        os.makedirs(path, exist_ok=True)
+        np.save(path / 'players.npy', self._to_records(self.player_data), allow_pickle=False)
+        np.save(path / 'lineups.npy', np.asarray(self.lineups), allow_pickle=False)
+        # lineup keys are cheap to rebuild from the index rows, so only the float stats are stored
+        stats = self.get_lineup_stats(names=False).sort_index().drop(columns='key').astype(np.float32)
+        np.save(path / 'stats.npy', self._to_records(stats), allow_pickle=False)
+        if self.cov is not None:
+            np.save(path / 'cov.npy', self.cov, allow_pickle=False)
+
+    @classmethod
+    def load(cls, path: pathlib.Path, mmap_mode: str = 'r'):
+        """
+        Read a LineupSet written by save.  The lineup index rows are memory-mapped unless mmap_mode is None
+        """
+        path = pathlib.Path(path)
+        player_data = pd.DataFrame(np.load(path / 'players.npy', allow_pickle=False))
+        lineups = np.load(path / 'lineups.npy', mmap_mode=mmap_mode, allow_pickle=False)
+        cov_file = path / 'cov.npy'
+        covariance_matrix = np.load(cov_file, allow_pickle=False) if cov_file.exists() else None
+        return cls(player_data, lineups, covariance_matrix)
+
+    @staticmethod
+    def load_stats(path: pathlib.Path, row: np.array = None, mmap_mode: str = 'r') -> pd.DataFrame:
+        """
+        Per-lineup stats written by save, for all lineups or the given rows, indexed by lineup row
+        """
+        stats = np.load(pathlib.Path(path) / 'stats.npy', mmap_mode=mmap_mode, allow_pickle=False)
+        index = np.arange(len(stats)) if row is None else np.asarray(row).reshape(-1)
+        return pd.DataFrame(np.asarray(stats[index]), index=index)
+
+    def __len__(self):
+        return len(self.lineups)
+
+    @property
+    def num_players(self) -> int:
+        return len(self.player_data)
+
+    def to_csr(self, row: np.array = None):
+        """
+        scipy.sparse CSR 0/1 matrix of lineups (rows) by players (columns), for all lineups or the given rows
+        """
+        from scipy import sparse
+
+        lineups = self.lineups if row is None else self.lineups[row]
+        roster_size = lineups.shape[1]
+        indptr = np.arange(0, len(lineups) * roster_size + 1, roster_size)
+        data = np.ones(len(lineups) * roster_size, dtype=np.float64)
+        return sparse.csr_matrix((data, np.asarray(lineups, dtype=np.int32).ravel(), indptr),
+                                 shape=(len(lineups), self.num_players))
+
+    def _one_hot(self, row: np.array) -> np.ndarray:
+        """
+        Dense 0/1 matrix for the given rows only
+        """
+        lineups = np.asarray(self.lineups[row], dtype=np.intp).reshape(-1, self.lineups.shape[1])
+        result = np.zeros((len(lineups), self.num_players))
+        result[np.arange(len(lineups)).reshape(-1, 1), lineups] = 1
+        return result
+
+    def lineup_totals(self, values: np.ndarray, row: np.array = None) -> np.ndarray:
+        """
+        Sum per-player values over each lineup.  values has one entry (or row of entries) per player
+        """
+        values = np.asarray(values, dtype=float)
+        lineups = self.lineups if row is None else self.lineups[row]
+        result = np.empty((len(lineups),) + values.shape[1:])
+        for start in range(0, len(lineups), self.block_size):
+            result[start:start + self.block_size] = values[lineups[start:start + self.block_size]].sum(axis=1)
+        return result
+
+    def _gather_sum(self, player_rows: np.ndarray, lineups: np.ndarray, dtype=np.float64) -> np.ndarray:
+        """
+        For a (k x num_players) matrix, return the (k x len(lineups)) matrix whose (i, j) element is the sum of
+        player_rows[i] over the players in lineup j.  This is player_rows @ one_hot(lineups).T
+        """
+        result = np.empty((len(player_rows), len(lineups)), dtype=dtype)
+        block_size = max(self.block_size // max(len(player_rows), 1), 1)
+        for start in range(0, len(lineups), block_size):
+            block = lineups[start:start + block_size]
+            result[:, start:start + len(block)] = player_rows[:, block].sum(axis=2, dtype=dtype)
+        return result
+
+    def _pair_rows(self, row: np.array, metric: str):
+        """
+        Per-player weights for the given lineups, so that gathering them over another lineup gives the pair value
+        """
+        if metric == 'overlap':
+            return self._one_hot(row).astype(np.int8), np.int8
+        elif metric == 'covariance':
+            return self._one_hot(row) @ self.cov, np.float64
+        raise NotImplementedError(f'Unknown lineup pair metric: {metric}')
+
     def lineup_set_overlap_matrix(self, row: np.array = None, subset: bool = False) -> np.ndarray:
-        # covariance matrix for entire LineupSet is given by self.lineups @ self.cov @ self.lineups.T
-        # If subset=True, return cov matrix only for given rows.  Otherwise return cov for all lineups
+        # overlap matrix for entire LineupSet is given by one_hot(lineups) @ one_hot(lineups).T
+        # If subset=True, return overlap matrix only for given rows.  Otherwise return overlap for all lineups
+        # Warning: with row=None this is an N x N matrix.  Use iter_pair_blocks or top_k_neighbours on large fields
         if row is None:
-            return self.lineups @ self.lineups.T
-        if subset:
-            return self.lineups[row, :] @ self.lineups[row, :].T
-        return self.lineups[row, :] @ self.lineups.T
+            row = np.arange(len(self.lineups))
+        columns = self.lineups[row] if subset else self.lineups
+        return self._gather_sum(self._one_hot(row), columns)
 
     def lineup_set_covariance_matrix(self, row: np.array = None, subset: bool = False) -> np.ndarray:
-        # covariance matrix for entire LineupSet is given by self.lineups @ self.cov @ self.lineups.T
+        # covariance matrix for entire LineupSet is given by one_hot(lineups) @ self.cov @ one_hot(lineups).T
         # If subset=True, return cov matrix only for given rows.  Otherwise return cov for all lineups
+        # Warning: with row=None this is an N x N matrix.  Use iter_pair_blocks or top_k_neighbours on large fields
         if row is None:
-            return self.lineups @ self.cov @ self.lineups.T
-        if subset:
-            return self.lineups[row, :] @ self.cov @ self.lineups[row, :].T
-        return self.lineups[row, :] @ self.cov @ self.lineups.T
+            row = np.arange(len(self.lineups))
+        columns = self.lineups[row] if subset else self.lineups
+        return self._gather_sum(self._one_hot(row) @ self.cov, columns)
+
+    def iter_pair_blocks(self, metric: str = 'overlap', row: np.array = None, row_block: int = 256,
+                         column_block: int = 2 ** 16) -> Iterator[Tuple[np.ndarray, slice, np.ndarray]]:
+        """
+        Yield the overlap (or covariance) matrix of the given rows (default: all lineups) against all lineups,
+        one (row_block x column_block) tile at a time, as (rows, column slice, tile).  Only one tile is in
+        memory at a time, so this works on fields too large for the full N x N matrix.
+
+        :param metric: 'overlap' (number of shared players) or 'covariance'
+        """
+        row = np.arange(len(self.lineups)) if row is None else np.asarray(row).reshape(-1)
+        for row_start in range(0, len(row), row_block):
+            rows = row[row_start:row_start + row_block]
+            player_rows, dtype = self._pair_rows(rows, metric)
+            for col_start in range(0, len(self.lineups), column_block):
+                columns = slice(col_start, min(col_start + column_block, len(self.lineups)))
+                yield rows, columns, self._gather_sum(player_rows, self.lineups[columns], dtype)
+
+    def top_k_neighbours(self, row: np.array, k: int = 10, metric: str = 'overlap', largest: bool = True,
+                         exclude_self: bool = True, column_block: int = 2 ** 16) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        For each of the given lineups, find the k lineups with the largest (or smallest) overlap or covariance,
+        scanning the field in column blocks without building the full matrix.
+
+        :return: (indices, values), each of shape (len(row), k), sorted best first (ties broken by lineup index)
+        """
+        row = np.asarray(row).reshape(-1)
+        sign = -1 if largest else 1
+        best_idx = np.empty((len(row), 0), dtype=np.int64)
+        best_val = np.empty((len(row), 0))
+        for rows, columns, tile in self.iter_pair_blocks(metric, row, row_block=len(row), column_block=column_block):
+            values = tile.astype(float)
+            indices = np.broadcast_to(np.arange(columns.start, columns.stop), values.shape)
+            if exclude_self:
+                values = np.where(indices == rows.reshape(-1, 1), np.inf * sign, values)
+            # candidates are kept in lineup order, so a stable sort breaks ties by lineup index
+            values = np.hstack((best_val, values))
+            indices = np.hstack((best_idx, indices))
+            keep = np.sort(np.argsort(sign * values, axis=1, kind='stable')[:, :k], axis=1)
+            best_val = np.take_along_axis(values, keep, axis=1)
+            best_idx = np.take_along_axis(indices, keep, axis=1)
+        order = np.argsort(sign * best_val, axis=1, kind='stable')
+        best_idx = np.take_along_axis(best_idx, order, axis=1)
+        best_val = np.take_along_axis(best_val, order, axis=1)
+        if exclude_self:
+            # with fewer than k other lineups, the excluded lineup itself can survive at the end
+            valid = np.isfinite(best_val)
+            best_idx, best_val = np.where(valid, best_idx, -1), np.where(valid, best_val, np.nan)
+        return best_idx, best_val
+
+    def overlap_csr(self, row: np.array = None, min_overlap: int = 1, row_block: int = 256):
+        """
+        Sparse (scipy CSR) overlap matrix of the given rows (default: all lineups) against all lineups, keeping only
+        pairs that share at least min_overlap players.  The product is built row_block rows at a time and each
+        block is thresholded before the next, so only one unthresholded block is in memory at a time
+        """
+        from scipy import sparse
+
+        row = np.arange(len(self.lineups)) if row is None else np.asarray(row).reshape(-1)
+        rhs = self.to_csr().T.tocsc()
+        blocks = []
+        for start in range(0, len(row), row_block):
+            block = (self.to_csr(row[start:start + row_block]) @ rhs).tocsr()
+            if min_overlap > 1:
+                block.data[block.data < min_overlap] = 0
+                block.eliminate_zeros()
+            blocks.append(block)
+        if not blocks:
+            return sparse.csr_matrix((0, len(self.lineups)))
+        return sparse.vstack(blocks, format='csr')
 
     def lineup_set_diagonal_covariance(self):
-        # to get the diagonal covariance of each lineup do sum_over_rows(self.lineups @ self.cov * self.lineups)
-        player_cov = (self.lineups @ self.cov) * self.lineups
-        cov_values = player_cov @ np.ones((player_cov.shape[1], 1))
+        # the diagonal covariance of each lineup is the sum of self.cov over all pairs of players in the lineup
+        cov_values = np.empty((len(self.lineups), 1))
+        for start in range(0, len(self.lineups), self.block_size):
+            block = np.asarray(self.lineups[start:start + self.block_size], dtype=np.intp)
+            cov_values[start:start + len(block), 0] = self.cov[block[:, :, None], block[:, None, :]].sum(axis=(1, 2))
         return cov_values
 
-    def generate_max_coverage(self, n: int = 20) -> np.ndarray:
+    def generate_max_coverage(self, n: int = 20, seed=None) -> np.ndarray:
         """
+        Greedily pick lineups with the smallest total covariance with the lineups picked so far, starting from
+        a random lineup.  The covariance sums are updated with one row per pick, so each step is O(N)
 
         :param n: number of lineups
+        :param seed: seed, SeedSequence or Generator for the starting lineup.  None takes the next stream from dfsutil.rng
         """
-        lineup_df = self.get_lineup_stats()
-        remaining_cov = self.lineup_set_diagonal_covariance().flatten()
-        idx = np.random.randint(low=0, high=len(remaining_cov))
-        lineups = np.array([idx])
-        for i in range(n-1):
-            remaining_cov = np.sum(self.lineup_set_covariance_matrix(lineups), axis=0)
-            remaining_cov[lineups] = np.max(remaining_cov)  # remove repeats from consideration
-            idx = np.argmin(np.abs(remaining_cov))
-            lineups = np.append(lineups, [idx])
+        generator = rng.default_rng(seed)
+        n = min(n, len(self.lineups))
+        lineups = np.empty(n, dtype=np.int64)
+        lineups[0] = generator.integers(low=0, high=len(self.lineups))
+        remaining_cov = np.zeros(len(self.lineups))
+        picked = np.zeros(len(self.lineups), dtype=bool)
+        for i in range(1, n):
+            last = lineups[i-1:i]
+            remaining_cov += self.lineup_set_covariance_matrix(last)[0]
+            picked[last] = True
+            scores = np.where(picked, np.inf, np.abs(remaining_cov))  # remove repeats from consideration
+            lineups[i] = np.argmin(scores)
 
         return lineups
 
-    def get_lineup_stats(self) -> pd.DataFrame:
+    def _label_ranks(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Player labels '(slot:name:id)' and the rank of each player's label.  Sorting a lineup's players by rank
+        puts CPT first and gives every lineup a canonical order
+        """
+        labels = np.array([f'({slot}:{name}:{pid})' for slot, name, pid in
+                           zip(self.player_data['roster_slot'].values, self.player_data['name'].values,
+                               self.player_data['id'].values)], dtype=object)
+        label_rank = np.empty(len(labels), dtype=np.intp)
+        label_rank[np.argsort(labels, kind='stable')] = np.arange(len(labels))
+        return labels, label_rank
+
+    def lineup_keys(self, row: np.array = None) -> np.ndarray:
+        """
+        Integer identity of each lineup: its players' label ranks, sorted and packed into one int64.
+        Lineups with the same players have the same key, whatever order the players were generated in.
+        If the packed ranks do not fit in 63 bits, the keys are tuples of sorted ranks instead
+        """
+        lineups = self.lineups if row is None else self.lineups[row]
+        _, label_rank = self._label_ranks()
+        width = max(int(self.num_players - 1).bit_length(), 1)
+        packed = width * lineups.shape[1] <= 63
+        keys = np.empty(len(lineups), dtype=np.int64 if packed else object)
+        for start in range(0, len(lineups), self.block_size):
+            ranks = np.sort(label_rank[lineups[start:start + self.block_size]], axis=1)
+            if packed:
+                shifts = width * np.arange(ranks.shape[1] - 1, -1, -1, dtype=np.int64)
+                keys[start:start + len(ranks)] = np.bitwise_or.reduce(ranks.astype(np.int64) << shifts, axis=1)
+            else:
+                keys[start:start + len(ranks)] = list(map(tuple, ranks.tolist()))
+        return keys
+
+    def lineup_names(self, row: np.array = None) -> np.ndarray:
+        """
+        Human-readable lineup strings, e.g. '(CPT:name:id)(FLEX:name:id)...'.  Only needed when exporting
+        """
+        lineups = self.lineups if row is None else self.lineups[row]
+        labels, label_rank = self._label_ranks()
+        sorted_labels = labels[np.argsort(label_rank)]
+        names = np.empty(len(lineups), dtype=object)
+        for start in range(0, len(lineups), self.block_size):
+            ranks = np.sort(label_rank[lineups[start:start + self.block_size]], axis=1)
+            names[start:start + len(ranks)] = [''.join(row_labels) for row_labels in sorted_labels[ranks]]
+        return names
+
+    def get_lineup_stats(self, names: bool = True) -> pd.DataFrame:
+        """
+        Salary, projection, actual points (and covariance) of each lineup, indexed by lineup row, with the readable
+        lineup string in 'lineup' and the integer identity from lineup_keys in 'key'.
+        :param names: build the 'lineup' strings, which is the slow part for a large field
+        """
         value_cols = ['salary', 'projection', 'actual']
-        lineup_values = self.lineups @ self.player_data[value_cols].values
-
-        self.player_data['name_id'] = [MyString(f'{val[0]}:{str(val[1])}') for val in
-                                         zip(self.player_data['name'].values, self.player_data['id'].values)]
-        self.player_data['name_slot'] = [MyString(f'({val[0]}:{val[1]})') for val in
-                                         zip(self.player_data['roster_slot'].values, self.player_data['name_id'].values)]
-        name_values = self.lineups @ self.player_data['name_slot'].values
+        lineup_values = self.lineup_totals(self.player_data[value_cols].values)
 
         if self.cov is not None:
             cov_values = self.lineup_set_diagonal_covariance()
-
-        # sort lineup strings to put CPT first
-        def sort_lineup_string(lineup):
-            players = np.sort([player.lstrip('(').rstrip(')') for player in lineup.split(')(')])
-            return ''.join(['(' + playername + ')' for playername in players])
-
-        f = np.vectorize(sort_lineup_string)
-        name_values = f(name_values)
-
-        if self.cov is not None:
-            file_array = np.concatenate((np.reshape(name_values, (-1, 1)), lineup_values, cov_values), axis=1)
-            df = pd.DataFrame(file_array, columns=['lineup'] + value_cols + ['covariance'])
-            df[value_cols + ['covariance']] = df[value_cols + ['covariance']].astype(float)
-            return df.sort_values(by='covariance', ascending=False)
+            df = pd.DataFrame(np.concatenate((lineup_values, cov_values), axis=1), columns=value_cols + ['covariance'])
+            sort_by = 'covariance'
         else:
-            file_array = np.concatenate((np.reshape(name_values, (-1, 1)), lineup_values), axis=1)
-            df = pd.DataFrame(file_array, columns=['lineup'] + value_cols)
-            df[value_cols] = df[value_cols].astype(float)
-            return df.sort_values(by='projection', ascending=False)
+            df = pd.DataFrame(lineup_values, columns=value_cols)
+            sort_by = 'projection'
+        df.insert(0, 'key', self.lineup_keys())
+        if names:
+            df.insert(0, 'lineup', self.lineup_names())
+        return df.sort_values(by=sort_by, ascending=False)
 
     def to_file(self, outfile: pathlib.Path):
-        self.get_lineup_stats().to_csv(outfile)
+        """
+        Write the field to outfile: a .csv of lineup strings and stats, or otherwise the binary format (see save)
+        """
+        outfile = pathlib.Path(outfile)
+        if outfile.suffix != '.csv':
+            self.save(outfile)
+            return
+        self.get_lineup_stats().drop(columns='key').to_csv(outfile)
+
+    def upload_entries(self, row: np.array = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Roster slot header and 'name (id)' entries of each lineup, in upload order (CPT first)
+        """
+        lineups = self.lineups if row is None else self.lineups[np.asarray(row).reshape(-1)]
+        _, label_rank = self._label_ranks()
+        order = np.argsort(label_rank)
+        slots = self.player_data['roster_slot'].values[order]
+        entries = np.array([f'{name} ({pid})' for name, pid in
+                            zip(self.player_data['name'].values, self.player_data['id'].values)], dtype=object)[order]
+        ranks = np.sort(label_rank[lineups], axis=1)
+        return slots[ranks[0]], entries[ranks]
 
     @staticmethod
     def convert_to_uploadable(infile: pathlib.Path, idx: List[int] = None):
-        lineups = pd.read_csv(infile, index_col='Unnamed: 0')
-        if idx is None:
-            lineup_list = lineups['lineup'].values
+        """
+        Write the DraftKings upload csv for the given lineup rows of a field file (all rows if idx is None).
+        Binary field files (see save) are selected by row index; .csv field files are parsed from the lineup strings.
+        If a binary field file does not exist, the .csv field file of the same name is read instead
+        """
+        infile = pathlib.Path(infile)
+        if infile.suffix != '.csv' and not infile.exists() and infile.with_suffix('.csv').exists():
+            infile = infile.with_suffix('.csv')
+        if infile.suffix != '.csv':
+            header, entries = LineupSet.load(infile).upload_entries(idx)
+            header = ','.join(header)
+            names = [','.join(lineup) for lineup in entries]
         else:
-            lineup_list = lineups.loc[idx, 'lineup'].values
-
-        def get_name_and_id_list(lineup_string):
-            players = lineup_string.split(')(')
-            name_and_id = [player.split(':')[1:] for player in players]
-            return [f'{name[0].lstrip("(")} ({name[1].rstrip(")")})' for name in name_and_id]
-
-        header = ','.join([val.lstrip('(').split(':')[0] for val in lineup_list[0].split(')(')])
-        names = [','.join(get_name_and_id_list(val)) for val in lineup_list]
+            lineups = pd.read_csv(infile, index_col='Unnamed: 0')
+            if idx is None:
+                lineup_list = lineups['lineup'].values
+            else:
+                lineup_list = lineups.loc[idx, 'lineup'].values
+
+            def get_name_and_id_list(lineup_string):
+                players = lineup_string.split(')(')
+                name_and_id = [player.split(':')[1:] for player in players]
+                return [f'{name[0].lstrip("(")} ({name[1].rstrip(")")})' for name in name_and_id]
+
+            header = ','.join([val.lstrip('(').split(':')[0] for val in lineup_list[0].split(')(')])
+            names = [','.join(get_name_and_id_list(val)) for val in lineup_list]
         filename = infile.stem
         filedir = infile.parent
         outfile = filedir / (filename + '_upload.csv')
@@ -251,6 +550,7 @@ if __name__ == "__main__":
     contest = Contest(contest_id=contest, db_interface=DFSDBInterface())
 
     constraint = Lineup.LineupConstraint(contest_type='Showdown')
+    constraint.salary_min = 49000
     draft_group = Lineup.DraftGroup(draft_group_id=contest.draft_group_id, db_interface=DFSDBInterface())
 
     # Get player projection data
@@ -263,7 +563,7 @@ if __name__ == "__main__":
 
     # Generate all possible lineups
     generator = Lineup.greedyGenerator(constraint, players, projections_only=True)
-    lineups = generator.generate(verbose=True, limit=None, random=False)
+    lineups = generator.generate(verbose=True, limit=None, random=False, prune_salary=True)
 
     # Get the covariance matrix
     cov_group = covariance.DraftGroupCovariance(players)
@@ -274,8 +574,6 @@ if __name__ == "__main__":
 
     lineup_data = field.get_lineup_stats()
 
-    indices = lineup_data[lineup_data['salary'] >= 49000.].index.values
-    field_filtered = field.filter(indices)
-
-    selection = field_filtered.generate_max_coverage(20)
+    # underspent lineups (salary < constraint.salary_min) were never generated
+    selection = field.generate_max_coverage(20)
     print('hello')
\ No newline at end of file
@@ -1,12 +1,13 @@
 import itertools
+import pathlib
 from typing import List
 import pandas as pd
 import numpy as np
-from iteration_utilities import random_product
-
 
 from dfsdata.interface import DFSDBInterface
 from dfsmc.lineup import utils as l_utils
+from dfsmc.lineup import enumeration
+from dfsutil import rng
 
 ROSTER_DICT = l_utils.DK_ROSTER_SLOTS
 
@@ -134,6 +135,7 @@ class LineupConstraint:
         if contest_type == 'Showdown':
             self.contest_type = 'Showdown'
             self.salary_max = 50000
+            self.salary_min = None
             self.roster_counts = {'CPT': 1, 'FLEX': 5}
             self.unique_teams = 2
         else:
@@ -148,6 +150,8 @@ class LineupConstraint:
         if sum(player_data['salary']) > self.salary_max:
             # print(f"Salary exceeds max: {sum(player_data['salary'])}")
             return False
+        if self.salary_min is not None and sum(player_data['salary']) < self.salary_min:
+            return False
         for slot in self.roster_counts.keys():
             if not len(player_data[player_data['roster_slot'] == slot]) == self.roster_counts[slot]:
                 return False
@@ -218,20 +222,49 @@ class DraftGroup:
         return result
 
     def populate_points_data(self, db_interface: DFSDBInterface):
+        """
+        Fill the projection, variance and actual columns for every draftable with one query per draft group.
+        CPT rows get 1.5x the projection and actual points.  Players without a projection or without game stats get
+        NaN for them
+        """
+        week = int(self.data.loc[0, 'week'])
+        player_ids = [int(player_id) for player_id in self.data['player_id'].unique()]
+        query = "SELECT ids.player_id, proj.fpros_projection, pts.fpts_ppr " \
+                "FROM unnest(%s) AS ids(player_id) " \
+                "LEFT JOIN " \
+                "(SELECT DISTINCT ON (player_id) player_id, fpros_projection FROM projections " \
+                "WHERE week = %s AND player_id = ANY(%s) " \
+                "ORDER BY player_id, fpros_projection DESC NULLS LAST) AS proj " \
+                "ON proj.player_id = ids.player_id " \
+                "LEFT JOIN " \
+                "(SELECT DISTINCT ON (player_id) player_id, fpts_ppr FROM player_game_stats " \
+                "WHERE week = %s AND player_id = ANY(%s) " \
+                "ORDER BY player_id, fpts_ppr DESC NULLS LAST) AS pts " \
+                "ON pts.player_id = ids.player_id"
+        points = db_interface.run_format_command(query, (player_ids, week, player_ids, week, player_ids))
+        points = points.set_index('player_id')
+
+        # TODO: update this to include special contest captain types
+        multiplier = np.where(self.data['roster_slot'] == 'CPT', 1.5, 1.0)
+        projection = self.data['player_id'].map(points['fpros_projection'].astype(float))
+        actual = self.data['player_id'].map(points['fpts_ppr'].astype(float))
+        self.data['projection'] = multiplier * projection
+        # fpros projections have no spread, so the variance stays at the Player default of 0
+        self.data['variance'] = 0.0
+        self.data['actual'] = multiplier * actual
+
+        mapping = {(row.player_id, row.roster_slot_id): (row.projection, row.actual)
+                   for row in self.data.itertuples()}
         for p in self.player_list:
-            p.set_projection_fpros(int(self.data.loc[0, 'week']), db_interface)
-            # p.set_projection_data(int(self.data.loc[0, 'week']), db_interface)
-            p.set_points_data(int(self.data.loc[0, 'week']), db_interface)
-        mapping_proj = {(p.player_id, p.roster_slot_id): p.fantasy_points_projection for p in self.player_list}
-        mapping_var = {(p.player_id, p.roster_slot_id): p.sd_pts ** 2 for p in self.player_list}
-        mapping_points = {(p.player_id, p.roster_slot_id): p.fantasy_points_actual for p in self.player_list}
-        self.data['projection'] = pd.Series(list(zip(self.data.player_id, self.data.roster_slot_id))).map(mapping_proj)
-        self.data['variance'] = pd.Series(list(zip(self.data.player_id, self.data.roster_slot_id))).map(mapping_var)
-        self.data['actual'] = pd.Series(list(zip(self.data.player_id, self.data.roster_slot_id))).map(mapping_points)
-        
+            p.fantasy_points_projection, p.fantasy_points_actual = mapping[(p.player_id, p.roster_slot_id)]
+
     def filter_by_projection(self, threshold: float = 1.0):
-        cpt_filtered = self.data.loc[(self.data['projection'] > 1.5*threshold) & (self.data['roster_slot'] == 'CPT')].dropna()
-        flex_filtered = self.data.loc[(self.data['projection'] > threshold) & (self.data['roster_slot'] == 'FLEX')].dropna()
+        """
+        Keep the players projected above threshold (1.5x threshold for CPT rows).  Players without a projection are
+        dropped; missing actual points (e.g. games not played yet) are kept
+        """
+        cpt_filtered = self.data.loc[(self.data['projection'] > 1.5*threshold) & (self.data['roster_slot'] == 'CPT')].dropna(subset=['projection'])
+        flex_filtered = self.data.loc[(self.data['projection'] > threshold) & (self.data['roster_slot'] == 'FLEX')].dropna(subset=['projection'])
         self.data = pd.concat([cpt_filtered, flex_filtered]).reset_index(drop='index')
 
     def populate_covariance(self):
@@ -294,13 +327,14 @@ class Lineup:
 
 class randomLineupGenerator:
 
-    def __init__(self, constraint: LineupConstraint, player_data: pd.DataFrame):
+    def __init__(self, constraint: LineupConstraint, player_data: pd.DataFrame, seed=None):
         """
 
         :param constraint (LineupConstraint): constraint for determining lineup validity
         :param player_data (pd.DataFrame): assumes columns: player, roster_slot_id, salary, usage, others depending on subclass
+        :param seed: seed, SeedSequence or Generator.  None takes the next stream from dfsutil.rng
         """
-        self.rng = np.random.Generator(np.random.PCG64())
+        self.rng = rng.default_rng(seed)
         self.constraint = constraint
         self.player_data = player_data
         self.player_data['num_roster_slots'] = self.player_data['roster_slot'].map(self.constraint.roster_counts)
@@ -323,8 +357,8 @@ class independentUsageGenerator(randomLineupGenerator):
 
     roster_slot_order = ['CPT', 'FLEX']
 
-    def __init__(self, constraint: LineupConstraint, player_data: pd.DataFrame, num_lineups: int):
-        super().__init__(constraint, player_data)
+    def __init__(self, constraint: LineupConstraint, player_data: pd.DataFrame, num_lineups: int, seed=None):
+        super().__init__(constraint, player_data, seed)
         self.num_lineups = num_lineups
 
     def generate(self, verbose=False):
@@ -349,17 +383,16 @@ class independentUsageGenerator(randomLineupGenerator):
 class RandomProduct:
 
     """
-    Use random_product from random_utilities.
-    TODO: Might need to look into setting random.seed
+    Random elements of the cartesian product of inputs (like iteration_utilities.random_product), drawn from a
+    numpy Generator so that the samples are reproducible
     """
 
-    def __init__(self, inputs, limit=None):
+    def __init__(self, inputs, limit=None, generator: np.random.Generator = None):
         self.inputs = inputs
         self.input_size = len(inputs)
-        if limit is not None:
-            self.samples = random_product(*inputs, repeat=limit)
-        else:
-            self.samples = random_product(*inputs)
+        generator = rng.default_rng(generator)
+        choices = generator.integers(0, [len(elem) for elem in inputs], size=(1 if limit is None else limit, self.input_size))
+        self.samples = tuple(inputs[j][i] for row in choices for j, i in enumerate(row))
         self.index = 0
 
     def __iter__(self):
@@ -383,34 +416,46 @@ class greedyGenerator(randomLineupGenerator):
     roster_slot_order = ['CPT', 'FLEX']
     _projections_only: bool  # use only players that have a projection
 
-    def __init__(self, constraint: LineupConstraint, player_data: pd.DataFrame, projections_only: bool = False):
-        super().__init__(constraint, player_data)
+    def __init__(self, constraint: LineupConstraint, player_data: pd.DataFrame, projections_only: bool = False,
+                 seed=None):
+        super().__init__(constraint, player_data, seed)
         self._projections_only = projections_only
         if self._projections_only:
             player_data = player_data[~player_data['projection'].isna()]
 
-    def generate(self, verbose=False, limit=None, random=False):
+    def generate(self, verbose=False, limit=None, random=False, chunk_size=enumeration.DEFAULT_CHUNK_SIZE,
+                 prune_salary=False, n_jobs=1):
         """
         Generate all lineups using itertools.combinations() and itertools.product()
 
+        The exhaustive (random=False) path checks the roster rules over blocks of chunk_size FLEX
+        combinations at a time with enumeration.ShowdownEnumerator.  With prune_salary=True, FLEX combinations
+        that cannot fit between constraint.salary_min and constraint.salary_max are pruned while they are built
+        (same lineups, much less work on deep slates).  With n_jobs > 1 the captains are sharded across a
+        process pool (ShowdownEnumerator.generate_parallel); scripts using this must guard their entry point
+        with if __name__ == "__main__".
+
         Warning: using random=True with limit=None will lead to an infinite loop
         """
-        lineups = []
+        if not random:
+            enumerator = self._enumerator(chunk_size, prune_salary)
+            if n_jobs is None or n_jobs > 1:
+                return enumerator.generate_parallel(n_jobs=n_jobs, limit=limit, verbose=verbose)
+            return enumerator.generate(limit=limit, verbose=verbose)
+
         players = {roster_slot: self.player_data.loc[
             (self.player_data['roster_slot'] == roster_slot) & (self.player_data['projection'] > 0),
                                         'name'
                                     ].copy()
                    for roster_slot in self.roster_slot_order}
+        lineups = []
         slot_results = []
         # TODO: Parallelize.  Doesn't look like there's a built-in way to do this
         for slot in self.roster_slot_order:
             slot_results.append(itertools.combinations(players[slot].index.values, r=self.constraint.roster_counts[slot]))
 
         product_entries = [list(elem) for elem in slot_results]
-        if random:
-            lineup_iterator = iter(RandomProduct(product_entries, limit=limit))
-        else:
-            lineup_iterator = itertools.product(*product_entries)
+        lineup_iterator = iter(RandomProduct(product_entries, limit=limit, generator=self.rng))
         salaries = np.array(self.player_data['salary'].values)
         names = np.array(self.player_data['name'].values)
         teams = np.array(self.player_data['team_id'].values)
@@ -418,7 +463,9 @@ class greedyGenerator(randomLineupGenerator):
             try:
                 lineup = next(lineup_iterator)
                 lineup = self._unroll_lineup(lineup)
-                if len(set(teams[lineup])) == 2 and len(set(names[lineup])) == 6 and np.sum(salaries[lineup]) < self.constraint.salary_max:
+                salary = np.sum(salaries[lineup])
+                salary_valid = salary < self.constraint.salary_max and (self.constraint.salary_min is None or salary >= self.constraint.salary_min)
+                if len(set(teams[lineup])) == 2 and len(set(names[lineup])) == 6 and salary_valid:
                     lineups.append(lineup.T)
                     if verbose and len(lineups) % 10000 == 0:
                         print(f'{len(lineups)} lineups generated.')
@@ -429,5 +476,39 @@ class greedyGenerator(randomLineupGenerator):
 
         return np.vstack(lineups)
 
+    def _enumerator(self, chunk_size=enumeration.DEFAULT_CHUNK_SIZE, prune_salary=False):
+        players = {roster_slot: self.player_data.loc[
+            (self.player_data['roster_slot'] == roster_slot) & (self.player_data['projection'] > 0)
+        ].index.values for roster_slot in self.roster_slot_order}
+        lead_slot, flex_slot = self.roster_slot_order
+        return enumeration.ShowdownEnumerator(
+            self.player_data,
+            players[lead_slot],
+            players[flex_slot],
+            self.constraint.roster_counts[lead_slot],
+            self.constraint.roster_counts[flex_slot],
+            self.constraint.salary_max,
+            self.constraint.unique_teams,
+            chunk_size=chunk_size,
+            salary_min=self.constraint.salary_min,
+            prune_salary=prune_salary
+        )
+
+    def generate_blocks(self, block_size=enumeration.DEFAULT_BLOCK_SIZE, limit=None,
+                        chunk_size=enumeration.DEFAULT_CHUNK_SIZE, prune_salary=False):
+        """
+        Iterate over all lineups (same order as generate) in blocks of block_size uint16 index rows,
+        without holding the full set of lineups in memory
+        """
+        return self._enumerator(chunk_size, prune_salary).iter_blocks(block_size, np.uint16, limit)
+
+    def generate_to_file(self, outfile: pathlib.Path, verbose=False, limit=None, block_size=enumeration.DEFAULT_BLOCK_SIZE,
+                         chunk_size=enumeration.DEFAULT_CHUNK_SIZE, prune_salary=False):
+        """
+        Stream all lineups into a uint16 .npy file and return it memory-mapped.
+        Open it as a field with Contest.LineupSet.from_file
+        """
+        return self._enumerator(chunk_size, prune_salary).write_npy(outfile, block_size, np.uint16, limit, verbose)
+
     def _unroll_lineup(self, lineup):
         return np.array([elem for sublist in lineup for elem in sublist])
@@ -0,0 +1,442 @@
+"""
+Vectorized Showdown lineup enumeration.
+
+Lineups are produced as blocks of player indices (one row per lineup, CPT columns first, then FLEX)
+and the roster rules (salary cap, number of teams, unique player names) are applied as boolean masks
+over each block, rather than lineup by lineup.
+
+Player indices refer to rows of the player data frame and are assumed to be positional
+(the DraftGroup data is always reset to a RangeIndex).
+"""
+import itertools
+import os
+import pathlib
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+from typing import Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNK_SIZE = 2 ** 16
+DEFAULT_BLOCK_SIZE = 2 ** 20  # rows per block yielded by ShowdownEnumerator.iter_blocks
+NPY_HEADER_LENGTH = 128  # fixed .npy header length used by NpyBlockWriter
+
+
+def combination_chunks(indices: np.ndarray, r: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[np.ndarray]:
+    """
+    Yield itertools.combinations(indices, r) as 2d arrays with at most chunk_size rows, in itertools order
+    """
+    indices = np.asarray(indices)
+    combos = itertools.combinations(indices.tolist(), r)
+    while True:
+        block = np.fromiter(itertools.chain.from_iterable(itertools.islice(combos, chunk_size)), dtype=indices.dtype)
+        if len(block) == 0:
+            break
+        yield block.reshape(-1, r)
+
+
+def salary_bounded_combinations(indices: np.ndarray, salaries: np.ndarray, r: int,
+                                salary_cap: float, salary_floor: float = None) -> np.ndarray:
+    """
+    All r-combinations of indices whose total salary is strictly below salary_cap and at least salary_floor,
+    returned in itertools.combinations order.
+
+    Branch and bound: players are sorted by salary and partial combinations are extended one player at a time.
+    Since the players are sorted, the cheapest (most expensive) completion of a partial combination is the next
+    (last) block of players, so the players that can extend a partial combination form a contiguous range that
+    is found with a binary search.  Partial combinations that can no longer land inside the salary bounds are
+    never extended.
+
+    :param indices (np.ndarray): player indices to choose from
+    :param salaries (np.ndarray): salary of every player, indexed by player index
+    :param r (int): combination size
+    :param salary_cap (float): exclusive upper bound on the total salary
+    :param salary_floor (float): inclusive lower bound on the total salary
+    """
+    indices = np.asarray(indices)
+    order = np.argsort(salaries[indices], kind='stable')
+    sorted_idx = indices[order]
+    sal = np.asarray(salaries[sorted_idx], dtype=np.int64)
+    n = len(sal)
+    if r > n:
+        return np.empty((0, r), dtype=indices.dtype)
+    prefix = np.concatenate(([0], np.cumsum(sal)))
+    floor = -np.inf if salary_floor is None else salary_floor
+
+    positions = np.empty((1, 0), dtype=np.int64)
+    totals = np.zeros(1, dtype=np.int64)
+    for level in range(r):
+        remaining = r - level  # players still needed, including the one being added
+        starts = positions[:, -1] + 1 if level > 0 else np.zeros(1, dtype=np.int64)
+        # cheapest completion if player j is added next: sal[j:j+remaining]
+        window_sums = prefix[remaining:] - prefix[:n - remaining + 1]
+        hi = np.searchsorted(window_sums, salary_cap - totals, side='left')
+        # most expensive completion if player j is added next: sal[j] + the (remaining - 1) most expensive players
+        top_sums = sal[:n - remaining + 1] + (prefix[n] - prefix[n - remaining + 1])
+        lo = np.maximum(np.searchsorted(top_sums, floor - totals, side='left'), starts)
+        counts = np.maximum(hi - lo, 0)
+        parents = np.repeat(np.arange(len(positions)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        new_positions = np.repeat(lo, counts) + offsets
+        positions = np.hstack((positions[parents], new_positions[:, None]))
+        totals = totals[parents] + sal[new_positions]
+        if len(positions) == 0:
+            return np.empty((0, r), dtype=indices.dtype)
+
+    combos = np.sort(sorted_idx[positions], axis=1)
+    base = int(indices.max()) + 1
+    if base ** r < 2 ** 63:
+        # sort on a single packed key, which is much cheaper than a lexsort over r columns
+        keys = combos.astype(np.int64) @ (base ** np.arange(r - 1, -1, -1, dtype=np.int64))
+        return combos[np.argsort(keys, kind='stable')]
+    return combos[np.lexsort(combos.T[::-1])]
+
+
+def count_bits(bits: np.ndarray, num_bits: int) -> np.ndarray:
+    """
+    Number of set bits in each element of bits, checking only the lowest num_bits bits
+    """
+    counts = np.zeros(bits.shape, dtype=np.int8)
+    for k in range(num_bits):
+        counts += ((bits >> np.uint64(k)) & np.uint64(1)).astype(np.int8)
+    return counts
+
+
+class NpyBlockWriter:
+    """
+    Write a 2d array to a .npy file one block of rows at a time, without knowing the number of rows in advance.
+
+    A fixed-length header is reserved when the file is opened and rewritten with the final shape on close,
+    so the result can be opened with np.load(path, mmap_mode='r').  If the with block raises, the file is deleted.
+    """
+
+    def __init__(self, path: pathlib.Path, num_columns: int, dtype=np.uint16):
+        self.path = pathlib.Path(path)
+        self.num_columns = num_columns
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, 'wb')
+        self._file.write(self._header())
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            # a partly written file would load as a valid array of the rows written so far
+            self._file.close()
+            self.path.unlink(missing_ok=True)
+            return
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+
+    def _header(self) -> bytes:
+        header = repr({'descr': self.dtype.str, 'fortran_order': False, 'shape': (self.rows, self.num_columns)})
+        preamble = np.lib.format.MAGIC_PREFIX + bytes([1, 0])
+        header_length = NPY_HEADER_LENGTH - len(preamble) - 2
+        return preamble + struct.pack('<H', header_length) + header.ljust(header_length - 1).encode('latin1') + b'\n'
+
+    def write(self, block: np.ndarray):
+        self._file.write(np.ascontiguousarray(block, dtype=self.dtype).tobytes())
+        self.rows += len(block)
+
+
+class ShowdownEnumerator:
+    """
+    Enumerate all valid lineups made of one combination from each of two roster slots.
+
+    Lineups are generated in the same order as itertools.product(lead_combinations, flex_combinations),
+    i.e. the lead slot (CPT) is the outer loop.  The FLEX combinations are computed once, in chunks,
+    together with their salary totals, team bitmasks and name-uniqueness flags, so that checking a
+    lead player against a chunk is a handful of array operations.
+
+    With prune_salary=True the FLEX combinations are instead generated separately for each lead combination
+    by salary_bounded_combinations, so combinations that cannot fit between salary_min and salary_max
+    alongside that lead are never built.  The resulting lineups are the same, in the same order.
+    """
+
+    def __init__(self, player_data: pd.DataFrame, lead_idx: np.ndarray, flex_idx: np.ndarray,
+                 lead_count: int, flex_count: int, salary_max: float, unique_teams: int,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, salary_min: float = None, prune_salary: bool = False):
+        """
+
+        :param player_data (pd.DataFrame): assumes columns: name, salary, team_id
+        :param lead_idx (np.ndarray): indices of players eligible for the lead (CPT) slot
+        :param flex_idx (np.ndarray): indices of players eligible for the FLEX slot
+        :param lead_count (int): number of lead players in a lineup
+        :param flex_count (int): number of FLEX players in a lineup
+        :param salary_max (float): lineups must have a total salary strictly below this value
+        :param unique_teams (int): number of distinct teams a lineup must contain
+        :param chunk_size (int): maximum number of FLEX combinations in a block
+        :param salary_min (float): lineups must have a total salary of at least this value
+        :param prune_salary (bool): generate FLEX combinations per lead with salary branch and bound
+        """
+        # kept so that worker processes can rebuild the enumerator (see generate_parallel)
+        self._init_kwargs = {
+            'player_data': player_data[['name', 'salary', 'team_id']], 'lead_idx': lead_idx, 'flex_idx': flex_idx,
+            'lead_count': lead_count, 'flex_count': flex_count, 'salary_max': salary_max,
+            'unique_teams': unique_teams, 'chunk_size': chunk_size, 'salary_min': salary_min,
+            'prune_salary': prune_salary
+        }
+        self.salaries = np.asarray(player_data['salary'].values, dtype=np.int64)
+        team_codes, teams = pd.factorize(player_data['team_id'])
+        if len(teams) > 64:
+            raise NotImplementedError('ShowdownEnumerator supports at most 64 teams')
+        self.num_teams = len(teams)
+        self.team_bits = np.left_shift(np.uint64(1), team_codes.astype(np.uint64))
+        self.name_codes = pd.factorize(player_data['name'])[0]
+        self.salary_max = salary_max
+        self.salary_min = salary_min
+        self.prune_salary = prune_salary
+        self.chunk_size = chunk_size
+        self.flex_idx = np.asarray(flex_idx)
+        self.unique_teams = unique_teams
+        self.lead_count = lead_count
+        self.flex_count = flex_count
+
+        self.lead_combos = np.vstack(list(combination_chunks(np.asarray(lead_idx), lead_count)) or
+                                     [np.empty((0, lead_count), dtype=np.asarray(lead_idx).dtype)])
+        self._flex_blocks = None
+
+    @property
+    def roster_size(self) -> int:
+        return self.lead_count + self.flex_count
+
+    @property
+    def flex_blocks(self):
+        # built on first use, so that an enumerator that only dispatches to worker processes never builds them
+        if self._flex_blocks is None:
+            self._flex_blocks = [self._flex_block_data(block)
+                                 for block in combination_chunks(self.flex_idx, self.flex_count, self.chunk_size)]
+        return self._flex_blocks
+
+    def _flex_block_data(self, flex: np.ndarray):
+        salary = self.salaries[flex].sum(axis=1)
+        team_bits = np.bitwise_or.reduce(self.team_bits[flex], axis=1)
+        names = self.name_codes[flex]
+        sorted_names = np.sort(names, axis=1)
+        names_unique = np.all(sorted_names[:, 1:] != sorted_names[:, :-1], axis=1)
+        return flex, salary, team_bits, names, names_unique
+
+    def _pruned_flex_blocks(self, lead_salary: float):
+        salary_floor = None if self.salary_min is None else self.salary_min - lead_salary
+        flex = salary_bounded_combinations(self.flex_idx, self.salaries, self.flex_count,
+                                           self.salary_max - lead_salary, salary_floor)
+        for start in range(0, len(flex), self.chunk_size):
+            yield self._flex_block_data(flex[start:start + self.chunk_size])
+
+    def lead_blocks(self, lead: np.ndarray) -> Iterator[np.ndarray]:
+        """
+        Yield blocks of valid lineups for a single lead combination
+        """
+        lead_salary = self.salaries[lead].sum()
+        lead_bits = np.bitwise_or.reduce(self.team_bits[lead])
+        lead_names = self.name_codes[lead]
+        lead_names_unique = len(np.unique(lead_names)) == len(lead_names)
+        if not lead_names_unique:
+            return
+        flex_blocks = self._pruned_flex_blocks(lead_salary) if self.prune_salary else self.flex_blocks
+        for flex, salary, team_bits, names, names_unique in flex_blocks:
+            mask = names_unique & (salary < self.salary_max - lead_salary)
+            if self.salary_min is not None:
+                mask &= salary >= self.salary_min - lead_salary
+            mask &= count_bits(team_bits | lead_bits, self.num_teams) == self.unique_teams
+            mask &= ~np.isin(names, lead_names).any(axis=1)
+            if mask.any():
+                valid = flex[mask]
+                yield np.hstack((np.broadcast_to(lead, (len(valid), len(lead))), valid))
+
+    def blocks(self, leads: slice = slice(None)) -> Iterator[np.ndarray]:
+        """
+        Yield blocks of valid lineups for all lead combinations (or the slice leads of them), in itertools.product order
+        """
+        for lead in self.lead_combos[leads]:
+            yield from self.lead_blocks(lead)
+
+    def generate(self, limit: int = None, verbose: bool = False) -> np.ndarray:
+        """
+        Stack all valid lineups into a single index matrix, stopping after limit lineups if given
+        """
+        lineups: List[np.ndarray] = []
+        count = 0
+        for block in self.blocks():
+            if limit is not None and count + len(block) >= limit:
+                lineups.append(block[:limit - count])
+                count = limit
+                break
+            lineups.append(block)
+            count += len(block)
+            if verbose:
+                print(f'{count} lineups generated.')
+        if len(lineups) == 0:
+            return np.empty((0, self.roster_size), dtype=self.lead_combos.dtype)
+        return np.vstack(lineups)
+
+    def iter_blocks(self, block_size: int = DEFAULT_BLOCK_SIZE, dtype=np.uint16, limit: int = None,
+                    leads: slice = slice(None)) -> Iterator[np.ndarray]:
+        """
+        Yield the lineups of blocks() re-chunked into blocks of exactly block_size rows (the last block may be
+        shorter), cast to dtype.  Only one block is held in memory at a time.
+        """
+        if np.iinfo(dtype).max < max(self.lead_combos.max(initial=0), self.flex_idx.max(initial=0)):
+            raise ValueError(f'Player indices do not fit in {np.dtype(dtype).name}')
+        buffer = np.empty((block_size, self.roster_size), dtype=dtype)
+        filled = 0
+        count = 0
+        for block in self.blocks(leads):
+            if limit is not None:
+                block = block[:limit - count]
+            count += len(block)
+            start = 0
+            while start < len(block):
+                take = min(block_size - filled, len(block) - start)
+                buffer[filled:filled + take] = block[start:start + take]
+                filled += take
+                start += take
+                if filled == block_size:
+                    yield buffer.copy()
+                    filled = 0
+            if limit is not None and count >= limit:
+                break
+        if filled > 0:
+            yield buffer[:filled].copy()
+
+    def write_npy(self, path: pathlib.Path, block_size: int = DEFAULT_BLOCK_SIZE, dtype=np.uint16,
+                  limit: int = None, verbose: bool = False) -> np.memmap:
+        """
+        Stream all valid lineups into a .npy file and return it memory-mapped (read-only)
+        """
+        with NpyBlockWriter(path, self.roster_size, dtype) as writer:
+            for block in self.iter_blocks(block_size, dtype, limit):
+                writer.write(block)
+                if verbose:
+                    print(f'{writer.rows} lineups written to {path}.')
+        return np.load(path, mmap_mode='r')
+
+    def generate_parallel(self, n_jobs: int = None, limit: int = None, verbose: bool = False,
+                          shards_per_job: int = 4) -> np.ndarray:
+        """
+        Same result as generate, with the lead (CPT) combinations sharded across a process pool.
+
+        Each shard is a contiguous range of lead combinations.  Workers write their valid rows into a shared
+        memory block and only send back its name and shape.  The shards are collected in lead order, so the output
+        matches generate exactly; each one is copied into the result and unlinked before the next, so at most one
+        shard is held twice.  Blocks are unlinked even if a shard fails.
+
+        :param n_jobs (int): number of worker processes.  Defaults to os.cpu_count()
+        :param limit (int): stop after the first limit lineups.  Each shard stops after limit rows, and shards
+            past the limit are cancelled
+        :param verbose (bool): print progress as shards are merged
+        :param shards_per_job (int): shards per worker, for load balancing between cheap and expensive captains
+        """
+        n_jobs = n_jobs or os.cpu_count()
+        num_leads = len(self.lead_combos)
+        num_shards = max(min(num_leads, n_jobs * shards_per_job), 1)
+        bounds = np.linspace(0, num_leads, num_shards + 1).astype(int)
+        shards = [slice(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+        if os.name == 'posix':
+            # start the resource tracker before forking, so that the blocks created by the workers are
+            # registered with the same tracker that sees the unlink here
+            resource_tracker.ensure_running()
+        pieces = []  # (attached block or None once released, shape, dtype) of the collected shards, in lead order
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_shard_worker,
+                                 initargs=(self._init_kwargs,)) as executor:
+            futures = [executor.submit(_generate_shard, shard, limit) for shard in shards]
+            try:
+                count = 0
+                for future in futures:
+                    if limit is not None and count >= limit:
+                        break
+                    shm_name, shape, dtype = future.result()
+                    pieces.append((shared_memory.SharedMemory(name=shm_name) if shape[0] > 0 else None, shape, dtype))
+                    count += shape[0]
+                    if verbose:
+                        print(f'{count} lineups generated.')
+
+                if limit is not None:
+                    count = min(count, limit)
+                lineups = np.empty((count, self.roster_size), dtype=self.lead_combos.dtype)
+                row = 0
+                for i, (shm, shape, dtype) in enumerate(pieces):
+                    if shm is None:
+                        continue
+                    take = min(shape[0], count - row)
+                    lineups[row:row + take] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)[:take]
+                    row += take
+                    pieces[i] = (None, shape, dtype)
+                    _release_block(shm)
+            finally:
+                for future in futures[len(pieces):]:
+                    future.cancel()
+                for shm, _, _ in pieces:
+                    if shm is not None:
+                        _release_block(shm)
+                # shards that were not collected: past the limit, or still running when an error was raised
+                for future in futures[len(pieces):]:
+                    if not future.cancelled() and future.exception() is None:
+                        _unlink_block(future.result()[0])
+        return lineups
+
+
+def _release_block(shm: shared_memory.SharedMemory):
+    shm.close()
+    shm.unlink()
+
+
+def _unlink_block(shm_name: str):
+    """
+    Unlink a shard block by name ('' for an empty shard), if it still exists
+    """
+    if not shm_name:
+        return
+    try:
+        shm = shared_memory.SharedMemory(name=shm_name)
+    except FileNotFoundError:
+        return
+    _release_block(shm)
+
+
+# Worker-process state for ShowdownEnumerator.generate_parallel.  On Windows a shared memory block is destroyed as
+# soon as its last handle is closed, so the worker keeps its blocks referenced until it exits.  On POSIX a block
+# lives until it is unlinked, so the worker closes its handle at once and the block's memory is freed as soon as
+# the parent has copied and unlinked it.
+_SHARD_ENUMERATOR: ShowdownEnumerator = None
+_SHARD_BLOCKS: List[shared_memory.SharedMemory] = []
+
+
+def _init_shard_worker(enumerator_kwargs: dict):
+    global _SHARD_ENUMERATOR
+    _SHARD_ENUMERATOR = ShowdownEnumerator(**enumerator_kwargs)
+
+
+def _generate_shard(leads: slice, limit: int = None) -> Tuple[str, tuple, str]:
+    blocks = []
+    rows = 0
+    for block in _SHARD_ENUMERATOR.blocks(leads):
+        if limit is not None:
+            block = block[:limit - rows]
+        blocks.append(block)
+        rows += len(block)
+        if limit is not None and rows >= limit:
+            break
+    dtype = _SHARD_ENUMERATOR.lead_combos.dtype
+    if rows == 0:
+        return '', (0, _SHARD_ENUMERATOR.roster_size), dtype.str
+    shape = (rows, _SHARD_ENUMERATOR.roster_size)
+    shm = shared_memory.SharedMemory(create=True, size=rows * shape[1] * dtype.itemsize)
+    out = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    row = 0
+    for block in blocks:
+        out[row:row + len(block)] = block
+        row += len(block)
+    del out
+    if os.name == 'posix':
+        shm.close()
+    else:
+        _SHARD_BLOCKS.append(shm)
+    return shm.name, shape, dtype.str
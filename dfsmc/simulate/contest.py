@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+
+from dfsmc.contest import Contest
+from dfsmc.simulate.players import CAPTAIN_MULTIPLIER
+from dfsutil import rng
+
+
+class NormalPlayerSampler:
+    """
+    Multivariate normal player outcomes, one column per row of a player table (CPT and FLEX rows included).
+
+    The normal can be over the underlying players instead of the rows: row_player maps each row to its player and
+    row_multiplier scales that player's draw (1.5 for CPT rows), so the CPT and FLEX rows of a player move together
+    """
+
+    def __init__(self, mean: np.ndarray, cov: np.ndarray, row_player: np.ndarray = None,
+                 row_multiplier: np.ndarray = None):
+        self.mean = np.asarray(mean, dtype=float)
+        # symmetric square root of the covariance, which also handles positive semi-definite matrices
+        eigenvalues, eigenvectors = np.linalg.eigh(np.asarray(cov, dtype=float))
+        self._factor = eigenvectors * np.sqrt(np.clip(eigenvalues, 0., None))
+        self._row_player = None if row_player is None else np.asarray(row_player, dtype=np.intp)
+        self._row_multiplier = None if row_multiplier is None else np.asarray(row_multiplier, dtype=float)
+
+    @classmethod
+    def from_lineup_set(cls, lineup_set: Contest.LineupSet):
+        """
+        Use the projections of the LineupSet players as means, and its covariance matrix.  Without a covariance
+        matrix, each player is drawn once from their variance column and CPT rows get 1.5x that draw
+        """
+        if lineup_set.cov is not None:
+            return cls(lineup_set.player_data['projection'].values, lineup_set.cov)
+        player_data = lineup_set.player_data
+        multiplier = np.where(player_data['roster_slot'].values == 'CPT', CAPTAIN_MULTIPLIER, 1.)
+        _, first_row, row_player = np.unique(player_data['player_id'].values, return_index=True, return_inverse=True)
+        mean = (player_data['projection'].astype(float).values / multiplier)[first_row]
+        variance = (player_data['variance'].astype(float).values / multiplier ** 2)[first_row]
+        return cls(mean, np.diag(variance), row_player, multiplier)
+
+    def sample(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        """
+        n samples of player points, shape (n, num_players)
+        """
+        samples = self.mean + rng.standard_normal((n, len(self.mean))) @ self._factor.T
+        if self._row_player is not None:
+            samples = samples[:, self._row_player]
+        if self._row_multiplier is not None:
+            samples *= self._row_multiplier
+        return samples
+
+
+class ContestSimulationResult:
+    """
+    Per-simulation points, finishing positions and cash of each entry lineup, shape (num_sims, num_entries).
+    ties counts the lineups (including the entry itself) with the same score
+    """
+
+    def __init__(self, points: np.ndarray, ranks: np.ndarray, ties: np.ndarray, cash: np.ndarray):
+        self.points = points
+        self.ranks = ranks
+        self.ties = ties
+        self.cash = cash
+
+    @property
+    def total_cash(self) -> np.ndarray:
+        """
+        Cash won by all entries together in each simulation
+        """
+        return self.cash.sum(axis=1)
+
+    def summary(self, entry_fee: float = None) -> pd.DataFrame:
+        """
+        Mean points, rank and cash of each entry lineup, with the probability of cashing and (given the entry
+        fee) the return on investment
+        """
+        df = pd.DataFrame({
+            'points': self.points.mean(axis=0),
+            'rank': self.ranks.mean(axis=0),
+            'cash': self.cash.mean(axis=0),
+            'p_cash': (self.cash > 0).mean(axis=0),
+        })
+        if entry_fee is not None:
+            df['roi'] = (df['cash'] - entry_fee) / entry_fee
+        return df
+
+
+class ContestSimulator:
+    """
+    Monte Carlo contest simulation.  Each simulation draws one outcome for every player, scores every lineup in
+    the field and in our entry, ranks each entry lineup against the field and the other entry lineups, and looks up
+    the cash for that finishing position in the contest payouts.
+
+    Simulations are run in batches so that the (batch x field) score matrix stays under max_elements values.
+    The entry lineups must only use players that appear in the field.
+    """
+
+    def __init__(self, field: Contest.LineupSet, entry: Contest.LineupSet, payout: Contest.Payout,
+                 sampler=None, field_weights: np.ndarray = None, max_elements: int = 2 ** 24, decimals: int = 4):
+        """
+        :param field: lineups entered by the rest of the contest
+        :param entry: our lineups
+        :param payout: contest payouts
+        :param sampler: object with sample(rng, n) returning (n, num_players) points for field.player_data rows.
+            Defaults to NormalPlayerSampler.from_lineup_set(field)
+        :param field_weights: expected number of entries of each field lineup (e.g. ownership scaled to the
+            contest size).  Defaults to one entry per lineup
+        :param max_elements: maximum size of the per-batch field score matrix
+        :param decimals: scores are rounded to this many decimals, so equal lineups tie exactly
+        """
+        self.field = field
+        self.entry = entry
+        self.payout = payout
+        self.sampler = NormalPlayerSampler.from_lineup_set(field) if sampler is None else sampler
+        self.field_weights = None if field_weights is None else np.asarray(field_weights, dtype=float)
+        self.max_elements = max_elements
+        self.decimals = decimals
+        self.entry_lineups = self._entry_in_field_players()
+
+    def _entry_in_field_players(self) -> np.ndarray:
+        """
+        Entry lineups as index rows into field.player_data
+        """
+        field_keys = pd.MultiIndex.from_frame(self.field.player_data[['player_id', 'roster_slot_id']])
+        entry_keys = pd.MultiIndex.from_frame(self.entry.player_data[['player_id', 'roster_slot_id']])
+        positions = field_keys.get_indexer(entry_keys)
+        if (positions[np.unique(self.entry.lineups)] < 0).any():
+            raise ValueError('Entry lineups use players that are not in the field')
+        return positions[np.asarray(self.entry.lineups, dtype=np.intp)]
+
+    @property
+    def batch_size(self) -> int:
+        return max(self.max_elements // max(len(self.field), 1), 1)
+
+    def score(self, outcomes: np.ndarray):
+        """
+        Points of every field lineup and every entry lineup for each row of player outcomes
+
+        :return: (field_scores (n, len(field)), entry_scores (n, len(entry)))
+        """
+        field_scores = np.round(self.field._gather_sum(outcomes, self.field.lineups), self.decimals)
+        entry_scores = np.round(outcomes[:, self.entry_lineups].sum(axis=2), self.decimals)
+        return field_scores, entry_scores
+
+    def rank(self, field_scores: np.ndarray, entry_scores: np.ndarray):
+        """
+        Finishing position (1 = best) of each entry lineup, and the number of lineups sharing its score
+
+        The field is sorted once along each row, and every entry score is located with one searchsorted over all
+        rows: the scores are scaled to integers (they are rounded to self.decimals) and each row is shifted past
+        the one before it, so the flattened rows stay in sorted order.
+
+        :return: (ranks, ties), each of shape (n, len(entry))
+        """
+        better = (entry_scores[:, None, :] > entry_scores[:, :, None]).sum(axis=2).astype(float)
+        ties = (entry_scores[:, None, :] == entry_scores[:, :, None]).sum(axis=2).astype(float)
+        n, num_field = field_scores.shape
+        scale = 10. ** self.decimals
+        field_int = np.rint(field_scores * scale).astype(np.int64)
+        entry_int = np.rint(entry_scores * scale).astype(np.int64)
+        low = field_int.min(initial=entry_int.min())
+        span = field_int.max(initial=entry_int.max()) - low + 1
+        rows = np.arange(n)[:, None]
+
+        if self.field_weights is None:
+            sorted_scores = np.sort(field_int, axis=1)
+        else:
+            order = np.argsort(field_int, axis=1)
+            sorted_scores = np.take_along_axis(field_int, order, axis=1)
+        flat = (sorted_scores - low + span * rows).ravel()
+        queries = entry_int - low + span * rows
+        left = np.searchsorted(flat, queries, side='left') - num_field * rows
+        right = np.searchsorted(flat, queries, side='right') - num_field * rows
+
+        if self.field_weights is None:
+            better += num_field - right
+            ties += right - left
+        else:
+            cumulative = np.zeros((n, num_field + 1))
+            np.cumsum(self.field_weights[order], axis=1, out=cumulative[:, 1:])
+            better += cumulative[:, -1:] - cumulative[rows, right]
+            ties += cumulative[rows, right] - cumulative[rows, left]
+        return 1 + better, ties
+
+    def run(self, n_sims: int = 10000, seed=None, verbose: bool = False) -> ContestSimulationResult:
+        """
+        :param n_sims: number of simulated contests
+        :param seed: seed, SeedSequence or Generator for the player outcomes.  None takes the next stream from dfsutil.rng
+        """
+        generator = rng.default_rng(seed)
+        points = np.empty((n_sims, len(self.entry_lineups)))
+        ranks = np.empty_like(points)
+        ties = np.empty_like(points)
+        for start in range(0, n_sims, self.batch_size):
+            n = min(self.batch_size, n_sims - start)
+            field_scores, entry_scores = self.score(self.sampler.sample(generator, n))
+            points[start:start + n] = entry_scores
+            ranks[start:start + n], ties[start:start + n] = self.rank(field_scores, entry_scores)
+            if verbose:
+                print(f'Simulated {start + n} of {n_sims} contests')
+        return ContestSimulationResult(points, ranks, ties, self.payout.get_cash(ranks, ties))
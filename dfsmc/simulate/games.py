@@ -1,8 +1,62 @@
 import numpy as np
 import pandas as pd
+from typing import List
 
 from dfsdata.interface import DFSDBInterface
 from dfsdata import configure_db
+from dfsutil import rng
+
+PLAYER_KEY = ['player_name', 'pos']  # identifies a player across weeks, whatever team they played for
+
+
+class ResampleIndex:
+    """
+    Player games preindexed for resampling: a dense (player x game slot) float32 array of fantasy points, where a
+    slot is one (season, week_num) and NaN means the player did not play.  Players are identified by
+    (player_name, pos) and assigned to the team of their latest game, so a team block is a set of columns of
+    outcomes that are resampled together
+    """
+
+    def __init__(self, games_data: pd.DataFrame):
+        """
+        :param games_data: rows of season, player_name, pos, team, week_num, fpts_dk
+        """
+        games_data = games_data.sort_values(by=['season', 'week_num'])
+        games_data['fpts_dk'] = games_data['fpts_dk'].astype(float)
+        pivoted = games_data.pivot_table(index=PLAYER_KEY, columns=['season', 'week_num'],
+                                         values='fpts_dk', aggfunc='first')
+        self.slots = pivoted.columns.to_frame(index=False)
+        self.outcomes = pivoted.values.astype(np.float32)
+        latest_team = games_data.groupby(PLAYER_KEY)['team'].last()
+        self.players = pivoted.index.to_frame(index=False)
+        self.players['team'] = latest_team.reindex(pivoted.index).values
+        self.teams, self.player_team = np.unique(self.players['team'].values.astype(str), return_inverse=True)
+
+    def weights(self, half_life: float = None) -> np.ndarray:
+        """
+        Probability of drawing each slot.  With half_life (in weeks), a slot's weight halves for every half_life
+        slots between it and the most recent slot; otherwise slots are uniform
+        """
+        age = np.arange(len(self.slots) - 1, -1, -1, dtype=float)
+        weights = np.ones(len(self.slots)) if half_life is None else 0.5 ** (age / half_life)
+        return weights / weights.sum()
+
+    def sample(self, generator: np.random.Generator, num_samples: int, half_life: float = None,
+               by_team: bool = False):
+        """
+        Draw num_samples outcome vectors with one RNG call.  By default every player takes the same sampled slot;
+        with by_team=True each team draws its own slot (a per-team block bootstrap), which keeps teammates
+        correlated but makes different teams independent
+
+        :return: (slot indices, (num_samples,) or (num_samples, num_teams); outcomes (num_samples, num_players))
+        """
+        p = self.weights(half_life)
+        if not by_team:
+            slots = generator.choice(len(p), size=num_samples, p=p)
+            return slots, self.outcomes[:, slots].T
+        slots = generator.choice(len(p), size=(num_samples, len(self.teams)), p=p)
+        return slots, self.outcomes[np.arange(len(self.players)), slots[:, self.player_team]]
+
 
 class GameSimulator:
     """ Docstring for GameSimulator
@@ -16,9 +70,12 @@ class GameSimulator:
     def db_interface(self, db_ini_file: configure_db.DBConfig):
         self._db_interface = DFSDBInterface(db_ini_file)
     
-    def __init__(self, db_ini_file: configure_db.DBConfig = configure_db.defaultNFLConfig()):
+    def __init__(self, db_ini_file: configure_db.DBConfig = configure_db.defaultNFLConfig(), seed=None):
+        """
+        :param seed: seed, SeedSequence or Generator for resampling.  None takes the next stream from dfsutil.rng
+        """
         self.db_interface = db_ini_file
-        self._games_rng = np.random.default_rng()
+        self._games_rng = rng.default_rng(seed)
         
 class ResampleSimulator(GameSimulator):
     """Simulate matchup outcomes by resampling from the full season
@@ -33,8 +90,10 @@ class ResampleSimulator(GameSimulator):
     - number of samples
     """
     
-    def __init__(self, db_ini_file: configure_db.DBConfig = configure_db.defaultNFLConfig()):
-        super().__init__(db_ini_file=db_ini_file)
+    def __init__(self, db_ini_file: configure_db.DBConfig = configure_db.defaultNFLConfig(), seed=None):
+        super().__init__(db_ini_file=db_ini_file, seed=seed)
+        self._outcome_cache = {}  # (season, week_num) -> get_outcome_matrix result
+        self._resample_index_cache = {}  # (season, week_num, pool_seasons) -> ResampleIndex
         
     def get_games_data(self, season: int = None, week_num: int = None):
         """
@@ -45,17 +104,17 @@ class ResampleSimulator(GameSimulator):
         if season is None:
             if week_num is None:
                 query = "SELECT player_name, pos, team, week_num, fpts_dk FROM player_games"
-                data_df = self.db_interface.run_command(query)
+                data_df = self.db_interface.run_typed_query(query)
             else:
                 query = "SELECT player_name, pos, team, week_num, fpts_dk FROM player_games WHERE week_num < %s"
-                data_df = self.db_interface.run_format_command(query, (week_num,))
+                data_df = self.db_interface.run_typed_query(query, (week_num,))
         else:
             if week_num is None:
                 query = "SELECT player_name, pos, team, week_num, fpts_dk FROM player_games WHERE season = %s"
-                data_df = self.db_interface.run_format_command(query, (season,))
+                data_df = self.db_interface.run_typed_query(query, (season,))
             else:
                 query = "SELECT player_name, pos, team, week_num, fpts_dk FROM player_games WHERE season = %s AND week_num < %s"
-                data_df = self.db_interface.run_format_command(query, (season, week_num))
+                data_df = self.db_interface.run_typed_query(query, (season, week_num))
         return data_df
     
     def get_true_results(self, season: int = None, week_num: int = None):
@@ -67,17 +126,17 @@ class ResampleSimulator(GameSimulator):
         if season is None:
             if week_num is None:
                 query = "SELECT player_name, pos, team, week_num, fpts_dk FROM player_games"
-                data_df = self.db_interface.run_command(query)
+                data_df = self.db_interface.run_typed_query(query)
             else:
                 query = "SELECT player_name, pos, team, week_num, fpts_dk FROM player_games WHERE week_num = %s"
-                data_df = self.db_interface.run_format_command(query, (week_num,))
+                data_df = self.db_interface.run_typed_query(query, (week_num,))
         else:
             if week_num is None:
                 query = "SELECT player_name, pos, team, week_num, fpts_dk FROM player_games WHERE season = %s"
-                data_df = self.db_interface.run_format_command(query, (season,))
+                data_df = self.db_interface.run_typed_query(query, (season,))
             else:
                 query = "SELECT player_name, pos, team, week_num, fpts_dk FROM player_games WHERE season = %s AND week_num = %s"
-                data_df = self.db_interface.run_format_command(query, (season, week_num))
+                data_df = self.db_interface.run_typed_query(query, (season, week_num))
         data_df['fpts_dk'] = data_df['fpts_dk'].astype(float)
         return data_df
     
@@ -94,15 +153,86 @@ class ResampleSimulator(GameSimulator):
                 yield games_data.loc[games_data['week_num'] == random_week].copy()
             except StopIteration:
                 break
-            
-    def generate_multiple(self, num_samples: int, season: int = None, week_num: int = None):
-        generator = self.games_generator(season, week_num)
-        results_list = []
-        for iter in range(num_samples):
-            sample = next(generator)
-            sample['sample_idx'] = [iter]*len(sample)
-            results_list.append(sample)
-        return pd.concat(results_list)
+
+    def get_outcome_matrix(self, season: int = None, week_num: int = None):
+        """
+        Pivot the player games before week_num into a dense (player x week) float32 array, with NaN where a player
+        has no game that week.  Players are identified by (player_name, pos), so a player traded mid-season keeps
+        one row, with the team of their latest game.  The result is cached per (season, week_num)
+
+        :return: (players DataFrame of player_name, pos, team; weeks array; outcomes array (num_players, num_weeks))
+        """
+        if season is None or week_num is None:
+            raise NotImplementedError("get_outcome_matrix only works with a specified season and week number")
+        if (season, week_num) not in self._outcome_cache:
+            games_data = self.get_games_data(season, week_num).sort_values(by='week_num')
+            games_data['fpts_dk'] = games_data['fpts_dk'].astype(float)
+            weeks = np.arange(1, week_num)
+            pivoted = games_data.pivot_table(index=PLAYER_KEY, columns='week_num', values='fpts_dk',
+                                             aggfunc='first').reindex(columns=weeks)
+            players = pivoted.index.to_frame(index=False)
+            players['team'] = games_data.groupby(PLAYER_KEY)['team'].last().reindex(pivoted.index).values
+            self._outcome_cache[(season, week_num)] = (players, weeks, pivoted.values.astype(np.float32))
+        return self._outcome_cache[(season, week_num)]
+
+    def sample_outcomes(self, num_samples: int, season: int = None, week_num: int = None):
+        """
+        Draw num_samples random weeks before week_num with one RNG call
+
+        :return: (sampled weeks (num_samples,), outcomes (num_samples, num_players) float32, NaN where a player
+            did not play in the sampled week).  Columns follow the players of get_outcome_matrix
+        """
+        players, weeks, outcomes = self.get_outcome_matrix(season, week_num)
+        sampled_weeks = self._games_rng.integers(low=1, high=week_num, size=num_samples)
+        return sampled_weeks, outcomes[:, sampled_weeks - weeks[0]].T
+
+    def get_pooled_games_data(self, season: int, week_num: int, pool_seasons: List[int] = None):
+        """
+        Player games of season before week_num, plus every game of the seasons in pool_seasons, in one query
+        """
+        pool_seasons = [] if pool_seasons is None else [int(val) for val in pool_seasons if val != season]
+        query = "SELECT season, player_name, pos, team, week_num, fpts_dk FROM player_games " \
+                "WHERE season = ANY(%s) OR (season = %s AND week_num < %s)"
+        return self.db_interface.run_typed_query(query, (pool_seasons, season, week_num))
+
+    def get_resample_index(self, season: int, week_num: int, pool_seasons: List[int] = None) -> ResampleIndex:
+        """
+        ResampleIndex of get_pooled_games_data, cached per (season, week_num, pool_seasons)
+        """
+        key = (season, week_num, tuple(sorted(pool_seasons or [])))
+        if key not in self._resample_index_cache:
+            self._resample_index_cache[key] = ResampleIndex(self.get_pooled_games_data(season, week_num, pool_seasons))
+        return self._resample_index_cache[key]
+
+    def resample(self, num_samples: int, season: int, week_num: int, pool_seasons: List[int] = None,
+                 half_life: float = None, by_team: bool = False):
+        """
+        Resample player outcomes from the weeks before week_num of season, optionally pooled with earlier seasons,
+        weighted towards recent weeks (half_life, in weeks) and resampled per team (by_team).  See
+        ResampleIndex.sample
+
+        :return: (players DataFrame of player_name, pos, team; outcomes (num_samples, num_players) float32)
+        """
+        index = self.get_resample_index(season, week_num, pool_seasons)
+        _, outcomes = index.sample(self._games_rng, num_samples, half_life, by_team)
+        return index.players, outcomes
+
+    def generate_multiple(self, num_samples: int, season: int = None, week_num: int = None, as_frame: bool = True):
+        """
+        Resample num_samples weeks.  With as_frame=False, return the (num_samples x player) outcome matrix from
+        sample_outcomes; otherwise a long DataFrame of the players who played in each sampled week, with a
+        sample_idx column
+        """
+        sampled_weeks, outcomes = self.sample_outcomes(num_samples, season, week_num)
+        if not as_frame:
+            return outcomes
+        players = self.get_outcome_matrix(season, week_num)[0]
+        sample_idx, player_idx = np.nonzero(~np.isnan(outcomes))
+        result = players.iloc[player_idx].reset_index(drop=True)
+        result['week_num'] = sampled_weeks[sample_idx]
+        result['fpts_dk'] = outcomes[sample_idx, player_idx].astype(float)
+        result['sample_idx'] = sample_idx
+        return result
 
 if __name__ == "__main__":
     simulator = ResampleSimulator()
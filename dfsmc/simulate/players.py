@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+
+CAPTAIN_MULTIPLIER = 1.5
+
+
+def psd_cholesky(cov: np.ndarray, eps: float = 1e-10, max_tries: int = 10) -> np.ndarray:
+    """
+    Lower Cholesky factor of a covariance matrix.  If the matrix is not positive definite (e.g. it is low rank, or
+    was estimated from too few samples), repair it by clipping its eigenvalues to a small positive floor and adding
+    jitter to the diagonal until the factorization succeeds
+    """
+    cov = (np.asarray(cov, dtype=float) + np.asarray(cov, dtype=float).T) / 2
+    try:
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        pass
+    eigenvalues, eigenvectors = np.linalg.eigh(cov)
+    floor = eps * max(eigenvalues.max(), eps)
+    repaired = (eigenvectors * np.clip(eigenvalues, floor, None)) @ eigenvectors.T
+    repaired = (repaired + repaired.T) / 2
+    for attempt in range(max_tries):
+        try:
+            return np.linalg.cholesky(repaired + floor * (10 ** attempt - 1) * np.eye(len(repaired)))
+        except np.linalg.LinAlgError:
+            continue
+    raise np.linalg.LinAlgError('Covariance matrix could not be repaired to positive definite')
+
+
+class CorrelatedPlayerSampler:
+    """
+    Correlated fantasy point outcomes for the players in a DraftGroup, from the position-level home/away covariance
+    model of ProjectionDataLoader.get_player_game_covariance (columns like QB_home, WR_away).
+
+    Each position-level residual is split among the players at that position on that team in proportion to their
+    projections, so the player-level covariance is W @ position_cov @ W.T for the (player x position) share matrix W.
+    Players at positions without a model (e.g. DST) get default_variance and no correlation.  The player-level
+    covariance is factorized once (see psd_cholesky), and each batch of samples is one matrix product.
+
+    If gamma (the output of ProjectionDataLoader.get_gamma, {position: (alpha, beta, shift)}) is given, the
+    correlated normals are mapped through a Gaussian copula to gamma-distributed residuals per position.
+
+    sample returns one column per row of players, with CPT rows at 1.5x the player's points, so that it can be
+    used as the sampler of simulate.contest.ContestSimulator.
+    """
+
+    def __init__(self, players: pd.DataFrame, position_cov: pd.DataFrame, gamma: dict = None,
+                 default_variance: float = 0.):
+        """
+        :param players: DraftGroup data (or LineupSet.player_data) with player_id, position, team_abbreviation,
+            home_team_abbreviation, roster_slot and projection columns
+        :param position_cov: position-level covariance, indexed and labelled by '{position}_{home|away}'
+        """
+        self.players = players
+        multiplier = np.where(players['roster_slot'].values == 'CPT', CAPTAIN_MULTIPLIER, 1.)
+        player_ids, self._row_player = np.unique(players['player_id'].values, return_inverse=True)
+        self.player_ids = player_ids
+        self._row_multiplier = multiplier
+
+        # one row per player, projection without the CPT multiplier
+        first_row = np.unique(self._row_player, return_index=True)[1]
+        unique_players = players.iloc[first_row]
+        self.mean = (players['projection'].astype(float).values / multiplier)[first_row]
+        side = np.where(unique_players['team_abbreviation'].values == unique_players['home_team_abbreviation'].values,
+                        'home', 'away')
+        groups = pd.Series([f'{pos}_{s}' for pos, s in zip(unique_players['position'].values, side)])
+        self.positions = unique_players['position'].values
+
+        # share of each player in their team-position group
+        labels = list(position_cov.columns)
+        in_model = groups.isin(labels).values
+        weights = np.nan_to_num(np.clip(self.mean, 0., None))
+        group_totals = pd.Series(weights).groupby(groups).transform('sum').values
+        group_sizes = groups.map(groups.value_counts()).values
+        shares = np.where(group_totals > 0, weights / np.where(group_totals > 0, group_totals, 1.), 1. / group_sizes)
+        share_matrix = np.zeros((len(player_ids), len(labels)))
+        share_matrix[np.flatnonzero(in_model), [labels.index(g) for g in groups[in_model]]] = shares[in_model]
+
+        position_cov = position_cov.loc[labels, labels].values.astype(float)
+        self.cov = share_matrix @ position_cov @ share_matrix.T + np.diag(np.where(in_model, 0., default_variance))
+        self._chol = psd_cholesky(self.cov)
+        self._sd = np.sqrt(np.diag(self.cov))
+
+        self.gamma = None
+        if gamma is not None:
+            params = np.array([gamma.get(pos, (np.nan, np.nan, np.nan)) for pos in self.positions], dtype=float)
+            self.gamma = params.reshape(len(player_ids), 3)
+            self._gamma_tables = self._quantile_tables()
+
+    # standard normal grid on which the gamma quantile functions are tabulated
+    _copula_grid = np.linspace(-8., 8., 4097)
+
+    def _quantile_tables(self) -> dict:
+        """
+        Gamma residual quantiles on _copula_grid for each distinct (alpha, beta, shift), so the copula transform is
+        an interpolation instead of an inverse incomplete gamma function per sample
+        """
+        from scipy import special
+
+        uniforms = special.ndtr(self._copula_grid)
+        tables = {}
+        for params in np.unique(self.gamma[~np.isnan(self.gamma[:, 0])], axis=0):
+            alpha, beta, shift = params
+            tables[tuple(params)] = special.gammaincinv(alpha, uniforms) / beta + shift
+        return tables
+
+    @classmethod
+    def from_model_file(cls, players: pd.DataFrame, path=None, gamma: dict = None, default_variance: float = 0.):
+        """
+        Read the position-level covariance written by ProjectionDataLoader.get_player_game_covariance (by default
+        the TrivialProjector model)
+        """
+        if path is None:
+            from dfsmc.projection.projection_data import TrivialProjector
+            path = TrivialProjector.cov_model_path()
+        return cls(players, pd.read_csv(path, index_col=0), gamma, default_variance)
+
+    def sample_players(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        """
+        n samples of fantasy points for each unique player (columns in player_ids order), shape (n, num_players)
+        """
+        correlated = rng.standard_normal((n, len(self.mean))) @ self._chol.T
+        if self.gamma is None:
+            return self.mean + correlated
+
+        # Gaussian copula: correlated standard normals -> gamma residual quantiles for players with a model
+        result = self.mean + correlated
+        for params, table in self._gamma_tables.items():
+            columns = np.flatnonzero((self.gamma == params).all(axis=1) & (self._sd > 0))
+            normals = correlated[:, columns] / self._sd[columns]
+            result[:, columns] = self.mean[columns] + np.interp(normals, self._copula_grid, table)
+        return result
+
+    def sample(self, rng: np.random.Generator, n: int) -> np.ndarray:
+        """
+        n samples of fantasy points for each row of players (CPT rows at 1.5x), shape (n, len(players))
+        """
+        return self.sample_players(rng, n)[:, self._row_player] * self._row_multiplier
@@ -0,0 +1,135 @@
+import pathlib
+import tempfile
+import unittest
+
+import numpy as np
+
+from dfsmc.contest import Contest
+from dfsmc.lineup import Lineup
+from dfsmc.test.test_lineup.test_enumeration import make_showdown_players
+
+
+def one_hot(lineups: np.ndarray, num_players: int) -> np.ndarray:
+    result = np.zeros((len(lineups), num_players))
+    result[np.arange(len(lineups)).reshape(-1, 1), lineups.astype(int)] = 1
+    return result
+
+
+class TestLineupSet(unittest.TestCase):
+
+    def setUp(self):
+        players = make_showdown_players(10)
+        players['actual'] = 0.5 * np.arange(len(players))
+        players['id'] = np.arange(len(players)) + 1000
+        # drop a FLEX row so that the LineupSet has to renumber players
+        self.players = players[players.index != 3].reset_index(drop=True)
+        constraint = Lineup.LineupConstraint('Showdown')
+        constraint.salary_max = 30000
+        self.generator = Lineup.greedyGenerator(constraint, self.players.copy())
+        self.index_lineups = self.generator.generate()
+        rng = np.random.default_rng(1)
+        a = rng.normal(size=(len(self.players), len(self.players)))
+        self.cov = a @ a.T
+        self.field = Contest.LineupSet(self.players, self.index_lineups, self.cov)
+        self.dense = one_hot(self.field.lineups, self.field.num_players)
+
+    def test_compact_storage(self):
+        self.assertEqual(self.field.lineups.dtype, np.uint8)
+        self.assertEqual(self.field.lineups.shape, (len(self.index_lineups), 6))
+        np.testing.assert_array_equal(self.field.to_csr().toarray(), self.dense)
+
+    def test_totals(self):
+        values = self.field.player_data[['salary', 'projection', 'actual']].values.astype(float)
+        np.testing.assert_allclose(self.field.lineup_totals(values), self.dense @ values)
+        stats = self.field.get_lineup_stats().sort_index()
+        np.testing.assert_allclose(stats['salary'].values, self.dense @ values[:, 0])
+        np.testing.assert_allclose(stats['covariance'].values, np.diag(self.dense @ self.field.cov @ self.dense.T))
+        self.assertEqual(len(np.unique(stats['key'])), len(stats))
+        np.testing.assert_array_equal(stats['lineup'].values, self.field.lineup_names())
+        self.assertTrue(all(name.startswith('(CPT:') and name.count(')(') == 5 for name in stats['lineup']))
+        # the key does not depend on the order the players are stored in
+        shuffled = Contest.LineupSet(self.field.player_data, self.field.lineups[:, ::-1], self.field.cov)
+        np.testing.assert_array_equal(shuffled.lineup_keys(), self.field.lineup_keys())
+
+    def test_overlap_and_covariance(self):
+        rows = np.array([3, 7, 20])
+        np.testing.assert_allclose(self.field.lineup_set_overlap_matrix(rows), self.dense[rows] @ self.dense.T)
+        np.testing.assert_allclose(self.field.lineup_set_overlap_matrix(rows, subset=True),
+                                   self.dense[rows] @ self.dense[rows].T)
+        np.testing.assert_allclose(self.field.lineup_set_covariance_matrix(rows),
+                                   self.dense[rows] @ self.field.cov @ self.dense.T)
+
+    def test_pair_blocks(self):
+        tiles = np.zeros((len(self.field), len(self.field)))
+        for rows, columns, tile in self.field.iter_pair_blocks('covariance', row_block=50, column_block=40):
+            tiles[rows, columns] = tile
+        np.testing.assert_allclose(tiles, self.dense @ self.field.cov @ self.dense.T)
+        rows = np.array([3, 7, 20])
+        expected = self.dense[rows] @ self.dense.T
+        expected[expected < 3] = 0
+        np.testing.assert_array_equal(self.field.overlap_csr(rows, min_overlap=3).toarray(), expected)
+        # built in row blocks, all rows by default
+        expected = self.dense @ self.dense.T
+        expected[expected < 4] = 0
+        np.testing.assert_array_equal(self.field.overlap_csr(min_overlap=4, row_block=7).toarray(), expected)
+
+    def test_top_k_neighbours(self):
+        rows = np.array([0, 5, 9])
+        for metric, full in [('overlap', self.dense @ self.dense.T),
+                             ('covariance', self.dense @ self.field.cov @ self.dense.T)]:
+            for largest in [True, False]:
+                indices, values = self.field.top_k_neighbours(rows, k=5, metric=metric, largest=largest,
+                                                              column_block=17)
+                for i, r in enumerate(rows):
+                    x = np.where(np.arange(len(full)) == r, -np.inf if largest else np.inf, full[r])
+                    expected = np.lexsort((np.arange(len(x)), -x if largest else x))[:5]
+                    np.testing.assert_array_equal(indices[i], expected)
+                    np.testing.assert_allclose(values[i], x[expected])
+
+    def test_generate_max_coverage(self):
+        selected = self.field.generate_max_coverage(20, seed=3)
+        np.testing.assert_array_equal(selected, self.field.generate_max_coverage(20, seed=3))
+        # reference: recompute the covariance sums from scratch at every step
+        expected = selected[:1]
+        full = self.dense @ self.field.cov @ self.dense.T
+        for _ in range(19):
+            remaining_cov = full[expected].sum(axis=0)
+            remaining_cov[expected] = np.inf
+            expected = np.append(expected, np.argmin(np.abs(remaining_cov)))
+        np.testing.assert_array_equal(selected, expected)
+
+    def test_filter_and_file(self):
+        rows = np.array([3, 7, 20])
+        filtered = self.field.filter(rows)
+        np.testing.assert_allclose(filtered.lineup_set_diagonal_covariance(),
+                                   self.field.lineup_set_diagonal_covariance()[rows])
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            outfile = pathlib.Path(tmpdir) / 'lineups.npy'
+            self.generator.generate_to_file(outfile)
+            field = Contest.LineupSet.from_file(self.players, outfile, self.cov)
+            np.testing.assert_array_equal(field.lineups, self.field.lineups)
+            del field
+
+            # binary field format round trip, and uploads selected by row without parsing lineup strings
+            self.field.to_file(pathlib.Path(tmpdir) / 'field_text.csv')
+            self.field.to_file(pathlib.Path(tmpdir) / 'field.field')
+            field = Contest.LineupSet.load(pathlib.Path(tmpdir) / 'field.field')
+            np.testing.assert_array_equal(field.lineups, self.field.lineups)
+            np.testing.assert_allclose(field.cov, self.field.cov)
+            stats = Contest.LineupSet.load_stats(pathlib.Path(tmpdir) / 'field.field', rows)
+            np.testing.assert_allclose(stats['projection'].values,
+                                       self.field.get_lineup_stats().loc[rows, 'projection'].values, rtol=1e-6)
+            del field
+            csv_upload = Contest.LineupSet.convert_to_uploadable(pathlib.Path(tmpdir) / 'field_text.csv', rows)
+            binary_upload = Contest.LineupSet.convert_to_uploadable(pathlib.Path(tmpdir) / 'field.field', rows)
+            with open(csv_upload) as csv_file, open(binary_upload) as binary_file:
+                self.assertEqual(csv_file.read(), binary_file.read())
+
+            # fields written as .csv before the binary format are still read when the binary file is missing
+            legacy_upload = Contest.LineupSet.convert_to_uploadable(pathlib.Path(tmpdir) / 'field_text.field', rows)
+            self.assertEqual(legacy_upload, csv_upload)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from dfsmc.contest import Contest
+
+
+class TestPayout(unittest.TestCase):
+
+    def setUp(self):
+        self.data = pd.DataFrame({'min_position': [1, 2, 4, 11], 'max_position': [1, 3, 10, 25],
+                                  'payout_cash': [1000., 250., 50., None]})
+        self.payout = Contest.Payout(self.data)
+
+    def tier_cash(self, position: int) -> float:
+        # filter the payouts table for one position
+        tier = self.data.loc[(self.data['min_position'] <= position) & (self.data['max_position'] >= position)]
+        return 0. if tier.empty else float(tier['payout_cash'].fillna(0.).iloc[0])
+
+    def test_cash_by_rank(self):
+        ranks = np.arange(1, 40)
+        np.testing.assert_array_equal(self.payout.get_cash(ranks), [self.tier_cash(r) for r in ranks])
+        self.assertEqual(self.payout.get_cash(np.array([[2, 1000000]])).shape, (1, 2))
+
+    def test_ties_split_cash(self):
+        rng = np.random.default_rng(0)
+        ranks = rng.integers(1, 30, size=200)
+        ties = rng.integers(1, 8, size=200)
+        expected = [np.mean([self.tier_cash(p) for p in range(r, r + t)]) for r, t in zip(ranks, ties)]
+        np.testing.assert_allclose(self.payout.get_cash(ranks, ties), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,232 @@
+import contextlib
+import io
+import threading
+import types
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from dfsdata import interface
+
+
+class CopyCursor:
+    """
+    Records the statements and COPY data a DFSDBInterface sends
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.copied = None
+
+    def execute(self, command, variable=None):
+        self.statements.append(command)
+
+    def copy_expert(self, command, buffer):
+        self.statements.append(command)
+        self.copied = buffer.read()
+
+
+class TestCopyUpsert(unittest.TestCase):
+
+    def setUp(self):
+        self.db = interface.DFSDBInterface.__new__(interface.DFSDBInterface)
+        self.db.cache = None
+        self.cur = CopyCursor()
+        self.db.cursor = lambda: contextlib.nullcontext(self.cur)
+
+    def test_integer_columns_with_nulls(self):
+        data = pd.DataFrame({
+            'player_id': [10, 11, 12],
+            'team_id': [1., np.nan, 3.],  # integer column that picked up a NaN
+            'fpts': [10.5, np.nan, 3.],
+            'salary': [5000., 5200., 4800.],
+            'name': ['A', None, 'C'],
+        })
+        self.assertTrue(self.db.copy_upsert(data, 'players', key=['player_id']))
+        copied = pd.read_csv(io.StringIO(self.cur.copied), header=None, dtype=str, keep_default_na=False)
+        self.assertEqual(copied[1].tolist(), ['1', '\\N', '3'])
+        self.assertEqual(copied[2].tolist(), ['10.5', '\\N', '3.0'])
+        self.assertEqual(copied[3].tolist(), ['5000', '5200', '4800'])
+        self.assertEqual(copied[4].tolist(), ['A', '\\N', 'C'])
+        self.assertTrue(self.cur.statements[-1].startswith('INSERT INTO players'))
+        # the caller's frame is unchanged
+        self.assertEqual(data['team_id'].dtype, np.float64)
+
+
+class TypedCursor:
+    """
+    Named cursor that returns its rows in fixed fetchmany chunks
+    """
+
+    def __init__(self, description, chunks):
+        self.description = description
+        self.chunks = list(chunks)
+        self.itersize = None
+        self.executed = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, command, variable=None):
+        self.executed = (command, variable)
+
+    def fetchmany(self, size):
+        return self.chunks.pop(0) if self.chunks else []
+
+
+class TypedConnection:
+
+    closed = False
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.names = []
+        self.committed = False
+
+    def cursor(self, name=None):
+        self.names.append(name)
+        return self._cursor
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+
+class TestTypedQuery(unittest.TestCase):
+
+    def test_typed_column(self):
+        numeric = interface.DFSDBInterface._typed_column([1.5, None, 3.], 1700)
+        self.assertEqual(numeric.dtype, np.float64)
+        np.testing.assert_array_equal(numeric, [1.5, np.nan, 3.])
+        integers = interface.DFSDBInterface._typed_column([1, 2, 3], 23)
+        self.assertEqual(integers.dtype, np.int64)
+        with_null = interface.DFSDBInterface._typed_column([1, None, 3], 20)
+        self.assertEqual(with_null.dtype, np.float64)
+        np.testing.assert_array_equal(with_null, [1., np.nan, 3.])
+        text = interface.DFSDBInterface._typed_column(['KC', None], 1043)
+        self.assertEqual(text.dtype, object)
+        self.assertEqual(text.tolist(), ['KC', None])
+        self.assertEqual(interface.DFSDBInterface._typed_column([], 701).dtype, np.float64)
+
+    def test_run_typed_query(self):
+        description = [('player_id', 23), ('fpts', 1700), ('team_id', 20), ('name', 1043)]
+        chunks = [
+            [(1, 10.5, 7, 'A'), (2, None, 8, 'B')],
+            [(3, 3., None, 'C'), (4, 12.25, 9, None)],  # a NULL in team_id only in the second chunk
+            [(5, 0., 7, 'E')],
+        ]
+        cursor = TypedCursor(description, chunks)
+        connection = TypedConnection(cursor)
+        db = interface.DFSDBInterface.__new__(interface.DFSDBInterface)
+        db.cache = None
+        db.connection = lambda: contextlib.nullcontext(connection)
+        with mock.patch.object(interface.psycopg2.extensions, 'register_type'):
+            result = db.run_typed_query('SELECT * FROM player_games WHERE season = %s', (2023,), chunk_size=2,
+                                        use_cache=False)
+
+        self.assertEqual(cursor.itersize, 2)
+        self.assertEqual(cursor.executed[1], (2023,))
+        self.assertTrue(connection.names[0].startswith('typed_'))
+        self.assertTrue(connection.committed)
+        self.assertEqual(list(result.columns), ['player_id', 'fpts', 'team_id', 'name'])
+        self.assertEqual(result['player_id'].dtype, np.int64)
+        self.assertEqual(result['player_id'].tolist(), [1, 2, 3, 4, 5])
+        self.assertEqual(result['fpts'].dtype, np.float64)
+        np.testing.assert_array_equal(result['fpts'], [10.5, np.nan, 3., 12.25, 0.])
+        self.assertEqual(result['team_id'].dtype, np.float64)
+        np.testing.assert_array_equal(result['team_id'], [7., 8., np.nan, 9., 7.])
+        self.assertEqual(result['name'].isna().tolist(), [False, False, False, True, False])
+        self.assertEqual(result['name'].iloc[4], 'E')
+
+    def test_run_typed_query_empty(self):
+        cursor = TypedCursor([('player_id', 23), ('fpts', 701)], [])
+        db = interface.DFSDBInterface.__new__(interface.DFSDBInterface)
+        db.cache = None
+        db.connection = lambda: contextlib.nullcontext(TypedConnection(cursor))
+        with mock.patch.object(interface.psycopg2.extensions, 'register_type'):
+            result = db.run_typed_query('SELECT player_id, fpts FROM player_games', use_cache=False)
+        self.assertEqual(list(result.columns), ['player_id', 'fpts'])
+        self.assertEqual(len(result), 0)
+
+
+class StubConnection:
+
+    closed = 0
+
+
+class StubThreadedPool:
+    """
+    Stands in for psycopg2's ThreadedConnectionPool, which raises instead of blocking when it runs out
+    """
+
+    def __init__(self, minconn, maxconn, **db_args):
+        self.maxconn = maxconn
+        self.db_args = db_args
+        self.out = 0
+
+    def getconn(self):
+        if self.out >= self.maxconn:
+            raise RuntimeError('connection pool exhausted')
+        self.out += 1
+        return StubConnection()
+
+    def putconn(self, conn, close=False):
+        self.out -= 1
+
+    def closeall(self):
+        pass
+
+
+@mock.patch.object(interface.pool, 'ThreadedConnectionPool', StubThreadedPool)
+class TestConnectionPool(unittest.TestCase):
+
+    def test_checkout_blocks_at_max_connections(self):
+        connection_pool = interface.ConnectionPool({'dbname': 'dfs'}, max_connections=2)
+        first, second = connection_pool.getconn(), connection_pool.getconn()
+        checked_out = threading.Event()
+
+        def third():
+            connection_pool.putconn(connection_pool.getconn())
+            checked_out.set()
+
+        thread = threading.Thread(target=third, daemon=True)
+        thread.start()
+        self.assertFalse(checked_out.wait(0.2))  # waits for a slot instead of raising
+        connection_pool.putconn(first)
+        self.assertTrue(checked_out.wait(5.))
+        thread.join()
+        connection_pool.putconn(second)
+        self.assertEqual(connection_pool._pool.out, 0)
+
+    def test_slot_released_when_body_raises(self):
+        db = interface.DFSDBInterface.__new__(interface.DFSDBInterface)
+        db.pool = interface.ConnectionPool({'dbname': 'dfs'}, max_connections=1)
+        with self.assertRaises(ValueError):
+            with db.connection():
+                raise ValueError('query failed')
+        # the only slot is free again
+        with db.connection() as conn:
+            self.assertIsInstance(conn, StubConnection)
+        self.assertEqual(db.pool._pool.out, 0)
+
+    def test_shared_pool(self):
+        ini = types.SimpleNamespace(INI='database.ini')
+        with mock.patch.dict(interface._POOLS, clear=True), \
+                mock.patch.object(interface.DFSDBInterface, 'config', lambda self, filename: {'dbname': 'dfs'}):
+            first = interface.DFSDBInterface(ini)
+            second = interface.DFSDBInterface(ini)
+            self.assertIs(first.pool, second.pool)
+            self.assertEqual(first.pool._pool.db_args, {'dbname': 'dfs'})
+            with mock.patch.object(interface.DFSDBInterface, 'config', lambda self, filename: {'dbname': 'nfl'}):
+                self.assertIsNot(interface.DFSDBInterface(ini).pool, first.pool)
+
+
+if __name__ == '__main__':
+    unittest.main()
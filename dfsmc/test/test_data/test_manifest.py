@@ -0,0 +1,88 @@
+import os
+import pathlib
+import tempfile
+import unittest
+
+import pandas as pd
+
+from dfsdata import manifest
+
+
+class StubManifestDB:
+    """
+    ingest_manifest table held in a DataFrame
+    """
+
+    def __init__(self):
+        self.table = pd.DataFrame(columns=['path', 'size', 'mtime', 'hash', 'kind', 'status'])
+        self.hashed = []
+
+    def run_format_command(self, command, variable, fetch=True, use_cache=True):
+        rows = self.table[self.table['kind'] == variable[0]]
+        return rows[['path', 'size', 'mtime', 'hash', 'status']].reset_index(drop=True)
+
+    def copy_upsert(self, data, table, conflict='ON CONFLICT DO NOTHING', key=None, replace_on=None):
+        kept = self.table[~self.table['path'].isin(data['path'])]
+        self.table = pd.concat([kept, data], ignore_index=True) if len(kept) else data.reset_index(drop=True)
+        return True
+
+
+class TestIngestManifest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name)
+        self.files = []
+        for i in range(4):
+            file = self.path / f'draft_group_info-{i}.json'
+            file.write_text(f'{{"id": {i}}}')
+            self.files.append(file)
+        self.db = StubManifestDB()
+        self.manifest = manifest.IngestManifest(self.db)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def scan_names(self):
+        return [pathlib.Path(p).name for p in self.manifest.scan('draft_group', self.files)['path']]
+
+    def test_scan(self):
+        # new files
+        files = self.manifest.scan('draft_group', self.files)
+        self.assertEqual(len(files), 4)
+        self.assertEqual(files['hash'].iloc[0], manifest.file_hash(self.files[0]))
+        self.manifest.mark('draft_group', files)
+
+        # same size and mtime: skipped without hashing
+        original_hash = manifest.file_hash
+        manifest.file_hash = lambda path: self.fail(f'{path} hashed')
+        try:
+            self.assertEqual(self.scan_names(), [])
+        finally:
+            manifest.file_hash = original_hash
+
+        # touched but identical: skipped, and the new mtime is recorded
+        stat = os.stat(self.files[0])
+        os.utime(self.files[0], (stat.st_atime, stat.st_mtime + 60))
+        self.assertEqual(self.scan_names(), [])
+        record = self.db.table.set_index('path').loc[str(self.files[0])]
+        self.assertEqual(record['mtime'], stat.st_mtime + 60)
+
+        # changed contents
+        self.files[1].write_text('{"id": 1, "salary": 5000}')
+        changed = self.manifest.scan('draft_group', self.files)
+        self.assertEqual([pathlib.Path(p).name for p in changed['path']], ['draft_group_info-1.json'])
+
+        # partial and failed loads are read again, loaded ones are not
+        self.manifest.mark('draft_group', changed, manifest.PARTIAL)
+        self.assertEqual(self.scan_names(), ['draft_group_info-1.json'])
+        failed = self.db.table[self.db.table['path'] == str(self.files[2])]
+        self.manifest.mark('draft_group', failed, manifest.FAILED)
+        self.assertEqual(self.scan_names(), ['draft_group_info-1.json', 'draft_group_info-2.json'])
+
+        # kinds are tracked separately
+        self.assertEqual(len(self.manifest.scan('contest_details', self.files)), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
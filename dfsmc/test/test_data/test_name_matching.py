@@ -0,0 +1,100 @@
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from dfsdata.update_tables import name_matching
+from dfsdata.update_tables.update_dfs_tables import DataWrangler
+
+
+class StubMatchDB:
+    """
+    draftables and players_dict tables held in DataFrames.  Rows written with copy_upsert are appended to
+    players_dict
+    """
+
+    def __init__(self, draftables: pd.DataFrame, players_dict: pd.DataFrame):
+        self.draftables = draftables
+        self.players_dict = players_dict
+        self.upserts = []
+
+    def run_command(self, command, fetch=True):
+        if 'FROM draftables' in command:
+            return self.draftables.copy()
+        return self.players_dict[['player_name', 'position', 'team']].copy()
+
+    def copy_upsert(self, data, table, conflict='ON CONFLICT DO NOTHING', key=None, replace_on=None):
+        self.upserts.append(data)
+        self.players_dict = pd.concat([self.players_dict, data], ignore_index=True)
+        return True
+
+
+class TestNameMatching(unittest.TestCase):
+
+    def setUp(self):
+        self.choices = pd.DataFrame({
+            'Player': ['DJ Moore', 'DK Metcalf', 'Mike Williams', 'Mike Williams', 'Patrick Mahomes', 'Bills'],
+            'Pos': ['WR', 'WR', 'WR', 'WR', 'QB', 'DST'],
+            'Team': ['CHI', 'SEA', 'NYJ', 'LAC', 'KC', 'BUF'],
+            'player_id': [11, 12, 13, 14, 15, 16],
+        })
+
+    def test_normalize_name(self):
+        self.assertEqual(name_matching.normalize_name('D.J. Moore Jr.'), 'dj moore')
+        self.assertEqual(name_matching.normalize_name('Amon-Ra St. Brown'), 'amon ra st brown')
+
+    def test_trigram_scores(self):
+        queries, choices = name_matching.trigram_matrices(['D.J. Moore', 'Pat Mahomes'], list(self.choices['Player']))
+        scores = (queries @ choices.T).toarray()
+        self.assertAlmostEqual(scores[0, 0], 1.)
+        self.assertEqual(scores[1].argmax(), 4)
+        self.assertTrue(((scores >= 0.) & (scores <= 1. + 1e-9)).all())
+
+    def test_fuzzy_candidates(self):
+        queries = pd.DataFrame({'Player': ['D.J. Moore', 'Mike Williams', 'Patrick Mahomes II', 'Buffalo Bills'],
+                                'Pos': ['WR', 'WR', 'QB', 'D/ST'],
+                                'Team': ['CHI', 'LAC', 'KC', 'BUF']},
+                               index=[10, 20, 30, 40])
+        candidates = name_matching.fuzzy_candidates(queries, self.choices, limit=2)
+        best = candidates.drop_duplicates(subset='query').set_index('query')['choice']
+        self.assertEqual(best[10], 0)
+        self.assertEqual(best[20], 3)  # the same-team Mike Williams ranks first
+        self.assertEqual(best[30], 4)
+        self.assertEqual(set(candidates.loc[candidates['query'] == 20, 'choice']), {2, 3})
+        # no DraftKings position is named 'D/ST', so the defense is scored against every choice
+        self.assertEqual(best[40], 5)
+        self.assertEqual((candidates['query'] == 40).sum(), 2)
+
+    def test_match_player_names(self):
+        db = StubMatchDB(
+            self.choices.rename(columns={'Player': 'name', 'Pos': 'position', 'Team': 'team_abbreviation'}),
+            pd.DataFrame({'player_name': ['Patrick Mahomes'], 'position': ['QB'], 'team': ['KC'],
+                          'draftkings_name': ['Patrick Mahomes'], 'player_id': [15]}))
+        wrangler = DataWrangler.__new__(DataWrangler)
+        wrangler._db = db
+        players = pd.DataFrame({
+            'Player': ['Patrick Mahomes', 'Mike Williams', 'Buffalo Bills', 'D.J. Moore', 'Nobody Here'],
+            'Pos': ['QB', 'WR', 'DST', 'WR', 'WR'],
+            'Team': ['KC', 'LAC', 'BUF', 'CHI', 'NE'],
+        })
+        with mock.patch('builtins.input', side_effect=['11', '0']) as prompt, \
+                mock.patch('builtins.print'):
+            wrangler.match_player_names(players)
+        self.assertEqual(prompt.call_count, 2)
+
+        matches = db.players_dict.set_index('player_name')
+        self.assertEqual(len(matches), 5)
+        self.assertEqual(matches.loc['Mike Williams', 'player_id'], 14)  # exact name, same team
+        self.assertEqual(matches.loc['Buffalo Bills', 'player_id'], 16)  # defense, last word of the name
+        self.assertEqual(matches.loc['D.J. Moore', 'player_id'], 11)  # picked from the fuzzy candidates
+        self.assertEqual(matches.loc['D.J. Moore', 'draftkings_name'], 'DJ Moore')
+        self.assertEqual(matches.loc['Nobody Here', 'player_id'], 0)
+        self.assertEqual(matches.loc['Nobody Here', 'draftkings_name'], '')
+
+        # players already in players_dict are not matched again
+        with mock.patch('builtins.input', side_effect=AssertionError('prompted')), mock.patch('builtins.print'):
+            wrangler.match_player_names(players)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import pathlib
+import tempfile
+import threading
+import unittest
+
+import pandas as pd
+
+from dfsdata import query_cache
+
+
+class TestReadTables(unittest.TestCase):
+
+    def test_read_tables(self):
+        self.assertEqual(query_cache.read_tables('SELECT * FROM player_games pg JOIN games g ON g.id = pg.game_id'),
+                         {'player_games', 'games'})
+        self.assertEqual(query_cache.read_tables('SELECT * FROM public.contests AS c, payouts p, draftables '
+                                                 'WHERE c.contest_id = p.contest_id'),
+                         {'contests', 'payouts', 'draftables'})
+        # functions are not tables, and subqueries are read through their own FROM clause
+        self.assertEqual(query_cache.read_tables('SELECT ids.player_id FROM unnest(%s) AS ids(player_id) '
+                                                 'LEFT JOIN (SELECT * FROM projections) pr ON true'),
+                         {'projections'})
+        # a FROM list that cannot be parsed depends on every table
+        self.assertIn(query_cache.ANY_TABLE, query_cache.read_tables('SELECT * FROM "Contests"'))
+
+
+class TestQueryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name)
+        self.result = pd.DataFrame({'player_id': [1, 2], 'fpts': [10.5, 3.]})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_invalidate(self):
+        cache = query_cache.QueryCache(max_entries=1)
+        cache.put('a', 'SELECT * FROM projections, games', self.result)
+        cache.put('b', 'SELECT * FROM "Weird"', self.result)
+        self.assertEqual(len(cache), 1)  # LRU evicted a
+        cache.put('a', 'SELECT * FROM projections, games', self.result)
+        pd.testing.assert_frame_equal(cache.get('a'), self.result)
+        cache.invalidate(['public.games'])
+        self.assertIsNone(cache.get('a'))
+
+        # a write between taking the versions and storing the result leaves the result stale
+        versions = cache.table_versions('SELECT * FROM projections')
+        cache.invalidate(['projections'])
+        cache.put('c', 'SELECT * FROM projections', self.result, versions)
+        self.assertIsNone(cache.get('c'))
+
+    def test_shared_directory(self):
+        # two processes sharing the disk tier: a write in one invalidates the other's cached results
+        first = query_cache.QueryCache(directory=self.path)
+        second = query_cache.QueryCache(directory=self.path)
+        first.put('a', 'SELECT * FROM projections', self.result)
+        first.put('b', 'SELECT * FROM contests', self.result)
+        pd.testing.assert_frame_equal(second.get('a'), self.result)
+        second.invalidate(['projections'])
+        self.assertIsNone(first.get('a'))
+        pd.testing.assert_frame_equal(first.get('b'), self.result)
+        self.assertEqual(len(query_cache.QueryCache(directory=self.path)), 1)
+        first.invalidate()
+        self.assertIsNone(second.get('b'))
+        self.assertEqual(len(second), 0)
+        self.assertEqual([p.name for p in self.path.iterdir() if p.suffix == '.tmp'], [])
+
+    def test_threads(self):
+        cache = query_cache.QueryCache(max_entries=8)
+
+        def work(offset):
+            for i in range(200):
+                key = str((offset + i) % 20)
+                if cache.get(key) is None:
+                    cache.put(key, 'SELECT * FROM projections', self.result)
+                if i % 50 == 0:
+                    cache.invalidate(['projections'])
+
+        threads = [threading.Thread(target=work, args=(offset,)) for offset in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertLessEqual(len(cache), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
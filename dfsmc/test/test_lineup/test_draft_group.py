@@ -0,0 +1,76 @@
+import unittest
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from dfsmc.lineup import Lineup
+
+
+class StubPointsDB:
+    """
+    Answers the DraftGroup draftables query and the populate_points_data query, and records the commands
+    """
+
+    def __init__(self, draftables: pd.DataFrame, points: pd.DataFrame):
+        self.draftables = draftables
+        self.points = points
+        self.commands = []
+
+    def run_format_command(self, command, variable, fetch=True, use_cache=True):
+        self.commands.append((command, variable))
+        if 'unnest' in command:
+            return self.points[self.points['player_id'].isin(variable[0])].reset_index(drop=True)
+        return self.draftables.copy()
+
+
+class TestPopulatePointsData(unittest.TestCase):
+
+    def setUp(self):
+        rows = []
+        for player_id, name, team in [(1, 'Josh Allen', 'BUF'), (2, 'Stefon Diggs', 'BUF'), (3, 'Travis Kelce', 'KC')]:
+            for slot, salary in [(511, 15000), (512, 10000)]:
+                rows.append({'player_id': player_id, 'name': name, 'team_abbreviation': team, 'position': 'QB',
+                             'roster_slot_id': slot, 'salary': salary, 'week': 5})
+        draftables = pd.DataFrame(rows)
+        # player 2 has no projection, player 3 has no game stats
+        points = pd.DataFrame({'player_id': [1, 2, 3],
+                               'fpros_projection': [Decimal('20.5'), None, Decimal('12')],
+                               'fpts_ppr': [Decimal('24.1'), Decimal('3'), None]})
+        self.db = StubPointsDB(draftables, points)
+        self.draft_group = Lineup.DraftGroup(draft_group_id=10, db_interface=self.db)
+
+    def test_populate_points_data(self):
+        self.draft_group.populate_points_data(self.db)
+        command, variable = self.db.commands[-1]
+        self.assertEqual(command.count('DISTINCT ON (player_id)'), command.count('ORDER BY player_id'))
+        self.assertEqual(sorted(variable[0]), [1, 2, 3])
+        self.assertEqual(variable[1], 5)
+
+        data = self.draft_group.data.set_index(['player_id', 'roster_slot'])
+        self.assertEqual(data.loc[(1, 'CPT'), 'projection'], 1.5 * 20.5)
+        self.assertEqual(data.loc[(1, 'FLEX'), 'actual'], 24.1)
+        self.assertAlmostEqual(data.loc[(1, 'CPT'), 'actual'], 1.5 * 24.1)
+        self.assertTrue(np.isnan(data.loc[(2, 'FLEX'), 'projection']))
+        self.assertEqual(data.loc[(2, 'CPT'), 'actual'], 4.5)
+        # missing results stay missing instead of counting as 0 points (filter_by_projection keeps these players)
+        self.assertTrue(np.isnan(data.loc[(3, 'CPT'), 'actual']))
+        self.assertTrue(data['variance'].eq(0.).all())
+
+        players = {(p.player_id, p.roster_slot): p for p in self.draft_group.player_list}
+        self.assertEqual(players[(1, 'FLEX')].fantasy_points_projection, 20.5)
+        self.assertTrue(np.isnan(players[(3, 'FLEX')].fantasy_points_actual))
+
+    def test_filter_upcoming_slate(self):
+        # no game has stats yet: every player keeps their row as long as they have a projection above threshold
+        self.db.points['fpts_ppr'] = None
+        self.draft_group.populate_points_data(self.db)
+        self.assertTrue(self.draft_group.data['actual'].isna().all())
+        self.draft_group.filter_by_projection(1.0)
+        data = self.draft_group.data
+        self.assertEqual(sorted(zip(data['player_id'], data['roster_slot'])),
+                         [(1, 'CPT'), (1, 'FLEX'), (3, 'CPT'), (3, 'FLEX')])  # player 2 has no projection
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import itertools
+import pathlib
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from dfsmc.lineup import Lineup, enumeration
+from dfsutil import rng
+
+
+def make_showdown_players(num_players: int = 12, seed: int = 0) -> pd.DataFrame:
+    """
+    Synthetic Showdown draft group: every player has a CPT row and a FLEX row, sorted by player_id and roster slot
+    """
+    rng = np.random.default_rng(seed)
+    flex_salary = rng.integers(10, 120, size=num_players) * 100
+    rows = []
+    for pid in range(num_players):
+        team = 1 if pid % 2 == 0 else 2
+        name = f'Player {pid}'
+        rows.append({'player_id': pid, 'name': name, 'team_id': team, 'roster_slot_id': 511, 'roster_slot': 'CPT',
+                     'salary': int(1.5 * flex_salary[pid]), 'projection': 1.5 * (pid + 1)})
+        rows.append({'player_id': pid, 'name': name, 'team_id': team, 'roster_slot_id': 512, 'roster_slot': 'FLEX',
+                     'salary': int(flex_salary[pid]), 'projection': float(pid + 1)})
+    return pd.DataFrame(rows)
+
+
+def brute_force_lineups(players: pd.DataFrame, salary_max: float, salary_min: float = 0) -> np.ndarray:
+    cpt = players.index[players['roster_slot'] == 'CPT'].values
+    flex = players.index[players['roster_slot'] == 'FLEX'].values
+    salaries, names, teams = players['salary'].values, players['name'].values, players['team_id'].values
+    lineups = []
+    for c, f in itertools.product(itertools.combinations(cpt, 1), itertools.combinations(flex, 5)):
+        lineup = np.array(c + f)
+        if len(set(teams[lineup])) == 2 and len(set(names[lineup])) == 6 and salary_min <= np.sum(salaries[lineup]) < salary_max:
+            lineups.append(lineup)
+    return np.vstack(lineups)
+
+
+class TestShowdownEnumeration(unittest.TestCase):
+
+    def setUp(self):
+        self.constraint = Lineup.LineupConstraint('Showdown')
+        self.constraint.salary_max = 30000
+        self.players = make_showdown_players()
+
+    def test_matches_brute_force(self):
+        expected = brute_force_lineups(self.players, self.constraint.salary_max)
+        generator = Lineup.greedyGenerator(self.constraint, self.players.copy())
+        for chunk_size in [7, 1000]:
+            lineups = generator.generate(chunk_size=chunk_size)
+            np.testing.assert_array_equal(lineups, expected)
+
+    def test_limit(self):
+        expected = brute_force_lineups(self.players, self.constraint.salary_max)
+        generator = Lineup.greedyGenerator(self.constraint, self.players.copy())
+        lineups = generator.generate(limit=50, chunk_size=7)
+        np.testing.assert_array_equal(lineups, expected[:50])
+
+    def test_random_is_reproducible(self):
+        expected = brute_force_lineups(self.players, self.constraint.salary_max)
+        lineups = Lineup.greedyGenerator(self.constraint, self.players.copy(), seed=3).generate(random=True, limit=500)
+        np.testing.assert_array_equal(
+            lineups, Lineup.greedyGenerator(self.constraint, self.players.copy(), seed=3).generate(random=True, limit=500))
+        # every sampled lineup is valid
+        expected_rows = {tuple(sorted(row)) for row in expected}
+        self.assertTrue(all(tuple(sorted(row)) in expected_rows for row in lineups))
+
+        rng.set_seed(11)
+        first, second = rng.spawn(2)
+        rng.set_seed(11)
+        np.testing.assert_array_equal(rng.default_rng(first).integers(0, 1000, 10),
+                                      rng.default_rng(rng.spawn(1)[0]).integers(0, 1000, 10))
+        self.assertFalse(np.array_equal(rng.default_rng(first).integers(0, 1000, 10),
+                                        rng.default_rng(second).integers(0, 1000, 10)))
+
+    def test_salary_pruning(self):
+        generator = Lineup.greedyGenerator(self.constraint, self.players.copy())
+        np.testing.assert_array_equal(generator.generate(prune_salary=True), generator.generate())
+
+        self.constraint.salary_min = 25000
+        expected = brute_force_lineups(self.players, self.constraint.salary_max, self.constraint.salary_min)
+        for prune_salary in [False, True]:
+            lineups = generator.generate(chunk_size=7, prune_salary=prune_salary)
+            np.testing.assert_array_equal(lineups, expected)
+
+    def test_parallel(self):
+        self.constraint.salary_min = 20000
+        generator = Lineup.greedyGenerator(self.constraint, self.players.copy())
+        expected = generator.generate(chunk_size=7)
+        np.testing.assert_array_equal(generator.generate(chunk_size=7, n_jobs=2), expected)
+        np.testing.assert_array_equal(generator.generate(limit=100, prune_salary=True, n_jobs=2), expected[:100])
+
+        # shards past the limit are dropped, and no shared memory block outlives the call
+        shm_dir = pathlib.Path('/dev/shm')
+        before = set(shm_dir.iterdir()) if shm_dir.is_dir() else set()
+        np.testing.assert_array_equal(generator.generate(limit=5, n_jobs=2), expected[:5])
+        if shm_dir.is_dir():
+            self.assertEqual(set(shm_dir.iterdir()) - before, set())
+
+    def test_blocks_and_file(self):
+        generator = Lineup.greedyGenerator(self.constraint, self.players.copy())
+        expected = generator.generate()
+        blocks = list(generator.generate_blocks(block_size=100))
+        self.assertTrue(all(len(block) == 100 for block in blocks[:-1]))
+        self.assertEqual(blocks[0].dtype, np.uint16)
+        np.testing.assert_array_equal(np.vstack(blocks), expected)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            outfile = pathlib.Path(tmpdir) / 'lineups.npy'
+            lineups = generator.generate_to_file(outfile, block_size=64, limit=500)
+            self.assertIsInstance(lineups, np.memmap)
+            np.testing.assert_array_equal(lineups, expected[:500])
+            del lineups
+
+            # an interrupted write leaves no file behind
+            partial = pathlib.Path(tmpdir) / 'partial.npy'
+            with self.assertRaises(RuntimeError):
+                with enumeration.NpyBlockWriter(partial, 6) as writer:
+                    writer.write(expected[:10])
+                    raise RuntimeError('interrupted')
+            self.assertFalse(partial.exists())
+
+    def test_salary_bounded_combinations(self):
+        salaries = np.array([500, 100, 300, 300, 200, 700, 100, 400])
+        indices = np.array([0, 2, 3, 4, 5, 7])
+        expected = np.array([c for c in itertools.combinations(indices, 3) if 800 <= salaries[list(c)].sum() < 1200])
+        combos = enumeration.salary_bounded_combinations(indices, salaries, 3, 1200, 800)
+        np.testing.assert_array_equal(combos, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import email.utils
+import http.server
+import importlib.util
+import json
+import pathlib
+import tempfile
+import threading
+import time
+import unittest
+
+
+class MockDKHandler(http.server.BaseHTTPRequestHandler):
+    """
+    /flaky/<n> fails with 503 on its first request, /limited/<n> with 429 and a one second Retry-After,
+    /missing/<n> always returns 404, anything else echoes its path
+    """
+    requests = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        with self.lock:
+            first = self.path not in [path for path, _ in self.requests]
+            self.requests.append((self.path, time.monotonic()))
+        if self.path.startswith('/missing'):
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.path.startswith('/flaky') and first:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.path.startswith('/limited') and first:
+            self.send_response(429)
+            self.send_header('Retry-After', '1')
+            self.end_headers()
+            return
+        body = json.dumps({'path': self.path}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipUnless(importlib.util.find_spec('aiohttp'), 'async downloads need aiohttp')
+class TestAsyncDownloader(unittest.TestCase):
+
+    def setUp(self):
+        from dfsscrape import async_download
+        self.async_download = async_download
+
+        MockDKHandler.requests = []
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), MockDKHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f'http://127.0.0.1:{self.server.server_address[1]}'
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def test_download_all(self):
+        paths = ['/group/1', '/group/2', '/flaky/3', '/group/4', '/missing/5']
+        jobs = [self.async_download.DownloadJob(self.base + p, self.path / f'{i}.json', name=i)
+                for i, p in enumerate(paths)]
+        downloader = self.async_download.AsyncDownloader(concurrency=2, rate=20., retries=2, backoff=0.01)
+        failed = downloader.run(jobs)
+
+        self.assertEqual(list(failed), [4])
+        for i, p in enumerate(paths[:4]):
+            with open(self.path / f'{i}.json') as f:
+                self.assertEqual(json.load(f), {'path': p})
+        self.assertFalse((self.path / '4.json').exists())
+        self.assertEqual([p for p, _ in MockDKHandler.requests].count('/flaky/3'), 2)
+        self.assertEqual([p for p, _ in MockDKHandler.requests].count('/missing/5'), 1)  # 404 is not retried
+        self.assertEqual(sorted(self.path.iterdir()), [self.path / f'{i}.json' for i in range(4)])
+
+        # token bucket: 6 requests (one retry) at 20 per second, bursts of one
+        times = sorted(t for _, t in MockDKHandler.requests)
+        self.assertGreaterEqual(times[-1] - times[0], 5 / 20.)
+
+    def test_retry_after(self):
+        job = self.async_download.DownloadJob(self.base + '/limited/1', self.path / 'limited.json')
+        downloader = self.async_download.AsyncDownloader(rate=20., retries=1, backoff=0.01)
+        self.assertEqual(downloader.run([job]), {})
+        times = [t for p, t in MockDKHandler.requests if p == '/limited/1']
+        self.assertEqual(len(times), 2)
+        self.assertGreaterEqual(times[1] - times[0], 0.9)  # the header, not the 0.01 second backoff
+
+    def test_retry_after_seconds(self):
+        self.assertEqual(self.async_download.retry_after_seconds('5'), 5.)
+        self.assertIsNone(self.async_download.retry_after_seconds(None))
+        self.assertIsNone(self.async_download.retry_after_seconds('soon'))
+        self.assertEqual(self.async_download.retry_after_seconds('Wed, 21 Oct 2015 07:28:00 GMT'), 0.)
+        later = email.utils.formatdate(time.time() + 30, usegmt=True)
+        self.assertAlmostEqual(self.async_download.retry_after_seconds(later), 30., delta=2.)
+
+
+if __name__ == '__main__':
+    unittest.main()
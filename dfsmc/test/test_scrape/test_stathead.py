@@ -0,0 +1,130 @@
+import functools
+import http.server
+import importlib.util
+import pathlib
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+NUM_PAGES = 4
+ROWS_PER_PAGE = 3
+
+
+def results_page(page: int) -> str:
+    rows = ''.join(
+        f'<tr><th data-stat="ranker">{i}</th><td data-stat="name_display">Player {page}-{i}</td>'
+        f'<td data-stat="fantasy_points">{page + i / 10}</td></tr>'
+        for i in range(ROWS_PER_PAGE))
+    link = f'<div><a href="page_{page + 1}.html">Next Page</a></div>' if page < NUM_PAGES else ''
+    return (f'<html><body><div id="stathead_results"><table id="stats"><thead><tr><th>Rk</th></tr></thead>'
+            f'<tbody>{rows}</tbody></table>{link}</div></body></html>')
+
+
+@unittest.skipUnless(importlib.util.find_spec('lxml'), 'stathead parsing needs lxml')
+class TestStatheadScraping(unittest.TestCase):
+    """
+    Saved results pages served by a local HTTP server stand in for Stathead
+    """
+
+    def setUp(self):
+        from dfsscrape import stathead
+        self.stathead = stathead
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = pathlib.Path(self.directory.name)
+        (self.path / 'pages').mkdir()
+        for page in range(1, NUM_PAGES + 1):
+            (self.path / 'pages' / f'page_{page}.html').write_text(results_page(page))
+        handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=str(self.path / 'pages'))
+        handler.log_message = lambda *args: None
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base = f'http://127.0.0.1:{self.server.server_address[1]}/page_1.html'
+
+        def query_a(year):
+            return f'{base}?query=a&year={year}'
+
+        def query_b(year):
+            return f'{base}?query=b&year={year}'
+
+        self.url_funcs = [query_a, query_b]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.directory.cleanup()
+
+    def test_read_and_output_all(self):
+        with mock.patch.object(self.stathead, 'URL_FUNCS', self.url_funcs), \
+                mock.patch.object(self.stathead.conf, 'NFL_SEASON_DATA', self.path):
+            self.stathead.read_and_output_all(['2023', '2024'], sessions=2, fetcher_factory=self.stathead.HttpFetcher)
+        for name in ['query_a_2023', 'query_a_2024', 'query_b_2023', 'query_b_2024']:
+            data = pd.read_csv(self.path / f'{name}.csv')
+            self.assertEqual(len(data), NUM_PAGES * ROWS_PER_PAGE)
+            self.assertEqual(data['name_display'].iloc[-1], f'Player {NUM_PAGES}-{ROWS_PER_PAGE - 1}')
+        self.assertFalse((self.path / 'checkpoints' / 'query_a_2023').exists())
+
+    def test_resume(self):
+        fetched = []
+
+        class FailingFetcher(self.stathead.HttpFetcher):
+            fail_at = 'page_3'
+
+            def get(self, url):
+                if self.fail_at is not None and self.fail_at in url:
+                    raise ConnectionError('dropped')
+                fetched.append(url)
+                return super().get(url)
+
+        checkpoint = self.stathead.PageCheckpoint(self.path / 'checkpoint')
+        pool = self.stathead.SessionPool(FailingFetcher, 1)
+        url = self.url_funcs[0]('2024')
+        with self.assertRaises(ConnectionError):
+            self.stathead.read_stathead_pages(url, pool=pool, checkpoint=checkpoint)
+        self.assertEqual(checkpoint.state()['pages'], 2)
+
+        # a page that comes back without its table (e.g. a timed out wait) also stops the query for a resume
+        class TablelessFetcher(FailingFetcher):
+            def get(self, url):
+                return '<html><body></body></html>' if 'page_3' in url else super().get(url)
+
+        FailingFetcher.fail_at = None
+        tableless_pool = self.stathead.SessionPool(TablelessFetcher, 1)
+        with self.assertRaises(RuntimeError):
+            self.stathead.read_stathead_pages(url, pool=tableless_pool, checkpoint=checkpoint)
+        tableless_pool.close()
+        self.assertEqual(checkpoint.state()['pages'], 2)
+        self.assertFalse(checkpoint.state()['done'])
+
+        # the interrupted query picks up at the third page
+        fetched.clear()
+        data = self.stathead.read_stathead_pages(url, pool=pool, checkpoint=checkpoint)
+        self.assertEqual([u.split('/')[-1] for u in fetched], ['page_3.html', 'page_4.html'])
+        self.assertEqual(len(data), NUM_PAGES * ROWS_PER_PAGE)
+        pool.close()
+
+    def test_typed_table(self):
+        page = (
+            '<table id="stats"><tbody>'
+            '<tr><th data-stat="ranker">1</th><td data-stat="team">KC</td><td data-stat="points">27</td>'
+            '<td data-stat="vegas_line">-3.5</td><td data-stat="time_of_poss">32:15</td>'
+            '<td data-stat="targets">4</td></tr>'
+            '<tr class="thead"><th data-stat="ranker">Rk</th></tr>'
+            '<tr><th data-stat="ranker">2</th><td data-stat="team">BUF</td><td data-stat="points">20</td>'
+            '<td data-stat="vegas_line"></td><td data-stat="time_of_poss">27:45</td></tr>'
+            '</tbody></table>')
+        data = self.stathead.parse_stathead_html(page)
+        self.assertEqual(list(data.columns), ['ranker', 'team', 'points', 'vegas_line', 'time_of_poss', 'targets'])
+        self.assertEqual(data['points'].dtype, 'int64')
+        self.assertEqual(data['team'].tolist(), ['KC', 'BUF'])
+        self.assertEqual(data['vegas_line'].iloc[0], -3.5)
+        self.assertTrue(pd.isna(data['vegas_line'].iloc[1]))
+        self.assertEqual(data['time_of_poss'].tolist(), [32.25, 27.75])
+        self.assertTrue(pd.isna(data['targets'].iloc[1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from dfsmc.contest import Contest
+from dfsmc.lineup import Lineup
+from dfsmc.simulate import contest
+from dfsmc.test.test_lineup.test_enumeration import make_showdown_players
+
+
+class TestContestSimulator(unittest.TestCase):
+
+    def setUp(self):
+        players = make_showdown_players(10)
+        players['actual'] = 0.
+        players['variance'] = 4. + np.arange(len(players))
+        constraint = Lineup.LineupConstraint('Showdown')
+        constraint.salary_max = 30000
+        lineups = Lineup.greedyGenerator(constraint, players.copy()).generate()
+        self.field = Contest.Field(players, lineups)
+        self.entry_rows = np.array([0, 10, 20, 30])
+        self.entry = self.field.filter(self.entry_rows)
+        self.payout = Contest.Payout(pd.DataFrame({
+            'min_position': [1, 2, 6], 'max_position': [1, 5, 20], 'payout_cash': [100., 20., 5.]}))
+
+    def test_matches_brute_force(self):
+        simulator = contest.ContestSimulator(self.field, self.entry, self.payout, max_elements=1000)
+        result = simulator.run(n_sims=50, seed=1)
+        self.assertGreater(len(self.field), simulator.batch_size)
+
+        # redraw the same outcomes and rank every lineup directly
+        outcomes = simulator.sampler.sample(np.random.default_rng(1), 50)
+        field_scores = np.round(outcomes @ self.field.to_csr().T.toarray(), 4)
+        entry_scores = np.round(outcomes @ self.field.to_csr(self.entry_rows).T.toarray(), 4)
+        np.testing.assert_allclose(result.points, entry_scores)
+        all_scores = np.hstack((field_scores, entry_scores))
+        expected_ranks = 1 + (all_scores[:, None, :] > entry_scores[:, :, None]).sum(axis=2)
+        expected_ties = (all_scores[:, None, :] == entry_scores[:, :, None]).sum(axis=2)
+        np.testing.assert_array_equal(result.ranks, expected_ranks)
+        np.testing.assert_array_equal(result.ties, expected_ties)
+        self.assertTrue((result.ties >= 2).all())  # each entry lineup is also in the field
+        np.testing.assert_allclose(result.cash, self.payout.get_cash(expected_ranks, expected_ties))
+
+        summary = result.summary(entry_fee=5.)
+        self.assertEqual(len(summary), len(self.entry))
+        np.testing.assert_allclose(summary['roi'], (result.cash.mean(axis=0) - 5.) / 5.)
+
+    def test_captain_rows(self):
+        # without a covariance matrix, each player is drawn once and the CPT row gets 1.5x the FLEX row's points
+        sampler = contest.NormalPlayerSampler.from_lineup_set(self.field)
+        outcomes = sampler.sample(np.random.default_rng(3), 20)
+        players = self.field.player_data.reset_index(drop=True)
+        for player_id, rows in players.groupby('player_id').groups.items():
+            slots = players.loc[rows, 'roster_slot']
+            cpt, flex = rows[slots == 'CPT'][0], rows[slots != 'CPT'][0]
+            np.testing.assert_allclose(outcomes[:, cpt], 1.5 * outcomes[:, flex])
+
+    def test_field_weights(self):
+        weights = np.full(len(self.field), 3.)
+        simulator = contest.ContestSimulator(self.field, self.entry, self.payout, field_weights=weights)
+        field_scores, entry_scores = simulator.score(simulator.sampler.sample(np.random.default_rng(2), 20))
+        ranks, ties = simulator.rank(field_scores, entry_scores)
+        # each field lineup counts three times, the entry lineups once
+        field_better = (field_scores[:, None, :] > entry_scores[:, :, None]).sum(axis=2)
+        entry_better = (entry_scores[:, None, :] > entry_scores[:, :, None]).sum(axis=2)
+        np.testing.assert_array_equal(ranks, 1 + 3 * field_better + entry_better)
+        np.testing.assert_array_equal(ties, 3 * (field_scores[:, None, :] == entry_scores[:, :, None]).sum(axis=2) + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from dfsmc.projection import projection_data
+from dfsmc.simulate import players
+
+
+def make_draft_group(seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    rows = []
+    for team in ['KC', 'BUF']:
+        for position in ['QB', 'RB', 'RB', 'WR', 'WR', 'WR', 'TE', 'K', 'DST']:
+            projection = rng.uniform(2., 20.)
+            for slot, multiplier in [('CPT', 1.5), ('FLEX', 1.)]:
+                rows.append({'player_id': len(rows) // 2, 'position': position, 'team_abbreviation': team,
+                             'home_team_abbreviation': 'KC', 'roster_slot': slot,
+                             'projection': multiplier * projection})
+    return pd.DataFrame(rows)
+
+
+class TestCorrelatedPlayerSampler(unittest.TestCase):
+
+    def setUp(self):
+        self.draft_group = make_draft_group()
+        self.sampler = players.CorrelatedPlayerSampler.from_model_file(self.draft_group, default_variance=16.)
+
+    def test_player_covariance(self):
+        position_cov = pd.read_csv(projection_data.TrivialProjector.cov_model_path(), index_col=0)
+        # the two home RBs split the RB_home residual, so their summed variance is the position variance
+        rbs = np.flatnonzero((self.sampler.positions == 'RB') & (np.arange(len(self.sampler.mean)) < 9))
+        self.assertAlmostEqual(self.sampler.cov[np.ix_(rbs, rbs)].sum(), position_cov.loc['RB_home', 'RB_home'])
+        self.assertEqual(self.sampler.cov[-1, -1], 16.)  # DST is not in the model
+
+        samples = self.sampler.sample_players(np.random.default_rng(1), 200000)
+        np.testing.assert_allclose(samples.mean(axis=0), self.sampler.mean, atol=0.1)
+        np.testing.assert_allclose(np.cov(samples.T), self.sampler.cov, atol=1.)
+
+        rows = self.sampler.sample(np.random.default_rng(2), 10)
+        np.testing.assert_allclose(rows[:, ::2], 1.5 * rows[:, 1::2])
+
+    def test_gamma_marginals(self):
+        gamma = {'QB': (4., 0.5, -8.), 'RB': (3., 0.4, -7.), 'WR': (2.5, 0.35, -7.), 'TE': (2., 0.4, -5.)}
+        sampler = players.CorrelatedPlayerSampler.from_model_file(self.draft_group, gamma=gamma, default_variance=16.)
+        samples = sampler.sample_players(np.random.default_rng(1), 200000)
+        residuals = samples[:, 0] - sampler.mean[0]  # home QB
+        self.assertAlmostEqual(residuals.mean(), 4. / 0.5 - 8., delta=0.05)
+        self.assertAlmostEqual(residuals.var(), 4. / 0.5 ** 2, delta=0.3)
+        self.assertGreaterEqual(residuals.min(), -8.)
+
+    def test_psd_repair(self):
+        factor = np.random.default_rng(0).normal(size=(6, 2))
+        cov = factor @ factor.T  # rank 2
+        self.assertRaises(np.linalg.LinAlgError, np.linalg.cholesky, cov)
+        chol = players.psd_cholesky(cov)
+        np.testing.assert_allclose(chol @ chol.T, cov, atol=1e-6)
+
+
+if __name__ == '__main__':
+    unittest.main()
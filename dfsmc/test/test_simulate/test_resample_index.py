@@ -0,0 +1,94 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from dfsmc.simulate import games
+
+
+class TestResampleIndex(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        rows = []
+        for season, weeks in [(2021, 18), (2022, 9)]:
+            for team in ['KC', 'BUF', 'MIA']:
+                for player in range(4):
+                    for week in range(1, weeks + 1):
+                        if rng.random() > 0.1:
+                            rows.append((season, f'{team}{player}', 'WR', team, week, rng.uniform(0., 30.)))
+        self.games_data = pd.DataFrame(rows, columns=['season', 'player_name', 'pos', 'team', 'week_num', 'fpts_dk'])
+        self.index = games.ResampleIndex(self.games_data)
+
+    def test_index(self):
+        self.assertEqual(self.index.outcomes.shape, (12, 27))
+        self.assertEqual(self.index.slots.iloc[-1].tolist(), [2022, 9])
+        row = self.games_data.iloc[5]
+        player = np.flatnonzero(self.index.players['player_name'] == row['player_name'])[0]
+        slot = np.flatnonzero((self.index.slots['season'] == row['season']) &
+                              (self.index.slots['week_num'] == row['week_num']))[0]
+        self.assertAlmostEqual(self.index.outcomes[player, slot], row['fpts_dk'], places=4)
+
+    def test_week_weights(self):
+        np.testing.assert_allclose(self.index.weights(), 1. / 27)
+        weights = self.index.weights(half_life=3.)
+        self.assertAlmostEqual(weights[-1] / weights[-4], 2.)
+        slots, _ = self.index.sample(np.random.default_rng(1), 200000, half_life=3.)
+        np.testing.assert_allclose(np.bincount(slots, minlength=27) / 200000, weights, atol=0.005)
+
+    def test_team_blocks(self):
+        slots, outcomes = self.index.sample(np.random.default_rng(2), 1000, by_team=True)
+        self.assertEqual(slots.shape, (1000, 3))
+        for player in range(len(self.index.players)):
+            expected = self.index.outcomes[player, slots[:, self.index.player_team[player]]]
+            np.testing.assert_array_equal(outcomes[:, player], expected)
+        self.assertFalse((slots[:, 0] == slots[:, 1]).all())
+
+
+class StubGamesDB:
+    """
+    player_games of one season held in a DataFrame
+    """
+
+    def __init__(self, *args):
+        self.table = None
+
+    def run_typed_query(self, command, variable=None):
+        season, week_num = variable
+        rows = self.table[(self.table['season'] == season) & (self.table['week_num'] < week_num)]
+        return rows[['player_name', 'pos', 'team', 'week_num', 'fpts_dk']].reset_index(drop=True)
+
+
+class TestOutcomeMatrix(unittest.TestCase):
+
+    def setUp(self):
+        with mock.patch.object(games, 'DFSDBInterface', StubGamesDB):
+            self.simulator = games.ResampleSimulator(seed=0)
+        self.simulator.db_interface.table = pd.DataFrame(
+            [(2023, 'Amari Cooper', 'WR', 'CLE', 1, 12.),
+             (2023, 'Amari Cooper', 'WR', 'CLE', 2, 8.5),
+             (2023, 'Amari Cooper', 'WR', 'BUF', 4, 20.),  # traded after week 2
+             (2023, 'Josh Allen', 'QB', 'BUF', 1, 30.),
+             (2023, 'Josh Allen', 'QB', 'BUF', 3, 25.),
+             (2023, 'Josh Allen', 'QB', 'BUF', 5, 40.),  # after the weeks being simulated
+             (2022, 'Josh Allen', 'QB', 'BUF', 1, 11.)],
+            columns=['season', 'player_name', 'pos', 'team', 'week_num', 'fpts_dk'])
+
+    def test_outcome_matrix(self):
+        players, weeks, outcomes = self.simulator.get_outcome_matrix(2023, 5)
+        self.assertEqual(players.values.tolist(), [['Amari Cooper', 'WR', 'BUF'], ['Josh Allen', 'QB', 'BUF']])
+        np.testing.assert_array_equal(weeks, [1, 2, 3, 4])
+        np.testing.assert_array_equal(outcomes, np.array([[12., 8.5, np.nan, 20.], [30., np.nan, 25., np.nan]],
+                                                         dtype=np.float32))
+        self.assertIs(self.simulator.get_outcome_matrix(2023, 5)[2], outcomes)
+
+        sampled_weeks, sampled = self.simulator.sample_outcomes(50, 2023, 5)
+        np.testing.assert_array_equal(sampled, outcomes[:, sampled_weeks - 1].T)
+        frame = self.simulator.generate_multiple(10, 2023, 5)
+        self.assertFalse(frame['fpts_dk'].isna().any())
+        self.assertEqual(set(frame['team']), {'BUF'})
+
+
+if __name__ == '__main__':
+    unittest.main()
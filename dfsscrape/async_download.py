@@ -0,0 +1,154 @@
+"""
+Concurrent downloads on one shared aiohttp session: at most `concurrency` requests in flight, a token bucket
+capping the request rate, retries with exponential backoff on connection errors, timeouts, 429 and 5xx
+responses (waiting as long as the server's Retry-After header asks, if it sends one), and results written by atomic file replacement so a crash never leaves a half-written file
+"""
+import asyncio
+import email.utils
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Allows rate requests per second on average, in bursts of up to capacity
+    """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.:
+                    self.tokens -= 1.
+                    return
+                await asyncio.sleep((1. - self.tokens) / self.rate)
+
+
+def retry_after_seconds(value: str = None) -> float:
+    """
+    Delay asked for by a Retry-After header: a number of seconds or an HTTP date.  None if value is missing or
+    cannot be parsed
+    """
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.)
+
+
+def atomic_write(path: Path, text: str):
+    """
+    Write text to a temporary file next to path and move it into place
+    """
+    path = Path(path)
+    fd, temp = tempfile.mkstemp(dir=path.parent, prefix=f'.{path.name}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+class DownloadJob:
+    """
+    One URL to fetch.  convert turns the response body (bytes) into a JSON-serializable object, which is written
+    to path
+    """
+
+    def __init__(self, url: str, path: Path, convert: Callable = json.loads, name: str = None):
+        self.url = url
+        self.path = Path(path)
+        self.convert = convert
+        self.name = url if name is None else name
+
+
+class AsyncDownloader:
+
+    def __init__(self, concurrency: int = 8, rate: float = 5., burst: int = 1, retries: int = 3,
+                 backoff: float = 0.5, timeout: float = 30., headers: Dict = None):
+        """
+        :param concurrency: maximum number of requests in flight
+        :param rate: maximum requests per second (token bucket refill rate)
+        :param burst: token bucket capacity
+        :param retries: retries of a failed request before giving up on the job
+        :param backoff: first retry delay in seconds, doubled (with jitter) for each further retry.  A response's
+            Retry-After header takes precedence
+        """
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.headers = headers
+
+    async def fetch(self, session, url: str, bucket: TokenBucket) -> bytes:
+        import aiohttp
+
+        for attempt in range(self.retries + 1):
+            await bucket.acquire()
+            delay = None
+            try:
+                async with session.get(url) as response:
+                    if response.status not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        return await response.read()
+                    error = aiohttp.ClientResponseError(response.request_info, response.history,
+                                                        status=response.status, message=response.reason)
+                    delay = retry_after_seconds(response.headers.get('Retry-After'))
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as err:
+                error = err
+            if attempt < self.retries:
+                if delay is None:
+                    delay = self.backoff * 2 ** attempt * random.uniform(1., 1.5)
+                await asyncio.sleep(delay)
+        raise error
+
+    async def _run_job(self, session, job: DownloadJob, bucket: TokenBucket, slots: asyncio.Semaphore):
+        async with slots:
+            content = await self.fetch(session, job.url, bucket)
+        atomic_write(job.path, json.dumps(job.convert(content)))
+
+    async def download_all(self, jobs: List[DownloadJob]) -> Dict[str, Exception]:
+        """
+        :return: {job name: exception} for the jobs that failed
+        """
+        import aiohttp
+
+        bucket = TokenBucket(self.rate, self.burst)
+        slots = asyncio.Semaphore(self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(timeout=timeout, headers=self.headers) as session:
+            results = await asyncio.gather(*[self._run_job(session, job, bucket, slots) for job in jobs],
+                                           return_exceptions=True)
+        return {job.name: result for job, result in zip(jobs, results) if isinstance(result, Exception)}
+
+    def run(self, jobs: List[DownloadJob]) -> Dict[str, Exception]:
+        return asyncio.run(self.download_all(jobs))
@@ -12,24 +12,40 @@ import zipfile
 
 from draft_kings import Client
 from draft_kings.data import Sport
+from draft_kings.url_builder import URLBuilder
 
 from dfsscrape.config import ScrapingConfig
 from dfsutil.constants import DK_CONTEST_TYPES
 from dfsscrape import utils
+from dfsscrape.async_download import AsyncDownloader, DownloadJob
 from dfsutil.dk_utils import get_nfl_week
 from dfsdata.interface import DFSDBInterface
 
 
-def get_contest_info(contest_id):
-    url = f'https://api.draftkings.com/contests/v1/contests/{str(contest_id)}'
-    page = requests.get(url)
-    tree = html.fromstring(page.content)
+DK_API_URL = 'https://api.draftkings.com'
+
+# concurrent requests and requests per second for draft group and contest detail downloads
+DK_CONCURRENCY = 8
+DK_REQUESTS_PER_SECOND = 4.
+
+
+def contest_info_url(contest_id, api_url: str = DK_API_URL):
+    return f'{api_url}/contests/v1/contests/{str(contest_id)}'
+
+
+def parse_contest_info(content):
+    tree = html.fromstring(content)
     script = tree.xpath('/html/body/script[2]')
     # split off whitespace and comma at the end of the string
     script_json = script[0].text.split('let model = ')[1].split('txt = $$')[0].rstrip().rstrip(',')
     return json.loads(script_json)
 
 
+def get_contest_info(contest_id):
+    page = requests.get(contest_info_url(contest_id))
+    return parse_contest_info(page.content)
+
+
 def translate_contest_type(type_id):
     if str(type_id) in DK_CONTEST_TYPES:
         return DK_CONTEST_TYPES[str(type_id)]
@@ -145,6 +161,121 @@ def download_contest_entry_data():
             med_wait()
 
 
+def draftables_to_json(draft) -> dict:
+    """
+    Draft group file contents from a draft_kings DraftablesDetails
+    """
+    draft_json = {
+        'draftables': [],
+        'competitions': []
+    }
+    for player in draft.players:
+        player_json = {
+            'id': player.draftable_id,
+            'player_id': player.player_id,
+            'position': player.position_name,
+            'roster_slot_id': player.roster_slot_id,
+            'salary': player.salary,
+            'swappable': player.is_swappable,
+            'disabled': player.is_disabled,
+            'news_status': player.news_status_description,
+            'team_id': player.team_details.team_id,
+            'team_abbreviation': player.team_details.abbreviation,
+            'draft_alerts': player.draft_alerts,
+            'names': {
+                'first': player.name_details.first,
+                'last': player.name_details.last,
+                'display': player.name_details.display,
+                'short': player.name_details.short
+            },
+            'images': {
+                '50': player.image_details.fifty_pixels_by_fifty_pixels_url,
+                '160': player.image_details.one_hundred_and_sixty_pixels_by_one_hundred_and_sixty_pixels_url
+            }
+        }
+        try:
+            player_json['competition'] = {
+                'id': player.competition_details.competition_id,
+                'name': player.competition_details.name,
+                'starts_at': str(utils.utc_to_local(player.competition_details.starts_at))
+            }
+        except AttributeError:
+            player_json['competition'] = None
+        draft_json['draftables'].append(player_json)
+    for comp in draft.competitions:
+        comp_json = {
+            'id': comp.competition_id,
+            'name': comp.name,
+            'starts_at': str(utils.utc_to_local(comp.starts_at)),
+            'sport': comp.sport.value,
+            'venue': comp.venue,
+            'starting_lineups_available': comp.are_starting_lineups_available,
+            'depth_charts_available': comp.are_depth_charts_available,
+            'state': comp.state_description,
+            'home_team': {
+                'id': comp.home_team.team_id,
+                'name': comp.home_team.name,
+                'abbreviation': comp.home_team.abbreviation,
+                'city': comp.home_team.city
+            },
+            'away_team': {
+                'id': comp.away_team.team_id,
+                'name': comp.away_team.name,
+                'abbreviation': comp.away_team.abbreviation,
+                'city': comp.away_team.city
+            }
+        }
+        try:
+            comp_json['weather'] = {
+                'type': comp.weather.type,
+                'dome': comp.weather.dome
+            }
+        except AttributeError:
+            comp_json['weather'] = None
+        draft_json['competitions'].append(comp_json)
+    # purge PlayerDraftAlertDetails objects
+    for idx, alert in enumerate(draft_json['draftables']):
+        if len(alert['draft_alerts']) > 0:
+            draft_json['draftables'][idx]['draft_alerts'] = []
+    return draft_json
+
+
+def download_draft_groups(draft_group_ids, data_path: Path, downloader: AsyncDownloader = None,
+                          api_url: str = DK_API_URL, client: Client = None):
+    """
+    Download the draftables of each draft group to draft_group_info-{id}.json concurrently.  The responses are
+    parsed with the schema and transformer of one shared draft_kings Client
+
+    :return: {draft group id: exception} for the downloads that failed
+    """
+    client = Client() if client is None else client
+    downloader = AsyncDownloader(DK_CONCURRENCY, DK_REQUESTS_PER_SECOND) if downloader is None else downloader
+    url_builder = URLBuilder(api_base_path=api_url)
+
+    def convert(content: bytes) -> dict:
+        deserialized = client.draftables_schema.loads(content.decode('utf-8'))
+        return draftables_to_json(client.draftables_transformer.transform(response_draftables=deserialized))
+
+    jobs = [DownloadJob(url_builder.build_draftables_url(draft_group_id=gid),
+                        data_path / f'draft_group_info-{str(gid)}.json', convert, gid)
+            for gid in draft_group_ids]
+    return downloader.run(jobs)
+
+
+def download_contest_details(contest_ids, data_path: Path, downloader: AsyncDownloader = None,
+                             api_url: str = DK_API_URL):
+    """
+    Download the details (payouts) of each contest to contest_details-{id}.json concurrently
+
+    :return: {contest id: exception} for the downloads that failed
+    """
+    downloader = AsyncDownloader(DK_CONCURRENCY, DK_REQUESTS_PER_SECOND) if downloader is None else downloader
+    jobs = [DownloadJob(contest_info_url(cid, api_url), data_path / f'contest_details-{str(cid)}.json',
+                        parse_contest_info, cid)
+            for cid in contest_ids]
+    return downloader.run(jobs)
+
+
 def main(download_list: bool = False):
     config = ScrapingConfig()
     contests_client = Client().contests(sport=Sport.NFL)
@@ -214,106 +345,23 @@ def main(download_list: bool = False):
     print('Getting Draft Group Files')
     contest_filter = contest_df.loc[contest_df['contest_type'] != 'Madden Stream']
     draft_groups = contest_filter['draft_group_id'].unique()
-    for gid in draft_groups:
-        filepath = config.dk_data_path / f'draft_group_info-{str(gid)}.json'
-        if not file_is_fresh(filepath):
-            utils.small_wait()
-            draft = Client().draftables(draft_group_id=gid)
-            draft_json = {
-                'draftables': [],
-                'competitions': []
-            }
-            for player in draft.players:
-                player_json = {
-                    'id': player.draftable_id,
-                    'player_id': player.player_id,
-                    'position': player.position_name,
-                    'roster_slot_id': player.roster_slot_id,
-                    'salary': player.salary,
-                    'swappable': player.is_swappable,
-                    'disabled': player.is_disabled,
-                    'news_status': player.news_status_description,
-                    'team_id': player.team_details.team_id,
-                    'team_abbreviation': player.team_details.abbreviation,
-                    'draft_alerts': player.draft_alerts,
-                    'names': {
-                        'first': player.name_details.first,
-                        'last': player.name_details.last,
-                        'display': player.name_details.display,
-                        'short': player.name_details.short
-                    },
-                    'images': {
-                        '50': player.image_details.fifty_pixels_by_fifty_pixels_url,
-                        '160': player.image_details.one_hundred_and_sixty_pixels_by_one_hundred_and_sixty_pixels_url
-                    }
-                }
-                try:
-                    player_json['competition'] = {
-                        'id': player.competition_details.competition_id,
-                        'name': player.competition_details.name,
-                        'starts_at': str(utils.utc_to_local(player.competition_details.starts_at))
-                    }
-                except AttributeError:
-                    player_json['competition'] = None
-                draft_json['draftables'].append(player_json)
-            for comp in draft.competitions:
-                comp_json = {
-                    'id': comp.competition_id,
-                    'name': comp.name,
-                    'starts_at': str(utils.utc_to_local(comp.starts_at)),
-                    'sport': comp.sport.value,
-                    'venue': comp.venue,
-                    'starting_lineups_available': comp.are_starting_lineups_available,
-                    'depth_charts_available': comp.are_depth_charts_available,
-                    'state': comp.state_description,
-                    'home_team': {
-                        'id': comp.home_team.team_id,
-                        'name': comp.home_team.name,
-                        'abbreviation': comp.home_team.abbreviation,
-                        'city': comp.home_team.city
-                    },
-                    'away_team': {
-                        'id': comp.away_team.team_id,
-                        'name': comp.away_team.name,
-                        'abbreviation': comp.away_team.abbreviation,
-                        'city': comp.away_team.city
-                    }
-                }
-                try:
-                    comp_json['weather'] = {
-                        'type': comp.weather.type,
-                        'dome': comp.weather.dome
-                    }
-                except AttributeError:
-                    comp_json['weather'] = None
-                draft_json['competitions'].append(comp_json)
-            # purge PlayerDraftAlertDetails objects
-            for idx, alert in enumerate(draft_json['draftables']):
-                if len(alert['draft_alerts']) > 0:
-                    draft_json['draftables'][idx]['draft_alerts'] = []
-            with open(filepath, 'w') as outfile:
-                json.dump(draft_json, outfile)
-
-        else:
-            print('Already have data.  Moving to next group.')
+    groups_to_get = [gid for gid in draft_groups
+                     if not file_is_fresh(config.dk_data_path / f'draft_group_info-{str(gid)}.json')]
+    print(f'Already have data for {len(draft_groups) - len(groups_to_get)} of {len(draft_groups)} groups.')
+    failed = download_draft_groups(groups_to_get, config.dk_data_path)
+    for gid, err in failed.items():
+        print(f'Failed to get draft group #{gid}: {err}')
 
     # Download contest info files (payouts)
 
     if download_list:
         contest_filter = contest_df.loc[(contest_df['contest_type'] != 'Madden Stream') & contest_df['guaranteed']]
-        contest_ids = contest_filter['contest_id'].values
-        for cid in contest_ids:
-            filename = config.dk_data_path / f'contest_details-{str(cid)}.json'
-            if not os.path.isfile(filename):
-                utils.small_wait()
-                print('Getting contest #' + str(cid))
-                try:
-                    info = get_contest_info(cid)
-                    with open(filename, 'w') as outfile:
-                        json.dump(info, outfile)
-                except Exception as err:
-                    print('Failed to connect!')
-
+        contest_ids = [cid for cid in contest_filter['contest_id'].values
+                       if not os.path.isfile(config.dk_data_path / f'contest_details-{str(cid)}.json')]
+        print(f'Getting {len(contest_ids)} contests')
+        failed = download_contest_details(contest_ids, config.dk_data_path)
+        for cid, err in failed.items():
+            print(f'Failed to get contest #{cid}: {err}')
 
 if __name__ == "__main__":
     # main(download_list=True)
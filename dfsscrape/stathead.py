@@ -1,17 +1,20 @@
-import time
+import contextlib
+import json
 import os
 import pathlib
-from enum import Enum
+import queue
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from itertools import product
 from typing import List
+from urllib.parse import urljoin
+from urllib.request import urlopen
 
-from bs4 import BeautifulSoup
+from lxml import html as lxml_html
+import numpy as np
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import NoSuchElementException
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
 
 from dfsscrape import urls
 import dfsscrape.config as conf
@@ -19,6 +22,8 @@ from dfsutil.timer import Timer
 
 TIMER = Timer()
 
+STATHEAD_SESSIONS = 3
+
 URL_FUNCS = [
     urls.NFL_TEAM_GAMES,
     urls.NFL_PLAYER_GAMES_PASSING,
@@ -46,117 +51,300 @@ def filename_from_func(func, year):
 class MultipleEmptyColumnNamesException(Exception):
     pass
 
-def read_stathead_table(soup):
-    table = soup.find('tbody')
-    rows = table.find_all('tr')
-    data_dict = {}
-    data_list = []
-    for r in rows:
-        if len(r.find_all('td')) > 0:
-            cols_data = {c.attrs['data-stat']: c.get_text() for c in r.contents}
-            data_list.append(cols_data)
-            # for key, val in cols_data.items():
-            #     if key in data_dict.keys():
-            #         data_dict[key].append(val)
-            #     else:
-            #         data_dict[key] = []
-            #         data_dict[key].append(val)
-
-    data_df = pd.DataFrame(data_list)
-    return data_df
-
-
-def read_stathead_pages(url: str):
-    chrome_options = Options()
-    chromedata = os.path.join(pathlib.Path(__file__).parent.absolute(), 'chrome-data')
-    chrome_options.add_argument('--user-data-dir=' + chromedata)
-    
-    # get path to chromedriver
-    chrome_install = ChromeDriverManager().install()
-    folder = os.path.dirname(chrome_install)
-    chromedriver_path = os.path.join(folder, "chromedriver.exe")
-
-    # get driver
-    driver = webdriver.Chrome(service=Service(chromedriver_path), options=chrome_options)
-    
-    
-    page_table_list = []
+CLOCK_PATTERN = r'\d+:\d{2}'
+
+
+def typed_column(values: List[str]):
+    """
+    Convert one column of cell text: integers (int64, or float64 if some cells are empty), floats, clock values
+    ('M:SS' or 'H:MM', as a float in units of the leading field, e.g. '32:15' -> 32.25) and otherwise the text
+    """
+    column = pd.Series(values, dtype=object)
+    filled = column[column != '']
+    if len(filled) == 0:
+        return column
+    numeric = pd.to_numeric(filled, errors='coerce')
+    if numeric.notna().all():
+        if len(filled) == len(column) and (numeric == numeric.round()).all() \
+                and not filled.str.contains('.', regex=False).any():
+            return numeric.astype(np.int64)
+        return pd.to_numeric(column.replace('', np.nan), errors='coerce').astype(np.float64)
+    if filled.str.fullmatch(CLOCK_PATTERN).all():
+        parts = column.str.split(':', expand=True).replace('', np.nan)
+        leading = pd.to_numeric(parts[0], errors='coerce')
+        trailing = pd.to_numeric(parts[1], errors='coerce') if 1 in parts else np.nan
+        return (leading + trailing / 60.).astype(np.float64)
+    return column
+
+
+def read_stathead_table(tree) -> pd.DataFrame:
+    """
+    Typed DataFrame of the #stats results table of a parsed page, one column per data-stat.  Header rows repeated
+    inside the table body (no td cells) are skipped
+    """
+    rows = [{cell.get('data-stat'): (cell.text or '') if len(cell) == 0 else cell.text_content()
+             for cell in row.iterchildren('th', 'td')}
+            for row in tree.xpath('//table[@id="stats"]/tbody/tr[td]')]
+    columns = {stat: [row.get(stat, '') for row in rows] for stat in dict.fromkeys(s for row in rows for s in row)}
+    return pd.DataFrame({stat: typed_column(values).values for stat, values in columns.items()})
+
+
+def parse_stathead_html(page) -> pd.DataFrame:
+    """
+    Results table of a page source (str or bytes), e.g. a saved page
+    """
+    return read_stathead_table(lxml_html.fromstring(page))
+
+
+def next_page_url(tree, url: str):
+    """
+    Absolute URL of the 'Next Page' link of a results page, or None on the last page
+    """
+    links = tree.xpath('//*[@id="stathead_results"]//a[normalize-space(.)="Next Page"]/@href') \
+        or tree.xpath('//a[normalize-space(.)="Next Page"]/@href')
+    return urljoin(url, links[0]) if links else None
+
+
+class SeleniumFetcher:
+    """
+    One Chrome session, reused for every page it is asked for.  Each session runs on a private copy of the
+    chrome-data profile (so it shares the Stathead login without fighting over the profile lock), and waits for
+    the results table instead of polling with sleeps
+    """
+
+    def __init__(self, timeout: float = 10.):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+        from selenium.webdriver.chrome.service import Service
+        from webdriver_manager.chrome import ChromeDriverManager
+
+        chromedata = os.path.join(pathlib.Path(__file__).parent.absolute(), 'chrome-data')
+        self.profile = tempfile.mkdtemp(prefix='stathead-chrome-')
+        if os.path.isdir(chromedata):
+            shutil.copytree(chromedata, self.profile, dirs_exist_ok=True,
+                            ignore=shutil.ignore_patterns('Singleton*', 'lockfile'))
+        chrome_options = Options()
+        chrome_options.add_argument('--user-data-dir=' + self.profile)
+
+        # get path to chromedriver
+        chrome_install = ChromeDriverManager().install()
+        folder = os.path.dirname(chrome_install)
+        chromedriver_path = os.path.join(folder, "chromedriver.exe")
+
+        self.driver = webdriver.Chrome(service=Service(chromedriver_path), options=chrome_options)
+        self.timeout = timeout
+
+    def get(self, url: str) -> str:
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support import expected_conditions
+        from selenium.webdriver.support.ui import WebDriverWait
+
+        self.driver.get(url)
+        try:
+            WebDriverWait(self.driver, self.timeout).until(
+                expected_conditions.presence_of_element_located(('xpath', '//*[@id="stats"]/tbody/tr[1]')))
+        except TimeoutException:
+            pass  # returned without a table: an empty query on its first page, otherwise read_stathead_pages raises
+        return self.driver.page_source
+
+    def close(self):
+        self.driver.quit()
+        shutil.rmtree(self.profile, ignore_errors=True)
+
+
+class HttpFetcher:
+    """
+    Plain HTTP GET, for pages that do not need a browser (e.g. saved results pages served locally)
+    """
+
+    def __init__(self, timeout: float = 30.):
+        self.timeout = timeout
+
+    def get(self, url: str) -> str:
+        with urlopen(url, timeout=self.timeout) as response:
+            return response.read().decode('utf-8')
+
+    def close(self):
+        pass
+
+
+class SessionPool:
+    """
+    At most size fetchers (browser sessions), created on first use and handed out to whichever query needs a page
+    next.  A session that raises is closed and replaced
+    """
+
+    def __init__(self, factory=SeleniumFetcher, size: int = STATHEAD_SESSIONS):
+        self.factory = factory
+        self.size = size
+        self._idle = queue.Queue()
+        self._slots = threading.Semaphore(size)
+
+    @contextlib.contextmanager
+    def session(self):
+        self._slots.acquire()
+        try:
+            try:
+                fetcher = self._idle.get_nowait()
+            except queue.Empty:
+                fetcher = self.factory()
+            try:
+                yield fetcher
+            except Exception:
+                fetcher.close()
+                raise
+            self._idle.put(fetcher)
+        finally:
+            self._slots.release()
 
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+
+class PageCheckpoint:
+    """
+    Pages of one query saved as they are read (page_0001.csv, ...), with state.json holding the number of pages
+    saved, the URL of the next page and whether the query is done.  A query started again resumes at the next page
+    """
+
+    def __init__(self, directory: pathlib.Path):
+        self.directory = pathlib.Path(directory)
+
+    def state(self) -> dict:
+        try:
+            with open(self.directory / 'state.json') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'pages': 0, 'next_url': None, 'done': False}
+
+    def _write_state(self, state: dict):
+        temp = self.directory / 'state.json.tmp'
+        with open(temp, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp, self.directory / 'state.json')
+
+    def save_page(self, page: int, table: pd.DataFrame, next_url):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        table.to_csv(self.directory / f'page_{page:04d}.csv', header=True, index=False)
+        self._write_state({'pages': page, 'next_url': next_url, 'done': next_url is None})
+
+    def finish(self, pages: int):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._write_state({'pages': pages, 'next_url': None, 'done': True})
+
+    def load(self) -> pd.DataFrame:
+        files = sorted(self.directory.glob('page_*.csv'))
+        if len(files) == 0:
+            return pd.DataFrame()
+        return pd.concat([pd.read_csv(f) for f in files])
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def read_stathead_pages(url: str, pool: SessionPool = None, checkpoint: PageCheckpoint = None,
+                        timer: Timer = TIMER) -> pd.DataFrame:
+    """
+    Read every page of a Stathead query
+
+    :param pool: browser sessions to fetch the pages with.  Defaults to a single session, closed at the end
+    :param checkpoint: if given, each page is saved as it is read and the query resumes after the last saved page
+    """
+    own_pool = pool is None
+    if own_pool:
+        pool = SessionPool(size=1)
+    state = checkpoint.state() if checkpoint is not None else {'pages': 0, 'next_url': None, 'done': False}
+    page = state['pages']
+    next_url = state['next_url'] if page > 0 else url
+    page_table_list = []
     try:
-        # log in to stathead
-        TIMER.flag_start_time('Get URL')
-        driver.get(url)
-        TIMER.flag_end_time('Get URL')
-        offset = 0
-        while True:
-            # Find results table to confirm the search executed
-            TIMER.flag_start_time('Get Table')
-            num_trials = 20
-            table_found = False
-            for _ in range(num_trials):
-                try:
-                    time.sleep(0.1)
-                    driver.find_element('xpath', '//*[@id="stats"]/tbody/tr[1]')
-                    table_found = True
-                    break
-                except NoSuchElementException:
-                    pass
-            TIMER.flag_end_time('Get Table')
-            
-            if table_found:
-
-                html = driver.page_source
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                TIMER.flag_start_time('Read Table')
-                page_table = read_stathead_table(soup)
-                TIMER.flag_end_time('Read Table')
-                
-                page_table_list.append(page_table)
-                try:
-                    TIMER.flag_start_time('Get Next Page')
-                    next_page = driver.find_elements('xpath', '//*[@id="stathead_results"]/div[5]/a')
-                    next_page_found = False
-                    for n in next_page:
-                        if n.text == 'Next Page':
-                            next_page_found = True
-                            driver.get(n.get_attribute('href'))
-                    TIMER.flag_end_time('Get Next Page')
-
-                    if not next_page_found:
-                        break
-                except NoSuchElementException:
-                    break
-            
+        while next_url is not None and not state['done']:
+            timer.flag_start_time('Get Page')
+            with pool.session() as fetcher:
+                html = fetcher.get(next_url)
+            timer.flag_end_time('Get Page')
+
+            timer.flag_start_time('Read Table')
+            tree = lxml_html.fromstring(html)
+            if not tree.xpath('//table[@id="stats"]/tbody'):
+                timer.flag_end_time('Read Table')
+                if page == 0:
+                    break  # the query has no results
+                # a later page that did not load (e.g. the table wait timed out): keep the checkpoint to resume here
+                raise RuntimeError(f'No results table on page {page + 1} ({next_url})')
+            page_table = read_stathead_table(tree)
+            timer.flag_end_time('Read Table')
+            next_url = next_page_url(tree, next_url)
+            page += 1
+            if checkpoint is not None:
+                checkpoint.save_page(page, page_table, next_url)
             else:
-                break
-
-        driver.quit()
-        
-        if len(page_table_list) > 0:
-            TIMER.flag_start_time('Build DataFrame')
-            data = pd.concat(page_table_list)
-            TIMER.flag_end_time('Build DataFrame')
-            return data
-    except:
-        pass
+                page_table_list.append(page_table)
+    finally:
+        if own_pool:
+            pool.close()
+
+    timer.flag_start_time('Build DataFrame')
+    if checkpoint is not None:
+        checkpoint.finish(page)
+        data = checkpoint.load()
+    elif len(page_table_list) > 0:
+        data = pd.concat(page_table_list)
+    else:
+        data = pd.DataFrame()
+    timer.flag_end_time('Build DataFrame')
+    return data
+
+
+def checkpoint_from_func(func, year) -> PageCheckpoint:
+    func_name = func.__name__.split('.')[-1].lower()
+    return PageCheckpoint(conf.NFL_SEASON_DATA / 'checkpoints' / f'{func_name}_{year}')
 
-    return pd.DataFrame()
 
-def read_and_output_single_query(url_func, year: str, replace=False):
+def read_and_output_single_query(url_func, year: str, replace=False, pool: SessionPool = None, resume=True):
+    """
+    :param pool: browser sessions shared with other queries
+    :param resume: continue from the pages saved by an interrupted run (otherwise start over)
+    """
     filepath = filename_from_func(url_func, year)
     if replace or (not os.path.exists(filepath)):
-        data = read_stathead_pages(url_func(year))
-        TIMER.print_timers()
-        TIMER.reset_timers()
+        checkpoint = checkpoint_from_func(url_func, year)
+        if not resume:
+            checkpoint.clear()
+        timer = Timer()
+        data = read_stathead_pages(url_func(year), pool=pool, checkpoint=checkpoint, timer=timer)
+        print(f'{filepath}:')
+        timer.print_timers()
         if len(data) > 0:
             data.to_csv(filepath, header=True, index=False)
+        checkpoint.clear()
     else:
         print(f'File {filepath} already exists!')
-            
-def read_and_output_all(years: List[str], replace=False):
-    for url_func, year in product(URL_FUNCS, years):
-        read_and_output_single_query(url_func, year, replace=replace)
+
+
+def read_and_output_all(years: List[str], replace=False, sessions: int = STATHEAD_SESSIONS, fetcher_factory=None):
+    """
+    Run every URL_FUNCS x year query, several at once on a pool of reused browser sessions.  A query that fails
+    keeps its saved pages and picks up from there on the next run
+
+    :param sessions: number of browser sessions (and of queries in flight)
+    :param fetcher_factory: callable returning a fetcher (get(url) -> html, close()).  Defaults to SeleniumFetcher
+    """
+    pool = SessionPool(SeleniumFetcher if fetcher_factory is None else fetcher_factory, sessions)
+    queries = list(product(URL_FUNCS, years))
+    try:
+        with ThreadPoolExecutor(max_workers=sessions) as executor:
+            futures = {executor.submit(read_and_output_single_query, url_func, year, replace, pool): (url_func, year)
+                       for url_func, year in queries}
+            for future in as_completed(futures):
+                url_func, year = futures[future]
+                try:
+                    future.result()
+                except Exception as error:
+                    print(f'Query {url_func.__name__} {year} failed, rerun to resume: {error}')
+    finally:
+        pool.close()
 
 if __name__ == '__main__':
 
@@ -0,0 +1,71 @@
+"""
+Random number streams for simulators and generators.
+
+The process holds one root SeedSequence.  Seed it once with set_seed; every component that calls default_rng()
+without its own seed then gets an independent stream spawned from the root, in the order the components ask for
+them.  Parallel workers should be handed child SeedSequences from spawn (they pickle cheaply) and build their
+Generator with default_rng(child), so runs are reproducible and worker streams never overlap.
+"""
+from typing import List
+
+import numpy as np
+
+
+class RNGService:
+
+    def __init__(self, seed=None):
+        """
+        :param seed: int, SeedSequence or None (fresh OS entropy)
+        """
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+    @property
+    def entropy(self):
+        """
+        Root entropy.  Pass it back to set_seed to reproduce a run that was started without a seed
+        """
+        return self.seed_sequence.entropy
+
+    def spawn(self, n: int) -> List[np.random.SeedSequence]:
+        return self.seed_sequence.spawn(n)
+
+    def generator(self) -> np.random.Generator:
+        return np.random.Generator(np.random.PCG64(self.spawn(1)[0]))
+
+    def generators(self, n: int) -> List[np.random.Generator]:
+        return [np.random.Generator(np.random.PCG64(child)) for child in self.spawn(n)]
+
+
+_SERVICE = RNGService()
+
+
+def set_seed(seed=None) -> RNGService:
+    """
+    Reset the process-wide RNG service
+    """
+    global _SERVICE
+    _SERVICE = RNGService(seed)
+    return _SERVICE
+
+
+def get_service() -> RNGService:
+    return _SERVICE
+
+
+def spawn(n: int) -> List[np.random.SeedSequence]:
+    """
+    n independent child seeds from the process-wide service, e.g. one per worker process
+    """
+    return _SERVICE.spawn(n)
+
+
+def default_rng(seed=None) -> np.random.Generator:
+    """
+    Generator for a component.  seed=None takes the next stream from the process-wide service; a Generator is
+    used as is; an int or SeedSequence seeds a new Generator
+    """
+    if seed is None:
+        return _SERVICE.generator()
+    if isinstance(seed, np.random.Generator):
+        return seed
+    return np.random.default_rng(seed)